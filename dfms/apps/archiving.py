@@ -19,11 +19,19 @@
 #    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
 #    MA 02111-1307  USA
 #
+import logging
+from multiprocessing.pool import ThreadPool
+import threading
+import time
+
+from six.moves import queue as Queue  # @UnresolvedImport
+
 from dfms.drop import BarrierAppDROP, ContainerDROP
-from dfms.droputils import DROPFile
 from dfms.io import NgasIO, OpenMode, NgasLiteIO
 
 
+logger = logging.getLogger(__name__)
+
 class ExternalStoreApp(BarrierAppDROP):
     """
     An application that takes its input DROP (which must be one, and only
@@ -53,6 +61,57 @@ class ExternalStoreApp(BarrierAppDROP):
         `inputDrop` into an external store.
         """
 
+class ChunkReader(object):
+    """
+    Reads the contents of `drop` in chunks of `bufsize` bytes in a separate
+    thread, keeping up to `depth` of them ready to be consumed by iterating
+    over this object. Iteration finishes when a read returns no data.
+    """
+
+    def __init__(self, drop, bufsize, depth):
+        self._drop = drop
+        self._bufsize = bufsize
+        self._queue = Queue.Queue(depth)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._read, name='ChunkReader')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except Queue.Full:
+                pass
+        return False
+
+    def _read(self):
+        try:
+            desc = self._drop.open()
+            try:
+                while True:
+                    buf = self._drop.read(desc, self._bufsize)
+                    if not self._put(buf) or not buf:
+                        break
+            finally:
+                self._drop.close(desc)
+        except Exception as e:
+            self._put(e)
+
+    def __iter__(self):
+        while True:
+            buf = self._queue.get()
+            if isinstance(buf, Exception):
+                raise buf
+            if not buf:
+                return
+            yield buf
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
 class NgasArchivingApp(ExternalStoreApp):
     '''
     An ExternalStoreApp class that takes its input DROP and archives it in
@@ -61,32 +120,109 @@ class NgasArchivingApp(ExternalStoreApp):
     The archiving to NGAS occurs through the framework and not by spawning a
     new NGAS client process. This way we can read the different storage types
     supported by the framework, and not only filesystem objects.
+
+    Unlike other ExternalStoreApps, this application accepts any number of
+    inputs, which are archived by up to `concurrency` threads at the same
+    time. `ngasSrv` can be a comma-separated list of ``host[:port]`` servers
+    that are used in turns. Data is read `bufsize` bytes at a time by a
+    separate thread, keeping up to `readAhead` chunks ready for uploading.
+    A failed transfer is restarted up to `retries` times on the next server;
+    successfully archived inputs are not archived again when the application
+    is re-run (e.g., with `n_tries`), so only the failed ones are resumed.
     '''
 
     def initialize(self, **kwargs):
         super(NgasArchivingApp, self).initialize(**kwargs)
         self._ngasSrv            = self._getArg(kwargs, 'ngasSrv', 'localhost')
         self._ngasPort           = int(self._getArg(kwargs, 'ngasPort', 7777))
-        self._ngasTimeout        = float(self._getArg(kwargs, 'ngasConnectTimeout', 2.))
-        self._ngasConnectTimeout = float(self._getArg(kwargs, 'ngasTimeout', 2.))
+        self._ngasConnectTimeout = float(self._getArg(kwargs, 'ngasConnectTimeout', 2.))
+        self._ngasTimeout        = float(self._getArg(kwargs, 'ngasTimeout', 2.))
+        self._concurrency        = int(self._getArg(kwargs, 'concurrency', 4))
+        self._bufsize            = int(self._getArg(kwargs, 'bufsize', 1024 ** 2))
+        self._readAhead          = int(self._getArg(kwargs, 'readAhead', 4))
+        self._retries            = int(self._getArg(kwargs, 'retries', 2))
+        self._retryDelay         = float(self._getArg(kwargs, 'retryDelay', 1.))
+
+        self._servers = []
+        for srv in self._ngasSrv.split(','):
+            host, _, port = srv.strip().partition(':')
+            self._servers.append((host, int(port) if port else self._ngasPort))
+        self._nextServer = 0
+        self._serverLock = threading.Lock()
+        self._archived = set()
+
+    def _server(self):
+        with self._serverLock:
+            srv = self._servers[self._nextServer % len(self._servers)]
+            self._nextServer += 1
+            return srv
+
+    def run(self):
+        if self.outputs:
+            raise Exception("No outputs should be declared for this application")
+        if not self.inputs:
+            raise Exception("At least one input is expected by this application")
+
+        pending = [d for d in self.inputs if d.uid not in self._archived]
+        if len(pending) < len(self.inputs):
+            logger.info("%d inputs already archived, resuming with the remaining %d",
+                        len(self.inputs) - len(pending), len(pending))
+
+        if len(pending) == 1 or self._concurrency <= 1:
+            for inDrop in pending:
+                self.store(inDrop)
+            return
+
+        pool = ThreadPool(min(self._concurrency, len(pending)))
+        try:
+            results = [pool.apply_async(self.store, (d,)) for d in pending]
+            errors = []
+            for inDrop, result in zip(pending, results):
+                try:
+                    result.get()
+                except Exception as e:
+                    errors.append(e)
+                    logger.error("Failed to archive %r: %s", inDrop, e)
+        finally:
+            pool.close()
+            pool.join()
+        if errors:
+            raise Exception("%d out of %d inputs could not be archived" % (len(errors), len(pending)))
 
     def store(self, inDrop):
         if isinstance(inDrop, ContainerDROP):
             raise Exception("ContainerDROPs are not supported as inputs for this application")
 
+        tries = 0
+        while True:
+            host, port = self._server()
+            try:
+                self._archive(inDrop, host, port)
+                self._archived.add(inDrop.uid)
+                return
+            except Exception:
+                tries += 1
+                if tries > self._retries:
+                    raise
+                logger.exception("Error while archiving %r into %s:%d (try %d/%d), retrying",
+                                 inDrop, host, port, tries, self._retries + 1)
+                time.sleep(self._retryDelay)
+
+    def _archive(self, inDrop, host, port):
+
         size = -1 if inDrop.size is None else inDrop.size
         try:
-            ngasIO = NgasIO(self._ngasSrv, inDrop.uid, self._ngasPort, self._ngasConnectTimeout, self._ngasTimeout, size)
+            ngasIO = NgasIO(host, inDrop.uid, port, self._ngasConnectTimeout, self._ngasTimeout, size)
         except ImportError:
-            ngasIO = NgasLiteIO(self._ngasSrv, inDrop.uid, self._ngasPort, self._ngasConnectTimeout, self._ngasTimeout, size)
+            ngasIO = NgasLiteIO(host, inDrop.uid, port, self._ngasConnectTimeout, self._ngasTimeout, size)
 
         ngasIO.open(OpenMode.OPEN_WRITE)
 
-        # Copy in blocks of 4096 bytes
-        with DROPFile(inDrop) as f:
-            while True:
-                buff = f.read(4096)
-                ngasIO.write(buff)
-                if len(buff) != 4096:
-                    break
-        ngasIO.close()
\ No newline at end of file
+        # Data is read ahead by a separate thread while we upload
+        reader = ChunkReader(inDrop, self._bufsize, self._readAhead)
+        try:
+            for buf in reader:
+                ngasIO.write(buf)
+        finally:
+            reader.close()
+        ngasIO.close()
@@ -30,17 +30,18 @@ as a stream of data to the previous/next application.
 import contextlib
 import logging
 import os
+import re
+import select
 import socket
-import struct
 import subprocess
-import tempfile
 import threading
 import time
-import types
+import uuid
 
 import six
 
 from dfms import droputils, utils
+from dfms.apps import channels
 from dfms.ddap_protocol import AppDROPStates, DROPStates
 from dfms.drop import BarrierAppDROP, FileDROP, DirectoryContainer, AppDROP
 from dfms.exceptions import InvalidDropException
@@ -62,7 +63,237 @@ def mesage_stdouts(prefix, stdout, stderr, enc='utf8'):
         msg += "\n==STDERR==\n" + utils.b2s(stderr, enc)
     return msg
 
-def run_bash(cmd, inputs, outputs, stdin=None, stdout=subprocess.PIPE):
+class OutputCapture(object):
+    """
+    Captures the stdout and stderr of a command while it runs, keeping only
+    the last `maxsize` bytes of each in memory (or everything if `maxsize` is
+    None).
+
+    Optionally, stdout is also written into `stdout_drop` as it arrives, and
+    each complete line of either stream is passed to `on_line` together with
+    the name of its stream (``stdout`` or ``stderr``). Lines longer than
+    `maxsize` are passed in pieces.
+    """
+
+    def __init__(self, maxsize=65536, stdout_drop=None, on_line=None):
+        self._maxsize = maxsize
+        self._stdout_drop = stdout_drop
+        self._on_line = on_line
+        self._bufs = {'stdout': bytearray(), 'stderr': bytearray()}
+        self._dropped = {'stdout': 0, 'stderr': 0}
+        self._partial = {'stdout': bytearray(), 'stderr': bytearray()}
+
+    def feed(self, stream, data):
+        """
+        Adds `data`, which was just read from `stream`
+        """
+        if not data:
+            return
+        if stream == 'stdout' and self._stdout_drop is not None:
+            self._stdout_drop.write(bytes(data))
+
+        buf = self._bufs[stream]
+        buf += data
+        if self._maxsize is not None and len(buf) > self._maxsize:
+            extra = len(buf) - self._maxsize
+            del buf[:extra]
+            self._dropped[stream] += extra
+
+        if self._on_line is None:
+            return
+        partial = self._partial[stream]
+        partial += data
+        lines = partial.split(six.b('\n'))
+        for line in lines[:-1]:
+            self._on_line(stream, bytes(line))
+        partial[:] = lines[-1]
+        if self._maxsize is not None and len(partial) > self._maxsize:
+            self._on_line(stream, bytes(partial))
+            del partial[:]
+
+    def close(self):
+        """
+        Passes the last, incomplete lines of each stream to `on_line`
+        """
+        if self._on_line is None:
+            return
+        for stream in ('stdout', 'stderr'):
+            partial = self._partial[stream]
+            if partial:
+                self._on_line(stream, bytes(partial))
+                del partial[:]
+
+    def dropped(self, stream):
+        """
+        The number of bytes of `stream` that were discarded to keep it
+        within the size limit
+        """
+        return self._dropped[stream]
+
+    @property
+    def stdout(self):
+        return bytes(self._bufs['stdout'])
+
+    @property
+    def stderr(self):
+        return bytes(self._bufs['stderr'])
+
+def drain_output(streams, capture):
+    """
+    Reads the given `streams` (a dictionary of stream name: file object
+    elements) as data becomes available on any of them, feeding it into
+    `capture`, until they are all closed
+    """
+    fds = {f.fileno(): name for name, f in streams.items() if f is not None}
+    while fds:
+        ready, _, _ = select.select(list(fds), [], [])
+        for fd in ready:
+            data = os.read(fd, 65536)
+            if not data:
+                del fds[fd]
+                continue
+            capture.feed(fds[fd], data)
+    capture.close()
+
+class BashWorker(object):
+    """
+    A long-lived bash process that runs the commands it receives through its
+    stdin, each in its own subshell, and relays back their exit code, stdout
+    and stderr through its stdout and stderr pipes.
+
+    Commands are sent NUL-terminated. After each command the worker writes a
+    NUL byte followed by a random marker into both pipes, plus the exit code
+    of the command into its stdout, so the output of the different commands
+    can be told apart. Commands run with /dev/null as their stdin.
+    """
+
+    _driver = '''
+m="$1"; shift
+while IFS= read -r -d '' cmd; do
+    ( eval "$cmd" ) < /dev/null
+    printf '\\0%s%d\\n' "$m" $?
+    printf '\\0%s' "$m" >&2
+done
+'''
+
+    def __init__(self, env):
+        marker = uuid.uuid4().hex
+        self._end = six.b('\0' + marker)
+        self._proc = subprocess.Popen(('/bin/bash', '--noprofile', '--norc', '-c', self._driver, 'dlg-bash-worker', marker),
+                                      close_fds=True,
+                                      stdin=subprocess.PIPE,
+                                      stdout=subprocess.PIPE,
+                                      stderr=subprocess.PIPE,
+                                      env=env)
+        self._out = self._proc.stdout.fileno()
+        self._err = self._proc.stderr.fileno()
+
+    def run(self, cmd, capture):
+        """
+        Runs `cmd`, feeding its stdout and stderr into `capture` as they are
+        produced, and returns its exit code
+        """
+        if isinstance(cmd, six.text_type):
+            cmd = cmd.encode('utf8')
+        if six.b('\0') in cmd:
+            raise ValueError("Commands cannot contain NUL characters")
+        self._proc.stdin.write(cmd + six.b('\0'))
+        self._proc.stdin.flush()
+
+        # Read both pipes at the same time until the marker shows up on both.
+        # Everything before the marker is passed to the capture, except for
+        # the last few bytes that could be the beginning of the marker
+        end = self._end
+        names = {self._out: 'stdout', self._err: 'stderr'}
+        bufs = {self._out: bytearray(), self._err: bytearray()}
+        found = {}
+        pending = [self._out, self._err]
+        while pending:
+            ready, _, _ = select.select(pending, [], [])
+            for fd in ready:
+                data = os.read(fd, 65536)
+                if not data:
+                    raise Exception("Bash worker %d exited unexpectedly" % (self._proc.pid,))
+                buf = bufs[fd]
+                buf += data
+                if fd not in found:
+                    pos = buf.find(end)
+                    if pos < 0:
+                        keep = len(end) - 1
+                        capture.feed(names[fd], buf[:-keep])
+                        del buf[:-keep]
+                        continue
+                    capture.feed(names[fd], buf[:pos])
+                    del buf[:pos]
+                    found[fd] = True
+                if fd == self._err or buf.find(six.b('\n')) >= 0:
+                    pending.remove(fd)
+
+        capture.close()
+        out = bufs[self._out]
+        return int(out[len(end):out.find(six.b('\n'))])
+
+    def close(self):
+        self._proc.stdin.close()
+        self._proc.wait()
+        self._proc.stdout.close()
+        self._proc.stderr.close()
+
+class BashWorkerPool(object):
+    """
+    A pool of up to `size` BashWorkers, used to run short bash commands
+    without paying for a new bash process each time. Workers are started when
+    first needed, and they all share the snapshot of the environment taken when
+    the pool is created.
+    """
+
+    def __init__(self, size):
+        self._env = os.environ.copy()
+        self._idle = six.moves.queue.Queue()  # @UndefinedVariable
+        for _ in range(size):
+            self._idle.put(None)
+        self._lock = threading.Lock()
+        self._workers = set()
+
+    def run(self, cmd, capture=None):
+        """
+        Runs `cmd` in one of the workers of this pool, waiting for one to be
+        free if necessary, and returns its exit code, stdout and stderr. These
+        are captured by `capture`, or fully kept in memory if not given.
+        """
+        capture = capture or OutputCapture(maxsize=None)
+        worker = self._idle.get()
+        try:
+            if worker is None:
+                worker = BashWorker(self._env)
+                with self._lock:
+                    self._workers.add(worker)
+            return worker.run(cmd, capture), capture.stdout, capture.stderr
+        except:
+            # Don't reuse workers in an unknown state
+            if worker is not None:
+                self._discard(worker)
+                worker = None
+            raise
+        finally:
+            self._idle.put(worker)
+
+    def _discard(self, worker):
+        with self._lock:
+            self._workers.discard(worker)
+        try:
+            worker._proc.kill()
+            worker.close()
+        except:
+            logger.exception("Error while discarding bash worker")
+
+    def close(self):
+        with self._lock:
+            workers, self._workers = self._workers, set()
+        for w in workers:
+            w.close()
+
+def run_bash(cmd, inputs, outputs, stdin=None, stdout=subprocess.PIPE, pool=None, capture=None):
     """
     Runs the given `cmd`. If any `inputs` and/or `outputs` are given
     (dictionaries of uid:drop elements) they are used to replace any placeholder
@@ -74,6 +305,12 @@ def run_bash(cmd, inputs, outputs, stdin=None, stdout=subprocess.PIPE):
     Similarly, `stdout` is a file descriptor or file object where the standard
     output of the process is piped to. If not given it is consumed by this
     method and potentially logged.
+
+    The output of the process is read while it runs by `capture`, an
+    OutputCapture that by default keeps the last 64 KB of stdout and stderr.
+
+    If a BashWorkerPool is given in `pool`, and neither `stdin` nor `stdout`
+    are given, the command is run by one of the pool's workers.
     """
 
     # Replace inputs/outputs in command line with paths or data URLs
@@ -85,26 +322,37 @@ def run_bash(cmd, inputs, outputs, stdin=None, stdout=subprocess.PIPE):
     dataURLOutputs = {uid: o for uid,o in outputs.items() if not isFSBased(o)}
     cmd = droputils.replace_dataurl_placeholders(cmd, dataURLInputs, dataURLOutputs)
 
-    # Wrap everything inside bash
-    cmd = ('/bin/bash', '-c', cmd)
-    logger.debug("Command after user creation and wrapping is: %s", cmd)
-
+    capture = capture or OutputCapture()
     start = time.time()
 
-    # Run and wait until it finishes
-    process = subprocess.Popen(cmd,
-                               close_fds=True,
-                               stdin=stdin,
-                               stdout=stdout,
-                               stderr=subprocess.PIPE,
-                               env=os.environ.copy())
+    if pool is not None and stdin is None and stdout == subprocess.PIPE:
+        logger.debug("Running command in bash worker: %s", cmd)
+        pcode, pstdout, pstderr = pool.run(cmd, capture)
+    else:
 
-    logger.debug("Process launched, waiting now...")
+        # Wrap everything inside bash
+        cmd = ('/bin/bash', '-c', cmd)
+        logger.debug("Command after user creation and wrapping is: %s", cmd)
 
-    pstdout, pstderr = process.communicate()
-    if stdout != subprocess.PIPE:
-        pstdout = "<piped-out>"
-    pcode = process.returncode
+        # Run and wait until it finishes
+        process = subprocess.Popen(cmd,
+                                   close_fds=True,
+                                   stdin=stdin,
+                                   stdout=stdout,
+                                   stderr=subprocess.PIPE,
+                                   env=os.environ.copy())
+
+        logger.debug("Process launched, waiting now...")
+
+        drain_output({'stdout': process.stdout, 'stderr': process.stderr}, capture)
+        pcode = process.wait()
+        pstdout, pstderr = capture.stdout, capture.stderr
+        if stdout != subprocess.PIPE:
+            pstdout = "<piped-out>"
+
+    for stream in ('stdout', 'stderr'):
+        if capture.dropped(stream):
+            logger.info("Only the last %d bytes of %s are shown, %d were discarded", len(getattr(capture, stream)), stream, capture.dropped(stream))
 
     end = time.time()
     logger.info("Finished in %.3f [s] with exit code %d", (end-start), pcode)
@@ -116,83 +364,59 @@ def run_bash(cmd, inputs, outputs, stdin=None, stdout=subprocess.PIPE):
         logger.error(mesage_stdouts(message, pstdout, pstderr))
         raise Exception(message)
 
-def close_and_remove(fo, fname):
-    fo.close()
-    try:
-        os.remove(fname)
-        logger.debug("Removed %s", fname)
-    except OSError:
-        logger.exception("Error while removing %s", fname)
-
-def prepare_output_channel(this_node, out_drop):
+def prepare_output_channel(this_node, out_drop, bufsize=0, streams=1, linger=1000, stats=None):
     """
     Prepares an output channel that will serve as the stdout of a bash command.
     Depending on the values of ``this_node`` and ``out_drop`` the channel will
-    be a named pipe or a socket.
+    be a named pipe or `streams` TCP connections. `bufsize` is the size of the
+    pipe or of the socket buffers (0 meaning the system's default), and
+    `stats` is a ChannelStats object where the channel's throughput is kept.
     """
 
     # If the output drop is local then we set up a named pipe
     # otherwise we set up a socket server on our side,
     # which will result in a socket client on the other side
-    pipe_name = None
     if out_drop.node == this_node:
-        pipe_name = tempfile.mktemp()
-        os.mkfifo(pipe_name)
-        logger.debug("Created named pipe %s", pipe_name)
+        pipe_name = channels.create_fifo()
 
         # the pipe needs to be opened after the data is sent to the other
         # application because open() blocks until the other end is also
         # opened
         data = "pipe://%s" % (pipe_name,)
         out_drop.write(data)
-        return open(pipe_name, 'wb')
+        return channels.open_fifo(pipe_name, 'wb', bufsize, stats=stats)
 
     else:
         host = this_node or socket.gethostname()
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.bind((host, 0))
-        sock.listen(1)
+        sock.listen(streams)
         port = sock.getsockname()[1]
         logger.debug("Created TCP socket server at %s:%d", host, port)
 
         # to get a connection from the other side we have to write the data
         # into the output drop first so the other side connects to us
-        out_drop.write("tcp://%s:%d" % (host, port))
-        with contextlib.closing(sock):
-            csock, csockaddr = sock.accept()
-            csock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 1000))
-            logger.debug("Received connection from %r", csockaddr)
-            return csock
-
-def prepare_input_channel(data):
+        data = "tcp://%s:%d" % (host, port)
+        if streams > 1:
+            data += "?streams=%d" % (streams,)
+        out_drop.write(data)
+        return channels.accept_tcp(sock, streams, bufsize, linger, stats)
+
+def prepare_input_channel(data, bufsize=0, stats=None):
     """
     Prepares an input channel that will serve as the stdin of a bash command.
-    Depending on the contents of ``data`` the channel will be a named pipe or a
-    socket.
+    Depending on the contents of ``data`` the channel will be a named pipe or
+    one or more TCP connections. `bufsize` and `stats` are used as in
+    `prepare_output_channel`.
     """
 
     # We don't even look at "data", we simply set up a communication channel
     if data.startswith(six.b('pipe://')):
-        pipe_name = data[7:]
-        pipe = open(pipe_name, 'rb')
-        logger.debug("Opened pipe %s for reading", pipe_name)
-
-        # Return an object that runs pipe.read on read()
-        # and close_and_remove on close()
-        chan = lambda: None # a simple object where attributes can be set!
-        chan.read = pipe.read
-        chan.fileno = pipe.fileno
-        chan.close = types.MethodType(lambda s: close_and_remove(pipe, pipe_name), chan)
-        return chan
+        return channels.open_fifo(data[7:], 'rb', bufsize, remove=True, stats=stats)
 
     elif data.startswith(six.b('tcp://')):
-        host, port = data[6:].split(six.b(':'))
-        host = host.decode('utf-8')
-        port = int(port)
-        sock = utils.connect_to(host, port, 10)
-        sock.settimeout(None)
-        logger.debug("Connected to TCP socket %s:%d for reading", host, port)
-        return sock
+        host, port, streams = channels.parse_tcp_url(data)
+        return channels.connect_tcp(host, port, streams, bufsize, stats)
 
     raise Exception("Unsupported streaming channel: %s", data)
 
@@ -200,6 +424,19 @@ class BashShellBase(object):
     """
     Common class for BashShell apps. It simply requires a command to be
     specified.
+
+    The output of the command is captured while it runs, keeping the last
+    `max_output` bytes of its stdout and stderr for error reporting. If
+    `stream_stdout` is set stdout is also written into the first output of the
+    application, and if `log_output` is set each line of output is logged as
+    it arrives. Lines matching the `progress_regex` regular expression are
+    fired as ``progress`` events, with ``stream`` and ``line`` attributes.
+
+    Streaming applications connect to each other through channels whose pipe
+    or socket buffers are `channel_bufsize` bytes big (0 meaning the system's
+    default). Across nodes `channel_streams` parallel TCP connections are used,
+    lingering for `channel_linger` seconds when closed. Their throughput is
+    kept in `channel_stats`.
     """
 
     def initialize(self, **kwargs):
@@ -208,6 +445,57 @@ class BashShellBase(object):
         self._command = self._getArg(kwargs, 'command', None)
         if not self._command:
             raise InvalidDropException(self, 'No command specified, cannot create BashShellApp')
+        self._bash_pool = None
+
+        self._max_output = int(self._getArg(kwargs, 'max_output', 65536))
+        self._stream_stdout = self._getArg(kwargs, 'stream_stdout', False)
+        self._log_output = self._getArg(kwargs, 'log_output', False)
+        self._progress_regex = self._getArg(kwargs, 'progress_regex', None)
+        if self._progress_regex:
+            self._progress_regex = re.compile(self._progress_regex)
+
+        self._channel_bufsize = int(self._getArg(kwargs, 'channel_bufsize', 0))
+        self._channel_streams = int(self._getArg(kwargs, 'channel_streams', 1))
+        self._channel_linger = int(self._getArg(kwargs, 'channel_linger', 1000))
+        self._channel_stats = channels.ChannelStats()
+
+    @property
+    def bash_pool(self):
+        """
+        The BashWorkerPool used to run this application's command, if any. If
+        not set the command is run in a new bash process.
+        """
+        return self._bash_pool
+
+    @bash_pool.setter
+    def bash_pool(self, bash_pool):
+        self._bash_pool = bash_pool
+
+    @property
+    def channel_stats(self):
+        """
+        The throughput metrics of the streaming channels of this application
+        """
+        return self._channel_stats
+
+    def _output_channel(self):
+        return prepare_output_channel(self.node, self.outputs[0], self._channel_bufsize,
+                                      self._channel_streams, self._channel_linger, self._channel_stats)
+
+    def _input_channel(self, data):
+        return prepare_input_channel(data, self._channel_bufsize, self._channel_stats)
+
+    def _capture(self):
+        stdout_drop = self.outputs[0] if self._stream_stdout and self.outputs else None
+        on_line = self._output_line if self._log_output or self._progress_regex else None
+        return OutputCapture(self._max_output, stdout_drop, on_line)
+
+    def _output_line(self, stream, line):
+        line = line.decode('utf8', 'replace')
+        if self._log_output:
+            logger.info("%r %s: %s", self, stream, line)
+        if self._progress_regex and self._progress_regex.search(line):
+            self._fire('progress', stream=stream, line=line)
 
     def dataURL(self):
         return type(self).__name__
@@ -267,7 +555,7 @@ class BashShellApp(BashShellBase, BarrierAppDROP):
     StreamingOutputBashApp for those cases.
     """
     def run(self):
-        run_bash(self._command, self._inputs, self._outputs)
+        run_bash(self._command, self._inputs, self._outputs, pool=self._bash_pool, capture=self._capture())
 
 class StreamingOutputBashApp(BashShellBase, BarrierAppDROP):
     """
@@ -275,8 +563,8 @@ class StreamingOutputBashApp(BashShellBase, BarrierAppDROP):
     next application.
     """
     def run(self):
-        with contextlib.closing(prepare_output_channel(self.node, self.outputs[0])) as outchan:
-            run_bash(self._command, self._inputs, {}, stdout=outchan)
+        with contextlib.closing(self._output_channel()) as outchan:
+            run_bash(self._command, self._inputs, {}, stdout=outchan, capture=self._capture())
         logger.debug("Closed output channel")
 
 class StreamingInputBashApp(StreamingInputBashAppBase):
@@ -289,8 +577,8 @@ class StreamingInputBashApp(StreamingInputBashAppBase):
     this application off.
     """
     def run(self, data):
-        with contextlib.closing(prepare_input_channel(data)) as inchan:
-            run_bash(self._command, {}, self._outputs, stdin=inchan)
+        with contextlib.closing(self._input_channel(data)) as inchan:
+            run_bash(self._command, {}, self._outputs, stdin=inchan, capture=self._capture())
         logger.debug("Closed input channel")
 
 class StreamingInputOutputBashApp(StreamingInputBashAppBase):
@@ -299,8 +587,8 @@ class StreamingInputOutputBashApp(StreamingInputBashAppBase):
     fed into the next application.
     """
     def run(self, data):
-        with contextlib.closing(prepare_input_channel(data)) as inchan:
-            with contextlib.closing(prepare_output_channel(self.node, self.outputs[0])) as outchan:
-                run_bash(self._command, {}, {}, stdout=outchan, stdin=inchan)
+        with contextlib.closing(self._input_channel(data)) as inchan:
+            with contextlib.closing(self._output_channel()) as outchan:
+                run_bash(self._command, {}, {}, stdout=outchan, stdin=inchan, capture=self._capture())
             logger.debug("Closed output channel")
         logger.debug("Closed input channel")
\ No newline at end of file
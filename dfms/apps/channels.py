@@ -0,0 +1,301 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2016
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+"""
+Streaming channels used to connect the stdout of a bash command to the stdin
+of another one, either through a named pipe (when both run on the same node)
+or through one or more TCP connections.
+
+A single TCP connection is given directly to the bash processes, so data
+flows between them without passing through the Node Managers. When more than
+one connection is used the data is relayed by the Node Managers: the sending
+side splits it into length-prefixed chunks that are sent round-robin through
+the connections, and the receiving side reads them back in the same order.
+"""
+
+import contextlib
+import fcntl
+import logging
+import os
+import shutil
+import socket
+import struct
+import tempfile
+import threading
+import time
+
+from six.moves import urllib_parse as urlparse  # @UnresolvedImport
+
+from dfms import utils
+
+
+logger = logging.getLogger(__name__)
+
+# fcntl command to set the capacity of a pipe (Linux only)
+F_SETPIPE_SZ = getattr(fcntl, 'F_SETPIPE_SZ', 1031)
+
+# Size of the chunks relayed through parallel connections, and their header
+RELAY_CHUNK_SIZE = 1024 ** 2
+_header = struct.Struct('!I')
+
+class ChannelStats(object):
+    """
+    Throughput metrics of the streaming channels of an application. The
+    number of bytes is known only for relayed channels.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.seconds = 0.
+        self.streams = 0
+
+    def record(self, nbytes, seconds, streams):
+        with self._lock:
+            if nbytes is not None:
+                self.bytes += nbytes
+            self.seconds += seconds
+            self.streams += streams
+        if nbytes is not None:
+            rate = nbytes / seconds / 1024. ** 2 if seconds else 0
+            logger.info("Streamed %d bytes in %.3f [s] (%.2f [MB/s]) through %d connection(s)", nbytes, seconds, rate, streams)
+
+    @property
+    def throughput(self):
+        """
+        Bytes per second streamed through the channels
+        """
+        with self._lock:
+            return self.bytes / self.seconds if self.seconds else 0.
+
+    def as_dict(self):
+        return {'bytes': self.bytes, 'seconds': self.seconds,
+                'streams': self.streams, 'throughput': self.throughput}
+
+def set_pipe_size(fd, size):
+    """
+    Sets the capacity of the pipe behind `fd` to `size` bytes, if supported
+    """
+    if not size:
+        return
+    try:
+        fcntl.fcntl(fd, F_SETPIPE_SZ, size)
+    except (IOError, OSError):
+        logger.debug("Couldn't set the size of pipe %d to %d", fd, size)
+
+def tune_socket(sock, bufsize=0, linger=None):
+    """
+    Disables Nagle's algorithm on `sock`, and optionally sets its send and
+    receive buffer sizes and its linger time (in seconds)
+    """
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    if bufsize:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, bufsize)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, bufsize)
+    if linger is not None:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, linger))
+
+def _recv_exactly(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        data = sock.recv(n - len(buf))
+        if not data:
+            raise Exception("Connection closed while reading a relayed chunk")
+        buf += data
+    return bytes(buf)
+
+def _write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        n = os.write(fd, view)
+        view = view[n:]
+
+class Channel(object):
+    """
+    The local end of a streaming channel, to be used as the stdin or stdout
+    of a bash process via its file descriptor.
+    """
+
+    def __init__(self, fd, close):
+        self._fd = fd
+        self._close = close
+
+    def fileno(self):
+        return self._fd
+
+    def read(self, n):
+        return os.read(self._fd, n)
+
+    def close(self):
+        self._close()
+
+def _timed_close(close, streams, stats):
+    start = time.time()
+    def timed_close():
+        close()
+        if stats:
+            stats.record(None, time.time() - start, streams)
+    return timed_close
+
+def create_fifo():
+    """
+    Creates a named pipe in a new private temporary directory and returns
+    its path
+    """
+    path = os.path.join(tempfile.mkdtemp(prefix='dlg-fifo-'), 'fifo')
+    os.mkfifo(path, 0o600)
+    logger.debug("Created named pipe %s", path)
+    return path
+
+def open_fifo(path, mode, bufsize=0, remove=False, stats=None):
+    """
+    Opens the named pipe at `path` and returns a channel for it. If `remove`
+    is True the pipe and its directory are removed when the channel is closed
+    """
+    f = open(path, mode)
+    set_pipe_size(f.fileno(), bufsize)
+    logger.debug("Opened pipe %s", path)
+    def close():
+        f.close()
+        if remove:
+            shutil.rmtree(os.path.dirname(path), True)
+            logger.debug("Removed %s", path)
+    return Channel(f.fileno(), _timed_close(close, 1, stats))
+
+def accept_tcp(sock, streams, bufsize=0, linger=None, stats=None):
+    """
+    Accepts `streams` connections on the listening socket `sock` and returns
+    an output channel that sends data through them
+    """
+    with contextlib.closing(sock):
+        conns = [None] * streams
+        for _ in range(streams):
+            csock, csockaddr = sock.accept()
+            tune_socket(csock, bufsize, linger)
+            logger.debug("Received connection from %r", csockaddr)
+            idx = _header.unpack(_recv_exactly(csock, _header.size))[0] if streams > 1 else 0
+            conns[idx] = csock
+
+    if streams == 1:
+        return Channel(conns[0].fileno(), _timed_close(conns[0].close, 1, stats))
+    return _RelayOut(conns, bufsize, stats)
+
+def connect_tcp(host, port, streams, bufsize=0, stats=None):
+    """
+    Opens `streams` connections to `host`:`port` and returns an input channel
+    that receives data through them
+    """
+    conns = []
+    for i in range(streams):
+        sock = utils.connect_to(host, port, 10)
+        if sock is None:
+            raise Exception("Couldn't connect to %s:%d" % (host, port))
+        sock.settimeout(None)
+        tune_socket(sock, bufsize)
+        if streams > 1:
+            sock.sendall(_header.pack(i))
+        conns.append(sock)
+    logger.debug("Connected %d time(s) to TCP socket %s:%d for reading", streams, host, port)
+
+    if streams == 1:
+        return Channel(conns[0].fileno(), _timed_close(conns[0].close, 1, stats))
+    return _RelayIn(conns, bufsize, stats)
+
+class _Relay(Channel):
+
+    def __init__(self, fd, other_fd, conns, bufsize, stats):
+        Channel.__init__(self, fd, self._finish)
+        set_pipe_size(fd, bufsize)
+        self._other_fd = other_fd
+        self._conns = conns
+        self._stats = stats
+        self._bytes = 0
+        self._start = time.time()
+        self._thread = threading.Thread(target=self._relay_and_close)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _relay_and_close(self):
+        try:
+            self._relay()
+        except:
+            logger.exception("Error while relaying streamed data")
+        finally:
+            os.close(self._other_fd)
+            for c in self._conns:
+                c.close()
+
+    def _finish(self):
+        os.close(self._fd)
+        self._thread.join()
+        if self._stats:
+            self._stats.record(self._bytes, time.time() - self._start, len(self._conns))
+
+class _RelayOut(_Relay):
+    """
+    Reads what the bash process writes into a pipe and sends it in chunks,
+    round-robin, through the connections. An empty chunk marks the end.
+    """
+
+    def __init__(self, conns, bufsize, stats):
+        r, w = os.pipe()
+        _Relay.__init__(self, w, r, conns, bufsize, stats)
+
+    def _relay(self):
+        n = len(self._conns)
+        i = 0
+        while True:
+            data = os.read(self._other_fd, RELAY_CHUNK_SIZE)
+            self._conns[i % n].sendall(_header.pack(len(data)) + data)
+            i += 1
+            if not data:
+                break
+            self._bytes += len(data)
+
+class _RelayIn(_Relay):
+    """
+    Reads the chunks sent through the connections in the same order in which
+    they were sent, and writes them into the pipe read by the bash process.
+    """
+
+    def __init__(self, conns, bufsize, stats):
+        r, w = os.pipe()
+        _Relay.__init__(self, r, w, conns, bufsize, stats)
+
+    def _relay(self):
+        n = len(self._conns)
+        i = 0
+        while True:
+            sock = self._conns[i % n]
+            size = _header.unpack(_recv_exactly(sock, _header.size))[0]
+            if not size:
+                break
+            _write_all(self._other_fd, _recv_exactly(sock, size))
+            self._bytes += size
+            i += 1
+
+def parse_tcp_url(data):
+    """
+    Returns the host, port and number of connections of a tcp:// channel URL
+    """
+    url = urlparse.urlparse(utils.b2s(data))
+    streams = int(urlparse.parse_qs(url.query).get('streams', ['1'])[0])
+    return url.hostname, url.port, streams
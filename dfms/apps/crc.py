@@ -23,13 +23,188 @@
 Module containing an example application that calculates a CRC value
 """
 
-from dfms.drop import BarrierAppDROP
+import collections
+import hashlib
+import mmap
+import os
+from multiprocessing.pool import ThreadPool
+import zlib
+
+import six
+
+from dfms.drop import BarrierAppDROP, AbstractDROP, FileDROP
+from dfms.io import OpenMode
 
 
 try:
     from crc32c import crc32  # @UnusedImport
+    _crc32c = crc32
 except:
     from binascii import crc32  # @Reimport
+    _crc32c = None
+
+def _gf2_times(mat, vec):
+    s = 0
+    i = 0
+    while vec:
+        if vec & 1:
+            s ^= mat[i]
+        vec >>= 1
+        i += 1
+    return s
+
+def _gf2_square(mat):
+    return [_gf2_times(mat, row) for row in mat]
+
+def _crc_combiner(poly):
+    """
+    Returns a function that combines the CRCs of two consecutive pieces of
+    data, ``crc1`` and ``crc2``, into the CRC of both, given the length of the
+    second piece. `poly` is the reflected CRC polynomial. The operators used
+    to shift ``crc1`` are computed only once per length.
+    """
+
+    operators = {}
+
+    def operator(length):
+        # The same steps zlib's crc32_combine takes to apply `length` zero
+        # bytes to a CRC, applied instead to each bit of a CRC
+        odd = [poly] + [1 << n for n in range(31)]
+        even = _gf2_square(odd)
+        odd = _gf2_square(even)
+        steps = []
+        while length:
+            even = _gf2_square(odd)
+            if length & 1:
+                steps.append(even)
+            length >>= 1
+            if not length:
+                break
+            odd = _gf2_square(even)
+            if length & 1:
+                steps.append(odd)
+            length >>= 1
+        op = []
+        for n in range(32):
+            vec = 1 << n
+            for mat in steps:
+                vec = _gf2_times(mat, vec)
+            op.append(vec)
+        return op
+
+    def combine(crc1, crc2, len2):
+        if len2 <= 0:
+            return crc1
+        if len2 not in operators:
+            operators[len2] = operator(len2)
+        return _gf2_times(operators[len2], crc1) ^ crc2
+
+    return combine
+
+def _adler32_combine(adler1, adler2, len2):
+    # A port of zlib's adler32_combine
+    base = 65521
+    rem = len2 % base
+    sum1 = adler1 & 0xffff
+    sum2 = (rem * sum1) % base
+    sum1 += (adler2 & 0xffff) + base - 1
+    sum2 += ((adler1 >> 16) & 0xffff) + ((adler2 >> 16) & 0xffff) + base - rem
+    if sum1 >= base: sum1 -= base
+    if sum1 >= base: sum1 -= base
+    if sum2 >= (base << 1): sum2 -= (base << 1)
+    if sum2 >= base: sum2 -= base
+    return sum1 | (sum2 << 16)
+
+# name -> (function, initial value, combine function)
+_checksums = {
+    'crc32': (zlib.crc32, 0, _crc_combiner(0xEDB88320)),
+    'adler32': (zlib.adler32, 1, _adler32_combine),
+}
+if _crc32c is not None:
+    _checksums['crc32c'] = (_crc32c, 0, _crc_combiner(0x82F63B78))
+
+#: The algorithm used by default, the same used by DROPs for their checksums
+DEFAULT_ALGORITHM = 'crc32c' if _crc32c is not None else 'crc32'
+
+def algorithms():
+    """
+    Returns the names of the algorithms supported by `checksum`
+    """
+    return sorted(_checksums) + sorted(hashlib.algorithms_guaranteed if six.PY3 else hashlib.algorithms)
+
+def _chunk_checksum(f, init, chunk):
+    return f(chunk, init) & 0xffffffff
+
+def checksum(chunks, algorithm=DEFAULT_ALGORITHM, pool=None, depth=8):
+    """
+    Calculates the checksum of the data given as the successive buffers of
+    `chunks` using `algorithm`. If a `pool` of threads is given CRC and
+    Adler-32 checksums of different chunks are calculated in parallel (the
+    underlying functions release the GIL) and combined into the final one,
+    keeping at most `depth` chunks in flight. Hash algorithms from hashlib
+    are calculated serially, and their hexdigest returned.
+    """
+    if algorithm not in _checksums:
+        try:
+            h = hashlib.new(algorithm)
+        except ValueError:
+            raise ValueError('Unsupported checksum algorithm: %s' % (algorithm,))
+        for chunk in chunks:
+            h.update(chunk)
+        return h.hexdigest()
+
+    f, init, combine = _checksums[algorithm]
+    if pool is None:
+        crc = init
+        for chunk in chunks:
+            crc = f(chunk, crc)
+        return crc & 0xffffffff
+
+    crc = [None]
+    pending = collections.deque()
+    def collect():
+        result, n = pending.popleft()
+        value = result.get()
+        crc[0] = value if crc[0] is None else combine(crc[0], value, n)
+
+    for chunk in chunks:
+        pending.append((pool.apply_async(_chunk_checksum, (f, init, chunk)), len(chunk)))
+        if len(pending) >= depth:
+            collect()
+    while pending:
+        collect()
+    return init if crc[0] is None else crc[0]
+
+def _read_chunks(read, bufsize):
+    buf = read(bufsize)
+    while buf:
+        yield buf
+        buf = read(bufsize)
+
+def _file_checksum(path, bufsize, algorithm, pool=None):
+    """
+    Calculates the checksum of the file at `path` by mapping it in memory and
+    handing out chunks of `bufsize` bytes without copying them
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return checksum([], algorithm)
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    # The map is not closed explicitly because the threads of the pool might
+    # still hold references to the last chunks; it goes away with them
+    view = m if six.PY2 else memoryview(m)
+    chunks = (view[i:i + bufsize] for i in range(0, size, bufsize))
+    return checksum(chunks, algorithm, pool)
+
+def _io_crc(io, bufsize, algorithm=DEFAULT_ALGORITHM):
+    # Runs in a separate process when a process pool is in use
+    io.open(OpenMode.OPEN_READ)
+    try:
+        return checksum(_read_chunks(io.read, bufsize), algorithm)
+    finally:
+        io.close()
 
 class CRCApp(BarrierAppDROP):
     '''
@@ -37,8 +212,21 @@ class CRCApp(BarrierAppDROP):
     consumes. It assumes the DROP being consumed is not a container.
     This is a simple example of an BarrierAppDROP being implemented, and
     not something really intended to be used in a production system
+
+    The checksum `algorithm` can be any of those returned by `algorithms`.
+    Data is read `bufsize` bytes at a time; when `threads` is bigger than 1
+    the checksums of these chunks are calculated in parallel by that many
+    threads and combined into the final value. Local FileDROPs are mapped
+    into memory rather than read if `mmap` is set.
     '''
 
+    def initialize(self, **kwargs):
+        super(CRCApp, self).initialize(**kwargs)
+        self._algorithm = self._getArg(kwargs, 'algorithm', DEFAULT_ALGORITHM)
+        self._bufsize = self._getArg(kwargs, 'bufsize', 4 * 1024 ** 2)
+        self._threads = self._getArg(kwargs, 'threads', 1)
+        self._mmap = self._getArg(kwargs, 'mmap', True)
+
     def run(self):
         if len(self.inputs) != 1:
             raise Exception("This application read only from one DROP")
@@ -48,15 +236,43 @@ class CRCApp(BarrierAppDROP):
         inputDrop = self.inputs[0]
         outputDrop = self.outputs[0]
 
-        bufsize = 4 * 1024 ** 2
-        desc = inputDrop.open()
-        buf = inputDrop.read(desc, bufsize)
-        crc = 0
-        while buf:
-            crc = crc32(buf, crc)
-            buf = inputDrop.read(desc, bufsize)
-        inputDrop.close(desc)
+        bufsize = self._bufsize
+        algorithm = self._algorithm
+
+        pool = ThreadPool(self._threads) if self._threads > 1 else None
+        try:
+            crc = self._calculate(inputDrop, bufsize, algorithm, pool)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
 
         # Rely on whatever implementation we decide to use
         # for storing our data
         outputDrop.write(str(crc))
+
+    def _calculate(self, inputDrop, bufsize, algorithm, pool):
+
+        if self._mmap and isinstance(inputDrop, FileDROP):
+            if pool is None:
+                return self.run_in_process(_file_checksum, inputDrop.path, bufsize, algorithm)
+            return _file_checksum(inputDrop.path, bufsize, algorithm, pool)
+
+        # Local DROPs are passed by reference to our process pool (if any),
+        # remote ones are read through their proxies
+        if isinstance(inputDrop, AbstractDROP):
+            if pool is None:
+                return self.run_in_process(_io_crc, inputDrop.getDataIO(), bufsize, algorithm)
+            io = inputDrop.getDataIO()
+            io.open(OpenMode.OPEN_READ)
+            try:
+                return checksum(_read_chunks(io.read, bufsize), algorithm, pool)
+            finally:
+                io.close()
+
+        desc = inputDrop.open()
+        try:
+            chunks = _read_chunks(lambda n: inputDrop.read(desc, n), bufsize)
+            return checksum(chunks, algorithm, pool)
+        finally:
+            inputDrop.close(desc)
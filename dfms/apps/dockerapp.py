@@ -24,7 +24,6 @@ Module containing docker-related applications and functions
 '''
 
 import collections
-import functools
 import logging
 import os
 import threading
@@ -67,6 +66,181 @@ class ContainerIpWaiter(object):
         self._evt.wait(timeout)
         return self._uid, self._containerIp
 
+class WarmContainer(object):
+    """
+    A long-lived container kept by a DockerManager, into which commands are
+    exec'ed. `binds` are the volume bindings it was created with.
+    """
+
+    def __init__(self, key, cId, ip, binds):
+        self.key = key
+        self.id = cId
+        self.ip = ip
+        self.binds = binds
+
+class DockerManager(object):
+    """
+    Docker resources shared by DockerApps: a single client to the docker
+    daemon, a cache of the images known to be present (pulling each missing
+    image only once, no matter how many DockerApps need it at the same time)
+    and, if `warm_containers` is bigger than 0, a pool of up to that many idle,
+    long-lived containers per image in which DockerApps exec their commands
+    instead of creating and starting a new container each time.
+
+    A warm container is reused only by DockerApps with the same image, user
+    and environment whose volume bindings are a subset of the container's.
+    """
+
+    # Keeps a warm container alive until it's removed
+    _keepalive = '/bin/bash -c "while true; do sleep 3600; done"'
+
+    def __init__(self, warm_containers=0, client=None):
+        self._warm_containers = warm_containers
+        self._client = client
+        self._lock = threading.Lock()
+        self._images = None
+        self._pulls = {}
+        self._idle = collections.defaultdict(list)
+        self._busy = set()
+
+    @property
+    def warm_containers(self):
+        return self._warm_containers
+
+    @property
+    def client(self):
+        """
+        The docker client shared by all users of this manager
+        """
+        with self._lock:
+            if self._client is None:
+                self._client = AutoVersionClient(**DockerApp._kwargs_from_env())
+            return self._client
+
+    def ensure_image(self, image):
+        """
+        Makes sure `image` is present in the docker daemon, pulling it if
+        necessary. Concurrent calls for the same image wait for a single pull.
+        """
+        c = self.client
+        with self._lock:
+            if self._images is None:
+                self._images = set()
+                for i in c.images():
+                    self._images.update(i['RepoTags'] or [])
+            if image in self._images:
+                logger.debug("Image '%s' found, no need to pull it", image)
+                return
+            pulled = self._pulls.get(image)
+            if pulled is None:
+                pulled = self._pulls[image] = threading.Event()
+                puller = True
+            else:
+                puller = False
+
+        if not puller:
+            logger.debug("Waiting for image '%s' to be pulled", image)
+            pulled.wait()
+            if image not in self._images:
+                raise Exception("Image '%s' could not be pulled" % (image,))
+            return
+
+        try:
+            logger.debug("Image '%s' not found, pulling it", image)
+            start = time.time()
+            c.pull(image)
+            end = time.time()
+            logger.debug("Took %.2f [s] to pull image '%s'", (end-start), image)
+            with self._lock:
+                self._images.add(image)
+        finally:
+            with self._lock:
+                del self._pulls[image]
+            pulled.set()
+
+    def acquire(self, image, binds, user, env):
+        """
+        Returns a warm container for `image` that will run its commands as
+        `user` with `env`, and with at least the volume bindings `binds`.
+        An idle container is reused if possible; otherwise a new one is created
+        """
+        key = (image, user, tuple(sorted(env.items())))
+        binds = frozenset(binds)
+        with self._lock:
+            for wc in self._idle[key]:
+                if binds <= wc.binds:
+                    self._idle[key].remove(wc)
+                    self._busy.add(wc)
+                    logger.debug("Reusing warm container %s", wc.id)
+                    return wc
+
+        c = self.client
+        vols = [b.split(':')[1] for b in binds]
+        host_config = c.create_host_config(binds=list(binds))
+        container = c.create_container(image, self._keepalive, volumes=vols,
+                                       host_config=host_config, user=user,
+                                       environment=env)
+        cId = container['Id']
+        c.start(container)
+        ip = c.inspect_container(container)['NetworkSettings']['IPAddress']
+        logger.info("Started warm container %s for image %s", cId, image)
+
+        wc = WarmContainer(key, cId, ip, binds)
+        with self._lock:
+            self._busy.add(wc)
+        return wc
+
+    def release(self, wc, reuse=True):
+        """
+        Gives back a warm container obtained via `acquire`. It is kept for
+        reuse if `reuse` is set and there is room for it; otherwise it's removed
+        """
+        with self._lock:
+            self._busy.discard(wc)
+            idle = self._idle[wc.key]
+            if reuse and len(idle) < self._warm_containers:
+                idle.append(wc)
+                return
+        self._remove(wc)
+
+    def _remove(self, wc):
+        logger.debug("Removing warm container %s", wc.id)
+        try:
+            self.client.remove_container(wc.id, force=True)
+        except:
+            logger.exception("Error while removing container %s", wc.id)
+
+    def close(self):
+        """
+        Removes all warm containers and closes the docker client
+        """
+        with self._lock:
+            containers = [wc for idle in self._idle.values() for wc in idle]
+            containers += list(self._busy)
+            self._idle.clear()
+            self._busy.clear()
+        for wc in containers:
+            self._remove(wc)
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+_default_manager = None
+_default_manager_lock = threading.Lock()
+
+def default_manager():
+    """
+    Returns the DockerManager used by DockerApps that have not been given
+    one explicitly. It shares the docker client and image cache, but keeps no
+    warm containers.
+    """
+    global _default_manager
+    with _default_manager_lock:
+        if _default_manager is None:
+            _default_manager = DockerManager()
+        return _default_manager
+
 class DockerApp(BarrierAppDROP):
     """
     A BarrierAppDROP that represents a process running in a container
@@ -171,6 +345,15 @@ class DockerApp(BarrierAppDROP):
     where necessary. See `self.handleInterest` for more information about this
     mechanism.
 
+    **Container reuse**
+
+    The docker client, the check for the presence of the image and its
+    pulling are shared among DockerApps via a `DockerManager`. If the manager
+    of a DockerApp keeps warm containers (see `docker_manager`), the command is
+    exec'ed in a long-lived container instead of in a new one. Paths inside
+    such containers are the same, but because the container is reused inputs
+    are bound up to their dirnames, like outputs.
+
     **TODO**
 
     Processes in containers might not always exit by themselves, and the
@@ -231,24 +414,25 @@ class DockerApp(BarrierAppDROP):
         logger.info("%r with image '%s' and command '%s' created", self, self._image, self._command)
 
         # Check if we have the image; otherwise pull it.
-        extra_kwargs = self._kwargs_from_env()
-        c = AutoVersionClient(**extra_kwargs)
-        found = functools.reduce(lambda a,b: a or self._image in b['RepoTags'], c.images(), False)
-
-        if not found:
-            logger.debug("Image '%s' not found, pulling it", self._image)
-            start = time.time()
-            c.pull(self._image)
-            end = time.time()
-            logger.debug("Took %.2f [s] to pull image '%s'", (end-start), self._image)
-        else:
-            logger.debug("Image '%s' found, no need to pull it", self._image)
-        c.close()
+        self._docker_manager = None
+        self.docker_manager.ensure_image(self._image)
 
         self._containerIp = None
         self._containerId = None
         self._waiters = []
 
+    @property
+    def docker_manager(self):
+        """
+        The DockerManager used by this application. Defaults to the one
+        returned by `default_manager`.
+        """
+        return self._docker_manager or default_manager()
+
+    @docker_manager.setter
+    def docker_manager(self, docker_manager):
+        self._docker_manager = docker_manager
+
     @property
     def containerIp(self):
         return self._containerIp
@@ -296,8 +480,11 @@ class DockerApp(BarrierAppDROP):
         # directory, maintaining the rest of their original paths.
         # Outputs are bound only up to their dirname (see class doc for details)
         # Volume bindings are setup for FileDROPs and DirectoryContainers only
-        vols = [i.path for i in dockerInputs.values()] + [os.path.dirname(o.path) for o in dockerOutputs.values()]
-        binds  = [                i.path  + ":" +                  dockerInputs[uid].path  for uid,i in fsInputs.items()]
+        manager = self.docker_manager
+        warm = manager.warm_containers > 0
+        ipath = os.path.dirname if warm else lambda path: path
+        vols = [ipath(i.path) for i in dockerInputs.values()] + [os.path.dirname(o.path) for o in dockerOutputs.values()]
+        binds  = [ipath(i.path)           + ":" + ipath(dockerInputs[uid].path)            for uid,i in fsInputs.items()]
         binds += [os.path.dirname(o.path) + ":" + os.path.dirname(dockerOutputs[uid].path) for uid,o in fsOutputs.items()]
         binds += [host_path + ":" + container_path  for host_path, container_path in self._additionalBindings.items()]
         logger.debug("Volume bindings: %r", binds)
@@ -335,8 +522,12 @@ class DockerApp(BarrierAppDROP):
 
         logger.debug("Command after user creation and wrapping is: %s", cmd)
 
-        extra_kwargs = self._kwargs_from_env()
-        c = AutoVersionClient(**extra_kwargs)
+        if warm:
+            self._runInWarmContainer(manager, cmd, binds, user, env)
+        else:
+            self._runInNewContainer(manager.client, cmd, vols, binds, user, env)
+
+    def _runInNewContainer(self, c, cmd, vols, binds, user, env):
 
         # Remove the container unless it's specified that we should keep it
         # (used below)
@@ -386,7 +577,33 @@ class DockerApp(BarrierAppDROP):
             raise Exception(msg)
 
         rm(container)
-        c.close()
+
+    def _runInWarmContainer(self, manager, cmd, binds, user, env):
+
+        wc = manager.acquire(self._image, binds, user, env)
+        ok = False
+        try:
+            self._containerId = cId = wc.id
+            self.containerIp = wc.ip
+
+            c = manager.client
+            start = time.time()
+            execId = c.exec_create(cId, cmd)
+            output = c.exec_start(execId)
+            self._exitCode = c.exec_inspect(execId)['ExitCode']
+            end = time.time()
+            logger.info("Command in container %s finished in %.2f [s] with exit code %d", cId, (end-start), self._exitCode)
+
+            if self._exitCode != 0:
+                msg = "Command in container %s didn't finish successfully (exit code %d)" % (cId, self._exitCode)
+                logger.error(msg + ", output follows.\n%s", output)
+                raise Exception(msg)
+            logger.debug("Command in container %s finished successfully, output follows.\n%s", cId, output)
+            ok = True
+        finally:
+            # Containers where commands failed might have been left in a bad
+            # state, so they are not reused
+            manager.release(wc, reuse=ok)
 
     @staticmethod
     def _kwargs_from_env(ssl_version=None, assert_hostname=False):
@@ -20,23 +20,120 @@
 #    MA 02111-1307  USA
 #
 
+import json
+import logging
+from multiprocessing.pool import ThreadPool
 import os
+import threading
 import uuid
+
 from dfms.drop import ContainerDROP
 from dfms.drop import FileDROP
 
 
+logger = logging.getLogger(__name__)
+
+try:
+    _scandir = os.scandir
+except AttributeError:
+    try:
+        from scandir import scandir as _scandir  # @UnresolvedImport
+    except ImportError:
+        _scandir = None
+
+def scan_dir(path):
+    """
+    Returns the files and subdirectories of directory `path` as two lists,
+    the first with ``(path, stat)`` tuples and the second with paths. Symbolic
+    links to directories are not followed.
+    """
+    files, dirs = [], []
+    if _scandir is not None:
+        for entry in _scandir(path):
+            if entry.is_dir(follow_symlinks=False):
+                dirs.append(entry.path)
+            elif entry.is_file():
+                files.append((entry.path, entry.stat()))
+        return files, dirs
+
+    for name in os.listdir(path):
+        fpath = os.path.join(path, name)
+        if os.path.islink(fpath) and os.path.isdir(fpath):
+            continue
+        if os.path.isdir(fpath):
+            dirs.append(fpath)
+        elif os.path.isfile(fpath):
+            files.append((fpath, os.stat(fpath)))
+    return files, dirs
+
+def scan_tree(root, threads=1):
+    """
+    Recursively scans the directory `root`, scanning up to `threads`
+    subdirectories in parallel, and returns ``(path, stat)`` tuples for all
+    the files found.
+    """
+    if threads <= 1:
+        found = []
+        pending = [root]
+        while pending:
+            files, dirs = scan_dir(pending.pop())
+            found += files
+            pending += dirs
+        return found
+
+    found = []
+    lock = threading.Lock()
+    finished = threading.Event()
+    state = {'pending': 0, 'error': None}
+    pool = ThreadPool(threads)
+
+    def scan(path):
+        try:
+            files, dirs = scan_dir(path)
+        except Exception as e:
+            files, dirs = [], []
+            state['error'] = e
+        with lock:
+            found.extend(files)
+            state['pending'] += len(dirs) - 1
+            done = state['pending'] == 0
+        for d in dirs:
+            pool.apply_async(scan, (d,))
+        if done:
+            finished.set()
+
+    try:
+        state['pending'] = 1
+        pool.apply_async(scan, (root,))
+        finished.wait()
+    finally:
+        pool.close()
+        pool.join()
+    if state['error']:
+        raise state['error']
+    return found
+
 class FileImportApp(ContainerDROP):
     """
     Recursively scans a directory (dirname) and checks for files with
     a particular extension (ext). If a match is made then a FileDROP
     is created which contains the path to the file. The FileDROP is then added
     to the FileImportApp (ContainerDROP)
+
+    Up to `threads` subdirectories are scanned in parallel. The scanning
+    happens at initialization time unless `lazy` is set, in which case it
+    happens when the children are first requested. If an `index` file is given
+    the size and modification time of the imported files are stored there, and
+    subsequent scans (by this or later FileImportApps using the same index)
+    import only new or modified files.
     """
 
     def initialize(self, **kwargs):
         super(ContainerDROP, self).initialize(**kwargs)
         self._children = []
+        self._scanned = False
+        self._scanLock = threading.Lock()
+        self._known = None
 
         self._dirname = self._getArg(kwargs, 'dirname', None)
         if not self._dirname:
@@ -47,17 +144,69 @@ class FileImportApp(ContainerDROP):
         if not ext:
             raise Exception('ext not defined')
         self._ext = [x.lower() for x in ext]
-        self._scan_and_import_files()
+        self._threads = int(self._getArg(kwargs, 'threads', 4))
+        self._index = self._getArg(kwargs, 'index', None)
+        if not self._getArg(kwargs, 'lazy', False):
+            self.scan()
+
+    @property
+    def children(self):
+        if not self._scanned:
+            self.scan()
+        return self._children[:]
+
+    def _loadIndex(self):
+        if not self._index or not os.path.exists(self._index):
+            return {}
+        with open(self._index) as f:
+            return json.load(f)
+
+    def _saveIndex(self, index):
+        tmp = self._index + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(index, f)
+        os.rename(tmp, self._index)
+
+    def scan(self):
+        """
+        Scans the directory, adding a FileDROP child for each matching file
+        that was not found by previous scans (or that has been modified since)
+        and returns the new children
+        """
+        with self._scanLock:
+            new = self._scan_and_import_files()
+            self._scanned = True
+            return new
 
     def _scan_and_import_files(self):
-        for root, dirs, files in os.walk(self._dirname):
-            for f in files:
-                _, ext = os.path.splitext(f)
-                if ext.lower() in self._ext:
-                    path = '{0}/{1}'.format(root, f)
-                    fd = FileDROP(str(uuid.uuid1()),
-                                  str(uuid.uuid1()),
-                                  filepath = path,
-                                  check_filepath_exists = True)
-                    self._children.append(fd)
-                    fd._parent = self
+
+        # path -> [size, mtime] of the files already imported
+        if self._known is None:
+            self._known = self._loadIndex()
+        known = self._known
+        children = set(c.path for c in self._children)
+        found = scan_tree(self._dirname, self._threads)
+
+        new = []
+        for path, st in sorted(found):
+            _, ext = os.path.splitext(path)
+            if ext.lower() not in self._ext:
+                continue
+            info = [st.st_size, st.st_mtime]
+            unchanged = known.get(path) == info
+            known[path] = info
+            if unchanged or path in children:
+                continue
+
+            # The file was just seen, so there's no need to check it exists;
+            # its oid/uid identify the file
+            fid = str(uuid.uuid5(uuid.NAMESPACE_URL, path))
+            fd = FileDROP(fid, fid, filepath=path)
+            self._children.append(fd)
+            fd._parent = self
+            new.append(fd)
+
+        if self._index:
+            self._saveIndex(known)
+        logger.info("%r: %d files scanned, %d new children", self, len(found), len(new))
+        return new
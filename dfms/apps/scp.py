@@ -19,6 +19,8 @@
 #    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
 #    MA 02111-1307  USA
 #
+import time
+
 from dfms import remote
 from dfms.drop import BarrierAppDROP
 
@@ -36,6 +38,16 @@ class ScpApp(BarrierAppDROP):
     its input and outputs) this application will copy data FROM another host or
     TO other host. This application's node must thus coincide with one of the
     two I/O DROPs.
+
+    Data is transferred by `dfms.remote.transferTo` and `transferFrom` over
+    `streams` parallel SFTP streams on cached connections to `port`. Files
+    in a DirectoryContainer are spread across streams, and files bigger than
+    `chunkSize` are split into ranges transferred by different streams. The
+    contents of a DirectoryContainer input are copied into the output
+    directory. While transferring, ``transferProgress`` events are fired at
+    most every `progressInterval` seconds with the number of bytes
+    ``transferred`` so far and the ``total``. A `streams` value of 0 falls
+    back to the scp protocol over a new connection.
     """
 
     def initialize(self, **kwargs):
@@ -43,6 +55,10 @@ class ScpApp(BarrierAppDROP):
         self._remoteUser = self._getArg(kwargs, 'remoteUser', None)
         self._pkeyPath   = self._getArg(kwargs, 'pkeyPath', None)
         self._timeout    = self._getArg(kwargs, 'timeout', None)
+        self._port       = int(self._getArg(kwargs, 'port', 22))
+        self._streams    = int(self._getArg(kwargs, 'streams', 4))
+        self._chunkSize  = int(self._getArg(kwargs, 'chunkSize', 64 * 1024 ** 2))
+        self._progressInterval = float(self._getArg(kwargs, 'progressInterval', 1.))
 
     def run(self):
 
@@ -80,7 +96,24 @@ class ScpApp(BarrierAppDROP):
         # why we can't simply do:
         # recursive = isinstance(inp, DirectoryContainer)
         recursive = hasattr(inp, 'children')
+        if not self._streams:
+            if self.node == inp.node:
+                remote.copyTo(out.node, inp.path, remotePath=out.path, recursive=recursive, username=self._remoteUser, pkeyPath=self._pkeyPath, timeout=self._timeout)
+            else:
+                remote.copyFrom(inp.node, inp.path, localPath=out.path, recursive=recursive, username=self._remoteUser, pkeyPath=self._pkeyPath, timeout=self._timeout)
+            return
+
+        kwargs = dict(username=self._remoteUser, pkeyPath=self._pkeyPath, port=self._port,
+                      timeout=self._timeout, streams=self._streams, chunkSize=self._chunkSize,
+                      progress=self._progress)
+        self._lastProgress = 0
         if self.node == inp.node:
-            remote.copyTo(out.node, inp.path, remotePath=out.path, recursive=recursive, username=self._remoteUser, pkeyPath=self._pkeyPath, timeout=self._timeout)
+            remote.transferTo(out.node, inp.path, out.path, **kwargs)
         else:
-            remote.copyFrom(inp.node, inp.path, localPath=out.path, recursive=recursive, username=self._remoteUser, pkeyPath=self._pkeyPath, timeout=self._timeout)
\ No newline at end of file
+            remote.transferFrom(inp.node, inp.path, out.path, **kwargs)
+
+    def _progress(self, transferred, total):
+        now = time.time()
+        if transferred == total or now - self._lastProgress >= self._progressInterval:
+            self._lastProgress = now
+            self._fire('transferProgress', transferred=transferred, total=total)
\ No newline at end of file
@@ -27,24 +27,124 @@ incoming data in a TCP socket.
 import contextlib
 import logging
 import socket
+import threading
+
+from six.moves import queue as Queue  # @UnresolvedImport
 
 from dfms.ddap_protocol import DROPRel, DROPLinkType
 from dfms.drop import BarrierAppDROP
-from dfms.exceptions import InvalidRelationshipException
+from dfms.exceptions import InvalidRelationshipException, InvalidDropException
 
 
 logger = logging.getLogger(__name__)
 
+class BufferPool(object):
+    """
+    A fixed number of preallocated buffers of a given size. Getting a buffer
+    blocks until one is available.
+    """
+
+    def __init__(self, count, size):
+        self._buffers = Queue.Queue()
+        for _ in range(count):
+            self._buffers.put(bytearray(size))
+
+    def get(self):
+        return self._buffers.get()
+
+    def put(self, buf):
+        self._buffers.put(buf)
+
+class FanOut(object):
+    """
+    Writes chunks of data held in buffers of a BufferPool into a number of
+    outputs, giving the buffers back to the pool once all outputs have
+    written them. A single output is written synchronously unless `threaded`
+    is set; multiple outputs are written asynchronously, each one by its own
+    thread.
+    """
+
+    def __init__(self, outputs, pool, depth, threaded=False):
+        self._outputs = outputs
+        self._pool = pool
+        self._lock = threading.Lock()
+        self._error = None
+        self._queues = []
+        self._threads = []
+        if threaded or len(outputs) > 1:
+            for out in outputs:
+                q = Queue.Queue(depth)
+                t = threading.Thread(target=self._writeAll, args=(out, q))
+                t.daemon = True
+                t.start()
+                self._queues.append(q)
+                self._threads.append(t)
+
+    def write(self, buf, n):
+        """
+        Writes the first `n` bytes of `buf` into all outputs
+        """
+        with self._lock:
+            if not self._queues:
+                try:
+                    self._outputs[0].write(memoryview(buf)[:n])
+                finally:
+                    self._pool.put(buf)
+                return
+            if self._error:
+                self._pool.put(buf)
+                raise self._error
+            chunk = [buf, n, len(self._queues)]
+            for q in self._queues:
+                q.put(chunk)
+
+    def _writeAll(self, out, q):
+        while True:
+            chunk = q.get()
+            if chunk is None:
+                break
+            buf, n, _ = chunk
+            try:
+                if not self._error:
+                    out.write(memoryview(buf)[:n])
+            except Exception as e:
+                logger.exception("Error while writing into %r", out)
+                self._error = e
+            finally:
+                with self._lock:
+                    chunk[2] -= 1
+                    if not chunk[2]:
+                        self._pool.put(buf)
+
+    def close(self):
+        """
+        Waits until all data has been written, raising any error found
+        """
+        for q in self._queues:
+            q.put(None)
+        for t in self._threads:
+            t.join()
+        if self._error:
+            raise self._error
+
 class SocketListenerApp(BarrierAppDROP):
     '''
     A BarrierAppDROP that listens on a socket for data. The server-side
-    socket expects only one client, and assumes that the client will close the
-    connection after all its data has been sent.
+    socket expects `connections` clients (one by default), and assumes that
+    each client will close its connection after all its data has been sent.
+
+    Data is received `bufsize` bytes at a time into a pool of `buffers`
+    preallocated buffers, optionally setting the size of the socket's receive
+    buffer to `rcvbuf`. When expecting multiple clients their data is written
+    in the order in which they connected if `merge` is ``ordered``
+    (the default), or as it arrives from all clients at the same time if it is
+    ``unordered``.
 
     This application expects no input DROPs, and therefore raises an
     exception whenever one is added. On the output side, one or more outputs
     can be specified with the restriction that they are not ContainerDROPs
-    so data can be written into them through the framework.
+    so data can be written into them through the framework. When more than
+    one output is given they are written asynchronously.
     '''
 
     _dryRun = False
@@ -66,6 +166,13 @@ class SocketListenerApp(BarrierAppDROP):
         self._host = host
         self._port = port
         self._reuseAddr = self._getArg(kwargs, 'reuseAddr', False)
+        self._bufsize = int(self._getArg(kwargs, 'bufsize', 65536))
+        self._buffers = int(self._getArg(kwargs, 'buffers', 16))
+        self._rcvbuf = int(self._getArg(kwargs, 'rcvbuf', 0))
+        self._connections = int(self._getArg(kwargs, 'connections', 1))
+        self._merge = self._getArg(kwargs, 'merge', 'ordered')
+        if self._merge not in ('ordered', 'unordered'):
+            raise InvalidDropException(self, 'Invalid merge mode: %s' % (self._merge,))
 
     def run(self):
 
@@ -78,25 +185,67 @@ class SocketListenerApp(BarrierAppDROP):
         if self._dryRun:
             return
 
-        # Accept one connection at most
+        pool = BufferPool(self._buffers, self._bufsize)
+        fanout = FanOut(outs, pool, self._buffers)
+
+        # Accept the expected number of connections. In ordered mode they are
+        # read one after the other, otherwise all at the same time.
+        # The receive buffer size is inherited by the accepted sockets
         serverSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         with contextlib.closing(serverSocket):
             if self._reuseAddr:
                 serverSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if self._rcvbuf:
+                serverSocket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self._rcvbuf)
             serverSocket.bind((self.host, self.port))
-            serverSocket.listen(1)
-            logger.debug('Listening for a TCP connection on %s:%d', self.host, self.port)
-            clientSocket, address = serverSocket.accept()
-            logger.info('Accepted connection from %s:%d', address[0], address[1])
+            serverSocket.listen(self._connections)
+            logger.debug('Listening for %d TCP connection(s) on %s:%d', self._connections, self.host, self.port)
+
+            try:
+                if self._merge == 'ordered':
+                    for _ in range(self._connections):
+                        self._receive(self._accept(serverSocket), pool, fanout)
+                else:
+                    self._receiveAll(serverSocket, pool, fanout)
+            finally:
+                fanout.close()
+
+    def _accept(self, serverSocket):
+        clientSocket, address = serverSocket.accept()
+        logger.info('Accepted connection from %s:%d', address[0], address[1])
+        return clientSocket
+
+    def _receive(self, clientSocket, pool, fanout):
 
         # Simply write the data we receive into our outputs
         with contextlib.closing(clientSocket):
             while True:
-                data = clientSocket.recv(4096)
-                if not data:
+                buf = pool.get()
+                n = clientSocket.recv_into(buf)
+                if not n:
+                    pool.put(buf)
                     break
-                for out in outs:
-                    out.write(data)
+                fanout.write(buf, n)
+
+    def _receiveAll(self, serverSocket, pool, fanout):
+
+        errors = []
+        def receive(clientSocket):
+            try:
+                self._receive(clientSocket, pool, fanout)
+            except Exception as e:
+                logger.exception("Error while receiving data")
+                errors.append(e)
+
+        threads = []
+        for _ in range(self._connections):
+            t = threading.Thread(target=receive, args=(self._accept(serverSocket),))
+            t.start()
+            threads.append(t)
+        for t in threads:
+            t.join()
+        if errors:
+            raise errors[0]
 
     @property
     def host(self):
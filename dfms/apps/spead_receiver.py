@@ -24,17 +24,99 @@ Module containing an (python) application that receives spead2 data
 """
 
 import logging
+import threading
+
+import six
 
 try:
     import spead2.recv
 except:
     pass
     
+from dfms.apps.socket_listener import BufferPool, FanOut
 from dfms.drop import BarrierAppDROP
 
 
 logger = logging.getLogger(__name__)
 
+def _byteview(data):
+    """
+    Returns a memoryview over the bytes of `data`, any object supporting the
+    buffer protocol
+    """
+    view = memoryview(data)
+    if six.PY3 and (view.ndim != 1 or view.format != 'B'):
+        view = view.cast('B')
+    return view
+
+class HeapBatcher(object):
+    """
+    Accumulates the heap payloads given to it into `buffers` buffers of
+    `batchSize` bytes, which are written into `outputs` by separate threads
+    once they are full, or if `flushInterval` seconds pass without them being
+    written.
+    """
+
+    def __init__(self, outputs, batchSize, buffers=4, flushInterval=0.1):
+        self._batchSize = batchSize
+        self._pool = BufferPool(buffers, batchSize)
+        self._fanout = FanOut(outputs, self._pool, buffers, threaded=True)
+        self._lock = threading.Lock()
+        self._buf = None
+        self._n = 0
+        self._finished = threading.Event()
+        self._flushInterval = flushInterval
+        self._flusher = threading.Thread(target=self._flushPeriodically, name='HeapBatcherFlusher')
+        self._flusher.daemon = True
+        self._flusher.start()
+
+    def add(self, data):
+        """
+        Copies the contents of `data` into the current batch, handing full
+        batches over to the outputs
+        """
+        view = _byteview(data)
+        offset, size = 0, len(view)
+        with self._lock:
+            while offset < size:
+                if self._buf is None:
+                    self._buf = self._pool.get()
+                n = min(size - offset, self._batchSize - self._n)
+                self._buf[self._n:self._n + n] = view[offset:offset + n]
+                self._n += n
+                offset += n
+                if self._n == self._batchSize:
+                    self._flush()
+
+    def _flush(self):
+        if self._n:
+            buf, n = self._buf, self._n
+            self._buf, self._n = None, 0
+            self._fanout.write(buf, n)
+
+    def flush(self):
+        """
+        Hands over the current batch to the outputs, even if not full
+        """
+        with self._lock:
+            self._flush()
+
+    def _flushPeriodically(self):
+        while not self._finished.wait(self._flushInterval):
+            try:
+                self.flush()
+            except:
+                logger.exception("Error while flushing heap data")
+
+    def close(self):
+        """
+        Writes all pending data into the outputs, raising any error found
+        """
+        self._finished.set()
+        self._flusher.join()
+        self.flush()
+        self._fanout.close()
+
 class SpeadReceiverApp(BarrierAppDROP):
     """
     A BarrierAppDROP that listens for data using the SPEAD protocol.
@@ -44,6 +126,13 @@ class SpeadReceiverApp(BarrierAppDROP):
     it is closed. Each heap sent through the stream is checked for the item, and
     once found its data is written into each output of this application.
 
+    Payloads are accumulated in `batchBuffers` buffers of `batchSize` bytes,
+    which are written into the outputs from a separate thread when full or
+    after `flushInterval` seconds, so the heap rate is not limited by the
+    per-write overhead of the outputs. A `batchSize` of 0 writes each payload
+    directly. The number of received, lost (judging by gaps in the heap
+    counters) and incomplete heaps can be found in `stats` after running.
+
     Just like the SocketListenerApp, this application expects no input
     DROPs, and therefore raises an exception whenever one is added. On the
     output side, one or more outputs can be specified with the restriction that
@@ -71,6 +160,21 @@ class SpeadReceiverApp(BarrierAppDROP):
         self._mpInitial        = self._getArg(kwargs, 'mpInitial', 1)
         self._tpThreads        = self._getArg(kwargs, 'tpThreads', 1)
 
+        # Batching of writes into the outputs
+        self._batchSize        = self._getArg(kwargs, 'batchSize', 4*1024*1024)
+        self._batchBuffers     = self._getArg(kwargs, 'batchBuffers', 4)
+        self._flushInterval    = self._getArg(kwargs, 'flushInterval', 0.1)
+
+        self._resetStats()
+
+    def _resetStats(self):
+        self._lastCnt = None
+        self._stats = {'heaps': 0, 'heapsLost': 0, 'incompleteHeaps': 0, 'packets': None}
+
+    @property
+    def stats(self):
+        return self._stats
+
     def run(self):
 
         # Create the stream with the given thread pool
@@ -88,20 +192,52 @@ class SpeadReceiverApp(BarrierAppDROP):
                                        initial=self._mpInitial)
         stream.set_memory_pool(memoryPool)
 
+        self._resetStats()
+        self._batcher = None
+        if self._batchSize and self.outputs:
+            self._batcher = HeapBatcher(self.outputs, self._batchSize,
+                                        self._batchBuffers, self._flushInterval)
+
         # Read heaps from the incoming stream until there are no more
-        while True:
-            try:
-                self._processHeap(stream.get())
-            except spead2.Stopped:
-                logger.debug('Stream stopped, finishing listening')
-                stream.stop()
-                break
+        try:
+            while True:
+                try:
+                    self._processHeap(stream.get())
+                except spead2.Stopped:
+                    logger.debug('Stream stopped, finishing listening')
+                    stream.stop()
+                    break
+        finally:
+            if self._batcher:
+                self._batcher.close()
+
+        # Not all versions of spead2 keep stream statistics
+        streamStats = getattr(stream, 'stats', None)
+        if streamStats is not None:
+            self._stats['packets'] = streamStats.packets
+            self._stats['incompleteHeaps'] += getattr(streamStats, 'incomplete_heaps_evicted', 0)
+        logger.info('Stream statistics: %r', self._stats)
 
     def _processHeap(self, heap):
+
+        # Keep track of heaps that didn't make it
+        stats = self._stats
+        stats['heaps'] += 1
+        if self._lastCnt is not None and heap.cnt > self._lastCnt + 1:
+            stats['heapsLost'] += heap.cnt - self._lastCnt - 1
+        self._lastCnt = heap.cnt
+        incomplete = getattr(spead2.recv, 'IncompleteHeap', ())
+        if isinstance(heap, incomplete):
+            stats['incompleteHeaps'] += 1
+            return
+
         # Get the data for the item we are interested in and write it to each
         # of our outputs
         for item in heap.get_items():
             if item.id == self._itemId:
                 data = item.value
-                for output in self.outputs:
-                    output.write(data)
+                if self._batcher:
+                    self._batcher.add(data)
+                else:
+                    for output in self.outputs:
+                        output.write(data)
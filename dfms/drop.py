@@ -66,6 +66,34 @@ class ListAsDict(list):
         super(ListAsDict, self).append(drop)
         self.set.add(drop.uid)
 
+class CompletionCounter(object):
+    """
+    Counts how many of the dependencies of a DROP (e.g., its producers or its
+    inputs) have finished, and how many of those finished with an error.
+    Counts are updated atomically in constant time, and only the call that
+    first reaches the expected number of finished dependencies is told so.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.finished = 0
+        self.errors = 0
+        self.done = False
+
+    def finish(self, error, expected):
+        """
+        Records that one more dependency has finished, erroneously if `error`
+        is true. Returns the number of finished and erroneous dependencies,
+        and whether this call is the one that made them reach `expected`.
+        """
+        with self._lock:
+            self.finished += 1
+            if error:
+                self.errors += 1
+            ready = not self.done and self.finished >= expected
+            if ready:
+                self.done = True
+            return self.finished, self.errors, ready
+
 #===============================================================================
 # DROP classes follow
 #===============================================================================
@@ -147,11 +175,10 @@ class AbstractDROP(EventFirer):
         self._producers_uids = set()
         self._producers = ListAsDict(self._producers_uids)
 
-        # Set holding the state of the producers that have finished their
-        # execution. Once all producers have finished, this DROP moves
-        # itself to the COMPLETED state
-        self._finishedProducers = []
-        self._finishedProducersLock = threading.Lock()
+        # Counts the producers that have finished their execution. Once all
+        # producers have finished, this DROP moves itself to the COMPLETED
+        # state (or to ERROR if any of them failed)
+        self._finishedProducers = CompletionCounter()
 
         # Streaming consumers are objects that consume the data written in
         # this DROP *as it gets written*, and therefore don't have to
@@ -178,6 +205,10 @@ class AbstractDROP(EventFirer):
         # support. A target phase is also set to hint the Data Lifecycle Manager
         # about the level of resilience that this DROP should achieve.
         self._phase = DROPPhases.PLASMA
+
+        # The DROP whose storage holds our data after it has been migrated to
+        # a different storage layer (see `migrateTo`)
+        self._storage = None
         self._targetPhase = self._getArg(kwargs, 'targetPhase', DROPPhases.GAS)
 
         # Calculating the checksum and maintaining the data size internally
@@ -313,7 +344,7 @@ class AbstractDROP(EventFirer):
         if self.status != DROPStates.COMPLETED:
             raise Exception("%r is in state %s (!=COMPLETED), cannot be opened for reading" % (self, self.status,))
 
-        io = self.getIO()
+        io = self.getDataIO()
         io.open(OpenMode.OPEN_READ, **kwargs)
 
         # Save the IO object in the dictionary and return its descriptor instead
@@ -432,18 +463,54 @@ class AbstractDROP(EventFirer):
         handles the data contents of this DROP.
         """
 
+    def getDataIO(self):
+        """
+        Returns an instance of one of the `dfms.io.DataIO` instances that
+        handles the data contents of this DROP at its current location. Unlike
+        `getIO` this takes into account the migration of the data to a
+        different storage layer.
+        """
+        storage = self._storage
+        if storage is not None:
+            return storage.getDataIO()
+        return self.getIO()
+
+    @property
+    def storage(self):
+        """
+        The DROP whose storage currently holds the data of this DROP; that is,
+        this DROP itself unless its data has been migrated.
+        """
+        storage = self._storage
+        if storage is not None:
+            return storage.storage
+        return self
+
+    def migrateTo(self, drop):
+        """
+        Makes `drop`, which must already hold a full copy of the data of this
+        DROP, the new storage of this DROP's data; subsequent reads, existence
+        checks and deletions are transparently redirected to it. The data at
+        its previous location is deleted. This DROP must not be being read.
+        """
+        if self.status != DROPStates.COMPLETED:
+            raise Exception("%r is in state %s (!=COMPLETED), cannot be migrated" % (self, self.status,))
+        old = self.getDataIO()
+        self._storage = drop
+        old.delete()
+
     def delete(self):
         """
         Deletes the data represented by this DROP.
         """
-        self.getIO().delete()
+        self.getDataIO().delete()
 
     def exists(self):
         """
         Returns `True` if the data represented by this DROP exists indeed
         in the underlying storage mechanism
         """
-        return self.getIO().exists()
+        return self.getDataIO().exists()
 
     @abstractmethod
     def dataURL(self):
@@ -757,22 +824,17 @@ class AbstractDROP(EventFirer):
         itself to COMPLETED.
         """
 
-        finished = False
-        with self._finishedProducersLock:
-            self._finishedProducers.append(drop_state)
-            nFinished = len(self._finishedProducers)
-            nProd = len(self._producers)
-
-            if nFinished > nProd:
-                raise Exception("More producers finished that registered in DROP %r: %d > %d" % (self, nFinished, nProd))
-            elif nFinished == nProd:
-                finished = True
+        nProd = len(self._producers)
+        error = drop_state == DROPStates.ERROR
+        nFinished, nErrors, finished = self._finishedProducers.finish(error, nProd)
+        if nFinished > nProd:
+            raise Exception("More producers finished that registered in DROP %r: %d > %d" % (self, nFinished, nProd))
 
         if finished:
             logger.debug("All producers finished for DROP %r", self)
 
             # decided that if any producer fails then fail the data drop
-            if DROPStates.ERROR in self._finishedProducers:
+            if nErrors:
                 self.setError()
             else:
                 self.setCompleted()
@@ -1235,6 +1297,11 @@ class AppDROP(ContainerDROP):
         # execution status.
         self._execStatus = AppDROPStates.NOT_RUN
 
+        # Resources needed to execute this application, used by schedulers
+        # to decide when it can run. Memory is given in MB
+        self.num_cpus = int(self._getArg(kwargs, 'num_cpus', 1))
+        self.memory = int(self._getArg(kwargs, 'memory', 0))
+
     def addInput(self, inputDrop, back=True):
         uid = inputDrop.uid
         if uid not in self._inputs:
@@ -1358,8 +1425,7 @@ class InputFiredAppDROP(AppDROP):
     """
     def initialize(self, **kwargs):
         super(InputFiredAppDROP, self).initialize(**kwargs)
-        self._completedInputs = []
-        self._errorInputs = []
+        self._finishedInputs = CompletionCounter()
 
         # Error threshold must be within 0 and 100
         self._input_error_threshold = int(self._getArg(kwargs, 'input_error_threshold', 0))
@@ -1378,6 +1444,46 @@ class InputFiredAppDROP(AppDROP):
         if self._n_tries < 1:
             raise InvalidDropException(self, 'Invalid n_tries, must be a positive number')
 
+        self._executor = None
+        self._process_pool = None
+
+    @property
+    def executor(self):
+        """
+        The object in charge of executing this application once its inputs
+        are ready, via its ``submit`` method. If not set the application is
+        executed in a new thread.
+        """
+        return self._executor
+
+    @executor.setter
+    def executor(self, executor):
+        self._executor = executor
+
+    @property
+    def process_pool(self):
+        """
+        The pool of worker processes (e.g., a ``multiprocessing.Pool``) used
+        by this application to run CPU-bound code via `run_in_process`.
+        """
+        return self._process_pool
+
+    @process_pool.setter
+    def process_pool(self, process_pool):
+        self._process_pool = process_pool
+
+    def run_in_process(self, f, *args):
+        """
+        Returns the result of ``f(*args)``, computed in one of the processes of
+        this application's process pool, or in the calling thread if no pool
+        has been set. Both `f` and `args` must therefore be picklable; in
+        particular, drops should be passed by reference as the DataIO objects
+        returned by their ``getIO`` method.
+        """
+        if self._process_pool is None:
+            return f(*args)
+        return self._process_pool.apply(f, args)
+
     def addStreamingInput(self, streamingInputDrop, back=True):
         raise InvalidRelationshipException(DROPRel(streamingInputDrop, DROPLinkType.STREAMING_INPUT, self),
                                            "InputFiredAppDROPs don't accept streaming inputs")
@@ -1398,17 +1504,14 @@ class InputFiredAppDROP(AppDROP):
             raise Exception("%r: More effective inputs (%d) than inputs (%d)" % \
                             (self, self._n_effective_inputs, n_inputs))
 
-        if drop_state == DROPStates.ERROR:
-            self._errorInputs.append(uid)
-        elif drop_state == DROPStates.COMPLETED:
-            self._completedInputs.append(uid)
-        else:
+        if drop_state not in (DROPStates.ERROR, DROPStates.COMPLETED):
             raise Exception('Invalid DROP state in dropCompleted: %s' % drop_state)
 
-        error_len = len(self._errorInputs)
-        ok_len = len(self._completedInputs)
-
-        if (error_len + ok_len) == n_eff_inputs:
+        # Only the notification completing the effective inputs goes ahead,
+        # subsequent ones have no effect
+        error = drop_state == DROPStates.ERROR
+        _, error_len, ready = self._finishedInputs.finish(error, n_eff_inputs)
+        if ready:
             # calculate the number of errors that have already occurred
             percent_failed = math.floor((error_len/float(n_eff_inputs)) * 100)
 
@@ -1426,9 +1529,9 @@ class InputFiredAppDROP(AppDROP):
 
     def async_execute(self):
         # Return immediately, but schedule the execution of this app
-        # If we have been given a thread pool use that
-        if hasattr(self, '_tp'):
-            self._tp.apply_async(self.execute)
+        # If we have been given an executor use that
+        if self._executor is not None:
+            self._executor.submit(self)
         else:
             t = threading.Thread(target=self.execute)
             t.daemon = 1
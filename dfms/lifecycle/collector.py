@@ -0,0 +1,228 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2015
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+"""
+Module containing the DropCollector, which physically deletes the data of
+expired DROPs on behalf of the Data Lifecycle Manager.
+"""
+
+import collections
+import errno
+import logging
+import os
+import shutil
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+from dfms.drop import FileDROP, ContainerDROP, DirectoryContainer, AppDROP
+
+try:
+    from dfms.s3_drop import S3DROP
+except ImportError:
+    S3DROP = None
+
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of keys accepted by S3's DeleteObjects
+S3_MAX_KEYS = 1000
+
+def _chunks(l, n):
+    for i in range(0, len(l), n):
+        yield l[i:i + n]
+
+class DropCollector(object):
+    """
+    Deletes the data of DROPs in batches, using a bounded pool of worker
+    threads.
+
+    DROPs are grouped by the storage they use so that their data can be
+    deleted with as few operations as possible: files are unlinked in parallel
+    (or their whole directory is removed when it only contains files that are
+    being deleted), S3 objects are deleted in bulk, and ContainerDROPs are
+    replaced by their children. DROPs whose data was migrated to a different
+    storage layer are deleted through their current storage. Other DROPs are
+    deleted individually.
+
+    The collector keeps statistics about the number of DROPs deleted and the
+    bytes reclaimed (see `stats`).
+    """
+
+    def __init__(self, workers=4, batch_size=1000):
+        self._pool = ThreadPool(workers)
+        self._batch_size = batch_size
+        self._lock = threading.Lock()
+        self._drops = 0
+        self._bytes = 0
+        self._seconds = 0.
+
+    def close(self):
+        self._pool.terminate()
+        self._pool.join()
+
+    def stats(self):
+        """
+        Returns a dictionary with the total number of DROPs deleted by this
+        collector, the bytes reclaimed, the seconds spent deleting them and the
+        resulting rate of bytes reclaimed per second.
+        """
+        with self._lock:
+            rate = self._bytes / self._seconds if self._seconds else 0.
+            return {'drops': self._drops, 'bytes': self._bytes,
+                    'seconds': self._seconds, 'bytes_per_second': rate}
+
+    def collect(self, drops):
+        """
+        Deletes the data of `drops`, returning those whose data was
+        successfully deleted.
+        """
+        start = time.time()
+
+        # Group drops by storage; containers are deleted through their children
+        files = collections.defaultdict(list)
+        s3 = collections.defaultdict(list)
+        others = []
+        containers = []
+        migrated = {}
+        seen = set()
+        def add(drop):
+            if id(drop) in seen:
+                return
+            seen.add(id(drop))
+            storage = drop.storage
+            if storage is not drop:
+                migrated[id(drop)] = id(storage)
+                add(storage)
+            elif isinstance(drop, FileDROP):
+                files[os.path.dirname(drop.path)].append(drop)
+            elif S3DROP is not None and isinstance(drop, S3DROP):
+                s3[(drop.bucket, drop._profile_name, drop._aws_access_key_id)].append(drop)
+            elif isinstance(drop, ContainerDROP) and not isinstance(drop, (DirectoryContainer, AppDROP)):
+                containers.append(drop)
+                for c in drop.children:
+                    add(c)
+            else:
+                others.append(drop)
+        for drop in drops:
+            add(drop)
+
+        tasks = []
+        for dirname, group in files.items():
+            if self._whole_directory(dirname, group):
+                tasks.append((self._delete_directory, dirname, group))
+            else:
+                tasks.extend((self._delete_files, chunk) for chunk in _chunks(group, self._batch_size))
+        for group in s3.values():
+            tasks.extend((self._delete_s3, chunk) for chunk in _chunks(group, S3_MAX_KEYS))
+        tasks.extend((self._delete_others, chunk) for chunk in _chunks(others, self._batch_size))
+
+        deleted = set()
+        nbytes = 0
+        for ok, n in self._pool.map(lambda t: t[0](*t[1:]), tasks):
+            deleted.update(id(d) for d in ok)
+            nbytes += n
+
+        # Parent directories go only after all their files are gone
+        for dirname, group in files.items():
+            if any(d._delete_parent_dir for d in group) and os.path.isdir(dirname):
+                try:
+                    os.rmdir(dirname)
+                except OSError as e:
+                    # Silently ignore "Directory not empty" errors
+                    if e.errno not in (errno.ENOTEMPTY, errno.ENOENT):
+                        logger.warning("Error while removing directory %s: %s", dirname, e)
+
+        for container in containers:
+            if all(id(c) in deleted for c in container.children):
+                deleted.add(id(container))
+        for drop_id, storage_id in migrated.items():
+            if storage_id in deleted:
+                deleted.add(drop_id)
+
+        result = [d for d in drops if id(d) in deleted]
+        elapsed = time.time() - start
+        with self._lock:
+            self._drops += len(result)
+            self._bytes += nbytes
+            self._seconds += elapsed
+        logger.debug("Deleted %d/%d DROPs, %d bytes reclaimed in %.3f [s]", len(result), len(drops), nbytes, elapsed)
+        return result
+
+    def _whole_directory(self, dirname, group):
+        # Only when asked to remove the directory, and it contains nothing else
+        if not any(d._delete_parent_dir for d in group):
+            return False
+        try:
+            names = set(os.listdir(dirname))
+        except OSError:
+            return False
+        return names <= set(os.path.basename(d.path) for d in group)
+
+    def _delete_directory(self, dirname, group):
+        nbytes = sum(d.size or 0 for d in group)
+        try:
+            shutil.rmtree(dirname)
+        except OSError:
+            logger.exception("Error while removing directory %s", dirname)
+            return [], 0
+        return group, nbytes
+
+    def _delete_files(self, group):
+        ok = []
+        nbytes = 0
+        for drop in group:
+            path = drop.path
+            try:
+                size = os.lstat(path).st_size
+                os.unlink(path)
+            except OSError as e:
+                # Files that are already gone are fine
+                if e.errno != errno.ENOENT:
+                    logger.exception("Error while deleting %r", drop)
+                    continue
+                size = 0
+            ok.append(drop)
+            nbytes += size
+        return ok, nbytes
+
+    def _delete_s3(self, group):
+        client = group[0]._get_s3_connection().meta.client
+        objects = [{'Key': d.key} for d in group]
+        try:
+            resp = client.delete_objects(Bucket=group[0].bucket, Delete={'Objects': objects, 'Quiet': True})
+        except Exception:
+            logger.exception("Error while deleting %d objects from S3 bucket %s", len(group), group[0].bucket)
+            return [], 0
+        failed = set(e['Key'] for e in resp.get('Errors', []))
+        for key in failed:
+            logger.error("Error while deleting S3 object %s/%s", group[0].bucket, key)
+        return [d for d in group if d.key not in failed], 0
+
+    def _delete_others(self, group):
+        ok = []
+        for drop in group:
+            try:
+                drop.delete()
+                ok.append(drop)
+            except Exception:
+                logger.exception("Error while deleting %r", drop)
+        return ok, 0
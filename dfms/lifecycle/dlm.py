@@ -118,17 +118,21 @@ configured (and/or hardcoded) DLM
 @author: rtobar
 '''
 
+import collections
+import heapq
+import itertools
 import logging
 import random
 import string
 import threading
 import time
 
-from dfms import droputils
 from dfms.ddap_protocol import DROPStates, DROPPhases, AppDROPStates
-from dfms.drop import ContainerDROP
+from dfms.drop import AbstractDROP, AppDROP, ContainerDROP, InMemoryDROP
 from dfms.lifecycle import registry
+from dfms.lifecycle.collector import DropCollector
 from dfms.lifecycle.hsm import manager
+from dfms.lifecycle.replicator import DropReplicator
 
 
 logger = logging.getLogger(__name__)
@@ -179,12 +183,13 @@ class DROPGarbageCollector(DataLifecycleManagerBackgroundTask):
 class DROPMover(DataLifecycleManagerBackgroundTask):
     '''
     A thread that automatically moves DROPs between layers of the HSM.
-    This is supposed to be based on rules and configuration parameters which we
-    still don't consider here. The driving rule we currently use is how
-    frequently is the DROP accessed.
+    Which DROPs are moved where is decided by the DLM's placement policy,
+    based on how recently DROPs have been accessed, their size, and the
+    free space in each layer.
     '''
 
     def doTask(self, dlm):
+        dlm.spillMemoryDrops()
         dlm.moveDropsAround()
 
 class DropEventListener(object):
@@ -198,11 +203,72 @@ class DropEventListener(object):
         elif event.type == 'status':
             if event.status == DROPStates.COMPLETED:
                 self._dlm.handleCompletedDrop(event.uid)
+            elif event.status == DROPStates.EXPIRED:
+                self._dlm.handleExpiredDrop(event.uid)
+
+_finished_app_states = (AppDROPStates.FINISHED, AppDROPStates.ERROR)
+
+class ConsumersTracker(object):
+    """
+    Keeps track of the consumers of an expire-after-use DROP, and hands the
+    DROP over to the DLM for expiration once they have all finished.
+
+    Local consumers notify this tracker via their ``producerFinished`` event;
+    consumers living in other nodes (which cannot be subscribed to) are polled
+    by the DLM instead.
+    """
+
+    def __init__(self, dlm, drop):
+        self._dlm = dlm
+        self._drop = drop
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._remote = []
+        self._done = False
+
+    def start(self):
+        consumers = self._drop.consumers
+        self._pending.update(c.uid for c in consumers)
+        for c in consumers:
+            if isinstance(c, AbstractDROP):
+                c.subscribe(self, 'producerFinished')
+            else:
+                self._remote.append(c)
+        for c in consumers:
+            if isinstance(c, AbstractDROP) and c.execStatus in _finished_app_states:
+                self.consumerFinished(c.uid)
+        if not consumers:
+            self._allFinished()
+        return bool(self._remote)
+
+    def handleEvent(self, event):
+        self.consumerFinished(event.uid)
+
+    def consumerFinished(self, uid):
+        with self._lock:
+            self._pending.discard(uid)
+            if self._pending or self._done:
+                return
+            self._done = True
+        self._allFinished()
+
+    def poll(self):
+        """
+        Checks the status of the remote consumers of the DROP, returning whether
+        they still need to be polled
+        """
+        for c in [c for c in self._remote if c.uid in self._pending]:
+            if c.execStatus in _finished_app_states:
+                self.consumerFinished(c.uid)
+        return not self._done
+
+    def _allFinished(self):
+        self._dlm.handleUsedDrop(self._drop)
 
 class DataLifecycleManager(object):
 
     def __init__(self, **kwargs):
-        self._hsm = manager.HierarchicalStorageManager()
+        self._hsm = manager.HierarchicalStorageManager(kwargs.get('stores', None))
         self._reg = registry.InMemoryRegistry()
         self._listener = DropEventListener(self)
 
@@ -212,6 +278,58 @@ class DataLifecycleManager(object):
         # here
         self._drops = {}
 
+        # Instead of scanning all DROPs periodically we keep track of those
+        # that need our attention as they change:
+        #  * A heap with the COMPLETED DROPs that have an expiration date
+        #  * The COMPLETED DROPs that can be expired now (e.g., because all
+        #    their consumers finished), and those that could not because they
+        #    were being read
+        #  * The trackers of expire-after-use DROPs with remote consumers
+        #  * The EXPIRED DROPs waiting to be deleted
+        #  * A rotation of COMPLETED DROPs whose existence is checked
+        #    periodically, only a limited number at a time
+        self._lock = threading.Lock()
+        self._expirations = []
+        self._seq = itertools.count()
+        self._toExpire = collections.deque()
+        self._polledTrackers = []
+        self._expired = collections.deque()
+        self._existenceChecks = collections.deque()
+
+        # COMPLETED DROPs, from least to most recently used, which are moved
+        # down the HSM layers when they get cold
+        self._lru = collections.OrderedDict()
+        self._policy = manager.TieredPlacementPolicy(coldAfter=float(kwargs.get('coldAfter', 300)))
+
+        # The bytes held by COMPLETED in-memory DROPs, which are kept in LRU
+        # order as well. When going over the high watermark the least recently
+        # used are spilled to the next layer of the HSM until going under the
+        # low watermark. A high watermark of 0 means no limit
+        self._memoryHeld = 0
+        self._memoryLru = collections.OrderedDict()
+        self._spillLock = threading.Lock()
+        self._highWatermark = int(kwargs.get('memoryHighWatermark', 0))
+        self._lowWatermark = int(kwargs.get('memoryLowWatermark', 0.8 * self._highWatermark))
+
+        self._maxExistenceChecks = 1000
+        if 'maxExistenceChecks' in kwargs:
+            self._maxExistenceChecks = int(kwargs['maxExistenceChecks'])
+
+        # Expired DROPs are deleted in batches by a pool of workers
+        gcWorkers = 4
+        if 'gcWorkers' in kwargs:
+            gcWorkers = int(kwargs['gcWorkers'])
+        self._collector = DropCollector(gcWorkers)
+
+        # Precious DROPs get `replicas` extra copies of their data, placed on
+        # different stores if possible. Replicas are copied by a pool of
+        # workers, optionally limited to a given bandwidth (in bytes/s).
+        # We keep our own index of the copies of each DROP (oid -> uids)
+        self._nReplicas = int(kwargs.get('replicas', 1))
+        self._replicator = DropReplicator(int(kwargs.get('replicationWorkers', 4)),
+                                          int(kwargs.get('replicationBandwidth', 0)))
+        self._copies = collections.defaultdict(list)
+
         self._checkPeriod = 10
         if 'checkPeriod' in kwargs:
             self._checkPeriod = float(kwargs['checkPeriod'])
@@ -220,6 +338,10 @@ class DataLifecycleManager(object):
         if 'cleanupPeriod' in kwargs:
             self._cleanupPeriod = float(kwargs['cleanupPeriod'])
 
+        self._movePeriod = self._checkPeriod
+        if 'movePeriod' in kwargs:
+            self._movePeriod = float(kwargs['movePeriod'])
+
     def startup(self):
         # Spawn the background threads
         finishedEvent = threading.Event()
@@ -227,9 +349,12 @@ class DataLifecycleManager(object):
         dropChecker.start()
         dropGarbageCollector = DROPGarbageCollector(self, self._cleanupPeriod, finishedEvent)
         dropGarbageCollector.start()
+        dropMover = DROPMover(self, self._movePeriod, finishedEvent)
+        dropMover.start()
 
         self._dropChecker = dropChecker
         self._dropGarbageCollector = dropGarbageCollector
+        self._dropMover = dropMover
         self._finishedEvent = finishedEvent
 
     def cleanup(self):
@@ -239,10 +364,14 @@ class DataLifecycleManager(object):
         self._finishedEvent.set()
         self._dropChecker.join()
         self._dropGarbageCollector.join()
+        self._dropMover.join()
+        self._collector.close()
+        self._replicator.close()
+        self._reg.close()
 
         # Unsubscribe to all events coming from the DROPs
-        for drop in self._drops.values():
-            drop.unsubscribe(self)
+        for drop in list(self._drops.values()):
+            drop.unsubscribe(self._listener)
 
     #
     # Support for 'with' keyword
@@ -255,63 +384,107 @@ class DataLifecycleManager(object):
         self.cleanup()
 
 
-    def _deleteDrop(self, drop):
-        logger.debug("Deleting DROP %r", drop)
-        drop.delete()
-        drop.status = DROPStates.DELETED
-
     def deleteExpiredDrops(self):
-        for drop in list(self._drops.values()):
-            if drop.status == DROPStates.EXPIRED:
-                self._deleteDrop(drop)
+        with self._lock:
+            expired = list(self._expired)
+            self._expired.clear()
+        expired = [drop for drop in expired if drop.status == DROPStates.EXPIRED]
+        if not expired:
+            return
+
+        logger.debug("Deleting %d expired DROPs", len(expired))
+        deleted = self._collector.collect(expired)
+        for drop in deleted:
+            drop.status = DROPStates.DELETED
+        if len(deleted) < len(expired):
+            logger.error("%d expired DROPs could not be deleted", len(expired) - len(deleted))
+
+    def getCollectionStats(self):
+        """
+        Returns the statistics of the deletion of expired DROPs, including
+        the rate of reclaimed bytes per second.
+
+        :see: `dfms.lifecycle.collector.DropCollector.stats`
+        """
+        return self._collector.stats()
+
+    def getReplicationStats(self):
+        """
+        Returns the statistics of the replication of DROPs, including the rate
+        of copied bytes per second.
+
+        :see: `dfms.lifecycle.replicator.DropReplicator.stats`
+        """
+        return self._replicator.stats()
 
     def expireCompletedDrops(self):
+
+        # Remote consumers of expire-after-use DROPs can only be polled
+        with self._lock:
+            trackers = self._polledTrackers
+            self._polledTrackers = []
+        trackers = [t for t in trackers if t.poll()]
+
+        # DROPs that can be expired now are those handed over to us and those
+        # whose expiration date has passed
         now = time.time()
-        for drop in self._drops.values():
+        with self._lock:
+            self._polledTrackers.extend(trackers)
+            candidates = list(self._toExpire)
+            self._toExpire.clear()
+            while self._expirations and self._expirations[0][0] < now:
+                candidates.append(heapq.heappop(self._expirations)[2])
 
-            if drop.status != DROPStates.COMPLETED:
-                continue
+        beingRead = []
+        for drop in candidates:
 
-            # Expire-after-use: mark as expired if all consumers
-            # are finished using this DROP
-            if drop.expireAfterUse:
-                allDone = all([c.execStatus in [AppDROPStates.FINISHED, AppDROPStates.ERROR] for c in drop.consumers])
-                if not allDone:
-                    continue
-
-            # Otherwise, we check the expiration date
-            # (if no lifespan was specified for the DROP, its expiration
-            # date will be -1 and it will be skipped)
-            elif drop.expirationDate == -1 or \
-                 now <= drop.expirationDate:
+            if drop.status != DROPStates.COMPLETED:
                 continue
 
             if drop.isBeingRead():
                 logger.info("%r has expired but is currently being read, " \
                              "will skip expiration for the time being", drop)
+                beingRead.append(drop)
                 continue
 
             # Finally!
             logger.debug('Marking %r as EXPIRED', drop)
             drop.status = DROPStates.EXPIRED
 
+        with self._lock:
+            self._toExpire.extend(beingRead)
+
     def _disappeared(self, drop):
         return drop.status != DROPStates.DELETED and not drop.exists()
 
     def deleteLostDrops(self):
 
+        # Only a limited number of COMPLETED DROPs is checked each time, in
+        # a round-robin fashion
+        with self._lock:
+            n = min(len(self._existenceChecks), self._maxExistenceChecks)
+            uids = [self._existenceChecks.popleft() for _ in range(n)]
+
         toRemove = []
-        for drop in self._drops.values():
+        stillThere = []
+        toReplicate = []
+        for uid in uids:
+
+            drop = self._drops.get(uid)
+            if drop is None or drop.status != DROPStates.COMPLETED:
+                continue
 
             # We only care about disappeared drops
             if not self._disappeared(drop):
+                stillThere.append(uid)
                 continue
 
             toRemove.append(drop.uid)
             logger.warning('%r has disappeared', drop)
 
             # Check if it's replicated
-            uids = self._reg.getDropUids(drop)
+            with self._lock:
+                uids = list(self._copies.get(drop.oid, ()))
             definitelyLost = False
             if not uids:
                 definitelyLost = True
@@ -322,20 +495,23 @@ class DataLifecycleManager(object):
                 for uid in uids:
                     if uid == drop.uid:
                         continue
-                    siblingDrop = self._drops[uid]
+                    siblingDrop = self._drops.get(uid)
+                    if siblingDrop is None:
+                        continue
                     if not self._disappeared(siblingDrop):
                         replicas.append(siblingDrop)
                     else:
                         logger.warning('%r (replicated from %r) has disappeared', siblingDrop, drop)
                         toRemove.append(siblingDrop.uid)
 
-                if len(replicas) > 1:
-                    logger.info("%r has still more than one replica, no action needed", drop)
-                elif len(replicas) == 1:
-                    logger.info("Only one replica left for DROP %r, will create a new one", drop)
-                    self.replicateDrop(replicas[0])
-                else:
+                missing = self._nReplicas + 1 - len(replicas)
+                if not replicas:
                     definitelyLost = True
+                elif missing <= 0:
+                    logger.info("%r has still enough replicas, no action needed", drop)
+                else:
+                    logger.info("Only %d replica(s) left for DROP %r, will create %d new one(s)", len(replicas), drop, missing)
+                    toReplicate.append((replicas[0], missing))
 
             if definitelyLost:
                 logger.error("No available replica found for DROP %s/%s, the data is DEFINITELY LOST", drop.oid, drop.uid)
@@ -344,7 +520,18 @@ class DataLifecycleManager(object):
 
         # All those objects identified as lost have to go now
         for uid in toRemove:
-            del self._drops[uid]
+            drop = self._drops.pop(uid, None)
+            if drop is not None:
+                with self._lock:
+                    copies = self._copies.get(drop.oid, [])
+                    if uid in copies:
+                        copies.remove(uid)
+        with self._lock:
+            self._existenceChecks.extend(uid for uid in stillThere if uid not in toRemove)
+
+        # Re-replicate what's left of the lost DROPs, all at once
+        for drop, e in self.replicateDrops(toReplicate):
+            logger.error("Couldn't re-replicate %r: %s", drop, e)
 
     def moveDropsAround(self):
         '''
@@ -378,8 +565,12 @@ class DataLifecycleManager(object):
         #    media (plus the relative complexity of actually implementing such
         #    flexibility).
         #
-        # Answering #4 is probably the key to clarify the entire situation. For
-        # the time being, we simply "pass"...
+        # Answering #4 is probably the key to clarify the entire situation. We
+        # currently follow a variation of #6: the DROP keeps its identity, but
+        # its data is copied into a new DROP created by the target layer of the
+        # HSM, to which the original DROP transparently redirects all further
+        # accesses (see AbstractDROP.migrateTo). Since DROPs are opened by
+        # their users this also takes care of #4.
         #
         # PS: The Open DataObject Activity is actually used as part of the
         # "Data Object Lifecycle (nominal)" State Diagram, used as the activity
@@ -392,23 +583,134 @@ class DataLifecycleManager(object):
         # activity is really run from DROPs it would mean that DROPs depend on the
         # DLM, while the DLM manages DROPs.
 
-        for drop in self._drops.values:
+        # DROPs are visited from the least to the most recently used, so we
+        # can stop as soon as we find one that is not cold yet
+        now = time.time()
+        self._hsm.updateSpaces()
+        with self._lock:
+            candidates = []
+            for uid, lastUsed in self._lru.items():
+                if not self._policy.isCold(lastUsed, now):
+                    break
+                candidates.append(uid)
+
+        for uid in candidates:
+            drop = self._drops.get(uid)
+
+            # EXPIRED DROPs will soon be deleted
+            # DELETED DROPs drop not exist anymore
+            if drop is None or drop.status != DROPStates.COMPLETED:
+                with self._lock:
+                    self._lru.pop(uid, None)
+                continue
 
             # Don't touch these
             if drop.isBeingRead():
                 continue
 
-            # EXPIRED DROPs will soon be deleted
-            # DELETED DROPs drop not exist anymore
-            if drop.status in (DROPStates.DELETED, DROPStates.EXPIRED):
+            # Data that is not being used anymore should be moved down in the
+            # hierarchy
+            stores = self._hsm.stores
+            tier = self._hsm.getTier(drop)
+            if tier is None or tier == len(stores) - 1:
+                with self._lock:
+                    self._lru.pop(uid, None)
+                continue
+
+            # If there's no space anywhere we'll try again later
+            target = self._policy.targetTier(stores, tier, drop.size)
+            if target is None:
+                with self._lock:
+                    if self._lru.pop(uid, None) is not None:
+                        self._lru[uid] = now
+                continue
+            try:
+                self.moveDrop(drop, target)
+            except:
+                logger.exception("Problem while moving %r to tier %d", drop, target)
                 continue
 
-            # 1. Data that is not being used anymore should be moved down in the
-            #    hierarchy
-            lastAccess = self._reg.getLastAccess(drop.oid)
-            timeUnread = time.time() - lastAccess
-            if lastAccess != -1 and timeUnread > 10:
-                self.moveDropDown(drop)
+            # It stays in the rotation if it can still go further down
+            with self._lock:
+                self._lru.pop(uid, None)
+                if target < len(self._hsm.stores) - 1:
+                    self._lru[uid] = time.time()
+
+    def moveDrop(self, drop, tier):
+        """
+        Moves the data of `drop` to tier `tier` of the HSM
+        """
+        store = self._hsm.stores[tier]
+        logger.debug("Moving %r to %s", drop, store)
+        newDrop, _ = self._replicate(drop, store)
+        drop.migrateTo(newDrop)
+        self._forgetMemoryDrop(drop.uid)
+
+    @property
+    def memoryHeld(self):
+        """
+        The number of bytes currently held by COMPLETED in-memory DROPs
+        """
+        with self._lock:
+            return self._memoryHeld
+
+    def _forgetMemoryDrop(self, uid):
+        with self._lock:
+            size = self._memoryLru.pop(uid, None)
+            if size is not None:
+                self._memoryHeld -= size
+
+    def spillMemoryDrops(self):
+        """
+        Moves the least recently used in-memory DROPs to the next layer of the
+        HSM if the memory they hold is above the high watermark, until it is
+        below the low watermark. Only one thread spills DROPs at a time.
+        """
+        if not self._highWatermark or self.memoryHeld <= self._highWatermark:
+            return
+        if not self._spillLock.acquire(False):
+            return
+        try:
+            self._spill()
+        finally:
+            self._spillLock.release()
+
+    def _spill(self):
+        self._hsm.updateSpaces()
+        skipped = set()
+        while True:
+
+            # Next candidate, skipping those that are currently being read
+            with self._lock:
+                if self._memoryHeld <= self._lowWatermark:
+                    return
+                candidates = [uid for uid in self._memoryLru if uid not in skipped]
+                if not candidates:
+                    logger.warning("%d bytes held by in-memory DROPs but none can be spilled", self._memoryHeld)
+                    return
+                uid = candidates[0]
+
+            drop = self._drops.get(uid)
+            if drop is None or drop.status != DROPStates.COMPLETED:
+                self._forgetMemoryDrop(uid)
+                continue
+            if drop.isBeingRead():
+                skipped.add(uid)
+                continue
+
+            tier = self._hsm.getTier(drop)
+            target = None if tier is None else self._policy.targetTier(self._hsm.stores, tier, drop.size)
+            if target is None:
+                logger.warning("No space left to spill %r, keeping it in memory", drop)
+                skipped.add(uid)
+                continue
+
+            try:
+                self.moveDrop(drop, target)
+                logger.debug("Spilled %r, %d bytes still held in memory", drop, self.memoryHeld)
+            except:
+                logger.exception("Problem while spilling %r", drop)
+                skipped.add(uid)
 
     def addDrop(self, drop):
 
@@ -417,18 +719,64 @@ class DataLifecycleManager(object):
         drop.phase = DROPPhases.GAS
         drop.subscribe(self._listener)
         self._reg.addDrop(drop)
+        with self._lock:
+            self._copies[drop.oid].append(drop.uid)
 
-        # TODO: We currently use a background thread that scans
-        #       all DROPs for their status and compares its expiration date
-        #       with the current time in order to determine which DROPs must be
-        #       moved to EXPIRED. We might want to explore other alternatives to
-        #       perform this task, like using threading.Timers (probably not) or
-        #       any other that doesn't mean looping over all DROPs
+        # DROPs are further tracked only once they are COMPLETED, but they
+        # might already be
+        if drop.status == DROPStates.COMPLETED:
+            self._trackCompletedDrop(drop)
+
+    def _trackCompletedDrop(self, drop):
+
+        # Expire-after-use: expire when all consumers are finished using it.
+        # Otherwise we use the expiration date (-1 if no lifespan was given)
+        if drop.expireAfterUse:
+            tracker = ConsumersTracker(self, drop)
+            if tracker.start():
+                with self._lock:
+                    self._polledTrackers.append(tracker)
+        elif drop.expirationDate != -1:
+            with self._lock:
+                heapq.heappush(self._expirations, (drop.expirationDate, next(self._seq), drop))
+
+        # Check periodically that its data is still there, and whether it
+        # should be moved to a different layer of the HSM
+        if not isinstance(drop, AppDROP):
+            with self._lock:
+                self._existenceChecks.append(drop.uid)
+                self._lru[drop.uid] = time.time()
+                if isinstance(drop.storage, InMemoryDROP) and drop.uid not in self._memoryLru:
+                    size = drop.size or 0
+                    self._memoryLru[drop.uid] = size
+                    self._memoryHeld += size
+            self.spillMemoryDrops()
+
+    def handleUsedDrop(self, drop):
+        """
+        Called when all the consumers of an expire-after-use DROP have finished
+        """
+        with self._lock:
+            self._toExpire.append(drop)
+
+    def handleExpiredDrop(self, uid):
+        self._forgetMemoryDrop(uid)
+        drop = self._drops.get(uid)
+        if drop is None:
+            return
+        with self._lock:
+            self._expired.append(drop)
 
     def handleOpenedDrop(self, oid, uid):
         drop = self._drops[uid]
         if drop.status == DROPStates.COMPLETED:
             self._reg.recordNewAccess(oid)
+            with self._lock:
+                if self._lru.pop(uid, None) is not None:
+                    self._lru[uid] = time.time()
+                size = self._memoryLru.pop(uid, None)
+                if size is not None:
+                    self._memoryLru[uid] = size
 
     def handleCompletedDrop(self, uid):
         '''
@@ -438,6 +786,7 @@ class DataLifecycleManager(object):
         # in a persistent storage media we don't need to save it again
 
         drop = self._drops[uid]
+        self._trackCompletedDrop(drop)
         if drop.precious and self.isReplicable(drop):
             logger.debug("Replicating %r because it's precious", drop)
             try:
@@ -452,51 +801,92 @@ class DataLifecycleManager(object):
         '''
         :param dfms.drop.AbstractDROP drop:
         '''
+        failed = self.replicateDrops([(drop, self._nReplicas)])
+        if failed:
+            raise failed[0][1]
+
+    def replicateDrops(self, drops):
+        """
+        Creates new replicas of the given DROPs in parallel. `drops` is a list
+        of ``(drop, n)`` tuples, where `n` is the number of new replicas to
+        create for `drop`. Returns a list of ``(drop, exception)`` tuples for
+        those DROPs that couldn't be replicated.
+        """
+        if not drops:
+            return []
+
+        # Decide where replicas go first, then copy all the data at once
+        self._hsm.updateSpaces()
+        failed = []
+        jobs = []
+        for drop, n in drops:
+            try:
+                jobs.append((drop, self._placeReplicas(drop, n)))
+            except Exception as e:
+                failed.append((drop, e))
+
+        results = self._replicator.replicate([(drop, [r for r, _ in replicas]) for drop, replicas in jobs])
+        for (drop, replicas), e in zip(jobs, results):
+            if e is not None:
+                failed.append((drop, e))
+                continue
 
-        # Check that the DROP is complete already
+            # The DROPs are SOLID when the data is safe from the process
+            # finishing, i.e., when at least one replica is not volatile
+            phase = DROPPhases.SOLID if any(not volatile for _, volatile in replicas) else drop.phase
+            drop.phase = phase
+            for newDrop, _ in replicas:
+                newDrop.phase = phase
+                self._drops[newDrop.uid] = newDrop
+                with self._lock:
+                    self._existenceChecks.append(newDrop.uid)
+                    self._copies[drop.oid].append(newDrop.uid)
+                self._reg.addDropInstance(newDrop)
+            self._reg.setDropPhase(drop, phase)
+
+        return failed
+
+    def _placeReplicas(self, drop, n):
+        """
+        Creates the DROPs that will hold `n` new replicas of `drop`, placed in
+        the HSM according to its target phase. Returns a list of
+        ``(newDrop, volatile)`` tuples.
+        """
         if drop.status != DROPStates.COMPLETED:
             raise Exception("%r not in COMPLETED state" % (drop,))
 
-        # Get the size of the DROP. This cannot currently be done in some of them,
-        # like in the AbstractDROP
-        size = drop.size
-
-        # Check which layer of the hsm should host the replicated copy
-        store = self._hsm.getSlowestStore()
-        availableSpace = store.getAvailableSpace()
-
-        if size > availableSpace:
-            raise Exception("Cannot replicate DROP to store %s: not enough space left")
-
-        # Create new DROP and write the contents of the original into it
-        # TODO: In a real world application this will probably happen in a separate
-        #       worker thread with a working queue, or in separate threads, one
-        #       for each replication task (or a mix of the two)
-        newDrop, newUid = self._replicate(drop, store)
-
-        # The DROPs (both) should now be tagged as SOLID
-        newDrop.phase = DROPPhases.SOLID
-        drop.phase = DROPPhases.SOLID
-
-        # Update our own registry
-        self._drops[newUid] = newDrop
-        self._reg.addDropInstance(newDrop)
-        self._reg.setDropPhase(drop, DROPPhases.SOLID)
+        with self._lock:
+            uids = list(self._copies.get(drop.oid, ()))
+        held = set()
+        for uid in uids:
+            copy = self._drops.get(uid)
+            tier = None if copy is None else self._hsm.getTier(copy)
+            if tier is not None:
+                held.add(tier)
+
+        stores = self._hsm.stores
+        persistent = drop.targetPhase == DROPPhases.SOLID
+        tiers = self._policy.replicaTiers(stores, drop.size, held, n, persistent)
+        if not tiers:
+            raise Exception("Cannot replicate %r: no store has enough space left" % (drop,))
+        return [(self._newReplica(drop, stores[t]), stores[t].volatile) for t in tiers]
 
     def getDropUids(self, drop):
         return self._reg.getDropUids(drop)
 
-    def _replicate(self, drop, store):
+    def _newReplica(self, drop, store):
 
         # Dummy, but safe, new UID
         newUid = 'uid:' + ''.join([random.SystemRandom().choice(string.ascii_letters + string.digits) for _ in range(10)])
 
         logger.debug('Creating new DROP with uid %s from %r', newUid, drop)
 
-        # For the time being we manually copy the contents of the current DROP into it
-        newDrop = store.createDrop(drop.oid, newUid, expectedSize=drop.size, precious=drop.precious)
-        droputils.copyDropContents(drop, newDrop)
-
-        logger.debug('%r successfully replicated to %r', drop, newDrop)
+        kwargs = {'precious': drop.precious}
+        if drop.size:
+            kwargs['expectedSize'] = drop.size
+        return store.createDrop(drop.oid, newUid, **kwargs)
 
-        return newDrop, newUid
\ No newline at end of file
+    def _replicate(self, drop, store):
+        newDrop = self._newReplica(drop, store)
+        self._replicator.copy(drop, [newDrop])
+        return newDrop, newDrop.uid
\ No newline at end of file
@@ -33,12 +33,91 @@ from dfms.lifecycle.hsm import store
 
 logger = logging.getLogger(__name__)
 
+class TieredPlacementPolicy(object):
+    """
+    A policy deciding where the data of DROPs should live within the tiers
+    of an HSM, which are sorted from fastest to slowest.
+
+    DROPs that haven't been used in `coldAfter` seconds are moved to the next
+    tier with enough free space to hold them, such that the tier's used
+    fraction stays below `maxUsedFraction` after the move.
+    """
+
+    def __init__(self, coldAfter=300, maxUsedFraction=0.9):
+        self.coldAfter = coldAfter
+        self.maxUsedFraction = maxUsedFraction
+
+    def isCold(self, lastUsed, now):
+        return now - lastUsed >= self.coldAfter
+
+    def targetTier(self, stores, tier, size):
+        """
+        Returns the index of the tier within `stores` where DROPs of `size`
+        bytes currently held by tier `tier` should be moved, or None if they
+        should stay where they are.
+        """
+        size = size or 0
+        for target in range(tier + 1, len(stores)):
+            if self._fits(stores[target], size):
+                return target
+        return None
+
+    def _fits(self, s, size):
+        total = s.getTotalSpace()
+        if not total:
+            return False
+        used = total - s.getAvailableSpace() + size
+        return float(used) / total <= self.maxUsedFraction
+
+    def replicaTiers(self, stores, size, held, n, persistent=False):
+        """
+        Returns up to `n` tiers within `stores` where new replicas of a DROP of
+        `size` bytes should be placed, given that tiers in `held` already
+        hold a copy of its data. Non-volatile tiers not holding a copy are
+        preferred, slowest first, followed by non-volatile tiers that already
+        hold one. Volatile tiers are used only as a last resort, and never if
+        `persistent` is True.
+        """
+        size = size or 0
+        candidates = [t for t in reversed(range(len(stores))) if self._fits(stores[t], size)]
+        durable = [t for t in candidates if not stores[t].volatile]
+        tiers = [t for t in durable if t not in held]
+        tiers += [t for t in durable if t in held]
+        if not persistent:
+            tiers += [t for t in candidates if stores[t].volatile and t not in held]
+        return tiers[:n]
+
 class HierarchicalStorageManager(object):
+    """
+    Manages a number of storage tiers, sorted from fastest to slowest.
+    By default these are the RAM memory and the local filesystem.
+    """
 
-    def __init__(self):
+    def __init__(self, stores=None):
         self._stores = []
-        self.addStore(store.MemoryStore())
-        self.addStore(store.FileSystemStore('/', '/tmp/sdp_dfms'))
+        if stores is None:
+            stores = [store.MemoryStore(), store.FileSystemStore('/', '/tmp/sdp_dfms')]
+        for s in stores:
+            self.addStore(s)
+
+    @property
+    def stores(self):
+        return self._stores[:]
+
+    def updateSpaces(self):
+        for s in self._stores:
+            s.updateSpaces()
+
+    def getTier(self, drop):
+        """
+        Returns the index of the tier currently storing the data of `drop`,
+        or None if it's not stored in any of our tiers.
+        """
+        storage = drop.storage
+        for tier, s in enumerate(self._stores):
+            if s.holds(storage):
+                return tier
+        return None
 
     def addStore(self, newStore):
         '''
@@ -46,6 +46,9 @@ class AbstractStore(object):
 
     __metaclass__ = ABCMeta
 
+    # Whether the data held by this store is lost when the process finishes
+    volatile = False
+
     def __init__(self, *args, **kwargs):
         super(AbstractStore, self).__init__()
         self._setTotalSpace(0)
@@ -80,6 +83,18 @@ class AbstractStore(object):
     def getTotalSpace(self):
         return self._totalSpace
 
+    def getUsedFraction(self):
+        total = self.getTotalSpace()
+        if not total:
+            return 0.
+        return 1. - float(self.getAvailableSpace()) / total
+
+    def holds(self, drop):
+        """
+        Returns whether the data of `drop` is stored in this store
+        """
+        return False
+
     @abstractmethod
     def createDrop(self, oid, uid, **kwargs):
         pass
@@ -129,6 +144,9 @@ class FileSystemStore(AbstractStore):
         kwargs['dirname'] = self._savingDir
         return FileDROP(oid, uid, **kwargs)
 
+    def holds(self, drop):
+        return isinstance(drop, FileDROP) and os.path.dirname(drop.path) == os.path.abspath(self._savingDir)
+
     def __str__(self):
         return self._mountPoint
 
@@ -138,6 +156,8 @@ class MemoryStore(AbstractStore):
     InMemoryDROPs and monitors the RAM usage of the system.
     """
 
+    volatile = True
+
     def __init__(self):
         super(MemoryStore, self).__init__()
         self.updateSpaces()
@@ -150,6 +170,9 @@ class MemoryStore(AbstractStore):
     def createDrop(self, oid, uid, **kwargs):
         return InMemoryDROP(oid, uid, **kwargs)
 
+    def holds(self, drop):
+        return isinstance(drop, InMemoryDROP)
+
     def __str__(self):
         return 'Memory'
 
@@ -203,6 +226,9 @@ class NgasStore(AbstractStore):
         kwargs['ngasPort'] = self._port
         return NgasDROP(oid, uid, **kwargs)
 
+    def holds(self, drop):
+        return isinstance(drop, NgasDROP) and (drop._ngasSrv, drop._ngasPort) == (self._host, self._port)
+
     def _getClient(self):
         from ngamsPClient import ngamsPClient
         return ngamsPClient.ngamsPClient(self._host, self._port)
@@ -251,6 +277,9 @@ class DirectoryStore(AbstractStore):
         kwargs['dirname'] = self._dirName
         return FileDROP(oid, uid, **kwargs)
 
+    def holds(self, drop):
+        return isinstance(drop, FileDROP) and os.path.dirname(drop.path) == os.path.abspath(self._dirName)
+
     def _updateSpaces(self):
         used = self._dirUsage(self._dirName)
         self._setAvailableSpace(self.getTotalSpace() - used)
@@ -258,12 +287,13 @@ class DirectoryStore(AbstractStore):
     def _dirUsage(self, dirName):
         total = 0
         for f in os.listdir(dirName):
-            if os.path.isdir(f):
-                total += self._dirUsage(os.path.join(dirName, f))
-            elif os.path.isfile(f):
+            path = os.path.join(dirName, f)
+            if os.path.isdir(path):
+                total += self._dirUsage(path)
+            elif os.path.isfile(path):
                 # Don't count our special file
                 if f != self.__SIZE_FILE or dirName != self._dirName:
-                    total += os.stat(os.path.join(dirName, f))
+                    total += os.stat(path).st_size
         return total
 
     @staticmethod
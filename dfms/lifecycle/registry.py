@@ -34,6 +34,7 @@ The registry simply (for the time being) keeps a record of:
 from abc import abstractmethod, ABCMeta
 import importlib
 import logging
+import threading
 import time
 
 from dfms.ddap_protocol import DROPPhases
@@ -43,10 +44,10 @@ from dfms.utils import prepare_sql
 logger = logging.getLogger(__name__)
 
 class DROP(object):
-    oid         = None
-    phase       = DROPPhases.GAS
-    instances   = []
-    accessTimes = []
+    oid        = None
+    phase      = DROPPhases.GAS
+    instances  = []
+    lastAccess = -1
 
 class DROPInstance(object):
     oid     = None
@@ -102,6 +103,11 @@ class Registry():
         never been accessed
         """
 
+    def close(self):
+        """
+        Releases the resources held by this registry
+        """
+
     def _checkDropIsInRegistry(self, oid):
         if not oid in self._drops:
             raise Exception('DROP %s is not present in the registry' % (oid))
@@ -142,17 +148,34 @@ class InMemoryRegistry(Registry):
 
     def recordNewAccess(self, oid):
         self._checkDropIsInRegistry(oid)
-        self._drops[oid].accessTimes.append(time.time())
+        self._drops[oid].lastAccess = time.time()
 
     def getLastAccess(self, oid):
-        if oid in self._drops and self._drops[oid].accessTimes:
-            return self._drops[oid].accesTimes[-1]
-        else:
-            return -1
+        if oid in self._drops:
+            return self._drops[oid].lastAccess
+        return -1
 
 class RDBMSRegistry(Registry):
-
-    def __init__(self, dbModuleName, *connArgs):
+    """
+    A registry backed by a relational database.
+
+    Access records and phase changes are not written immediately, but buffered
+    and periodically written in bulk every `flushPeriod` seconds, or as soon as
+    `maxPending` of them have been buffered. Each thread reuses its own
+    connection to the database. All other keyword arguments are given to the
+    connect() function of the database module together with `connArgs`.
+    """
+
+    # The tables that should be defined in the database we're pointing at,
+    # which can be created with createSchema()
+    schema = [
+        'CREATE TABLE IF NOT EXISTS dfms_drop (oid varchar(64) PRIMARY KEY, phase integer)',
+        'CREATE TABLE IF NOT EXISTS dfms_dropinstance (uid varchar(64) PRIMARY KEY, oid varchar(64) REFERENCES dfms_drop(oid), dataRef varchar(128))',
+        'CREATE TABLE IF NOT EXISTS dfms_dropaccesstime (oid varchar(64) REFERENCES dfms_drop(oid), accessTime TIMESTAMP, PRIMARY KEY (oid, accessTime))',
+        'CREATE INDEX IF NOT EXISTS dfms_dropinstance_oid ON dfms_dropinstance (oid)'
+    ]
+
+    def __init__(self, dbModuleName, *connArgs, **kwargs):
         try:
             self._dbmod = importlib.import_module(dbModuleName)
             self._paramstyle = self._dbmod.paramstyle
@@ -161,54 +184,127 @@ class RDBMSRegistry(Registry):
             logger.error("Cannot import module %s, RDBMSRegistry cannot start" % (dbModuleName))
             raise
 
+        self._flushPeriod = float(kwargs.pop('flushPeriod', 1))
+        self._maxPending = int(kwargs.pop('maxPending', 1000))
+        self._connKwargs = kwargs
+        self._local = threading.local()
+
+        # The write-behind buffers, plus the last access of each DROP so
+        # getLastAccess() doesn't need to go to the database (or flush) for
+        # the accesses we have recorded ourselves
+        self._lock = threading.Lock()
+        self._flushLock = threading.Lock()
+        self._pendingAccesses = []
+        self._pendingPhases = {}
+        self._lastAccess = {}
+
+        self._finished = threading.Event()
+        self._flusher = None
+        if self._flushPeriod > 0:
+            self._flusher = threading.Thread(target=self._flushPeriodically, name='RegistryFlusher')
+            self._flusher.daemon = True
+            self._flusher.start()
+
     def _connect(self):
-        return self._dbmod.connect(*self._connArgs)
-
-    # The following tables should be defined in the database we're pointing at
-    #
-    # dfms_drop:
-    #   oid   (PK)
-    #   phase (int)
-    #
-    # dfms_dropinstance:
-    #   uid     (PK)
-    #   oid     (FK)
-    #   dataRef ()
-    #
-    # dfms_dropaccesstime:
-    #   oid (FK, PK)
-    #   accessTime (PK)
-
-    # A small helper class to make all methods transactional, and to create
-    # connections when needed
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._dbmod.connect(*self._connArgs, **self._connKwargs)
+            self._local.conn = conn
+        return conn
+
+    def _closeConnection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            conn.close()
+
+    # A small helper class to make all methods transactional, and to get the
+    # connection of the current thread when needed
     class transactional(object):
 
         def __init__(self, registry, conn):
-            self._connect = registry._connect
+            self._registry = registry
             self._conn = conn
-            self._connCreated = False
+            self._connBorrowed = False
 
         def __enter__(self):
             if self._conn is None:
-                self._conn = self._connect()
-                self._connCreated = True
+                self._conn = self._registry._connect()
+                self._connBorrowed = True
             return self._conn
 
         def __exit__(self, typ, value, traceback):
-            if not self._connCreated:
+            if not self._connBorrowed:
                 return
             if typ is None:
                 self._conn.commit()
-            else:
+                return
+            try:
                 self._conn.rollback()
-                return False
-
-            self._conn.close()
+            except:
+                # Don't reuse a connection we are not sure about
+                self._registry._closeConnection()
+            return False
 
     def execute(self, cursor, sql, values=()):
         sql, values = prepare_sql(sql, self._paramstyle, values)
         cursor.execute(sql, values)
 
+    def executemany(self, cursor, sql, rows):
+        if not rows:
+            return
+        prepared, _ = prepare_sql(sql, self._paramstyle, rows[0])
+        cursor.executemany(prepared, [prepare_sql(sql, self._paramstyle, r)[1] for r in rows])
+
+    def createSchema(self, conn=None):
+        """
+        Creates the tables and indexes used by this registry if they don't
+        exist yet
+        """
+        with self.transactional(self, conn) as conn:
+            cur = conn.cursor()
+            for stmt in self.schema:
+                self.execute(cur, stmt)
+            cur.close()
+
+    def _flushPeriodically(self):
+        try:
+            while not self._finished.wait(self._flushPeriod):
+                try:
+                    self.flush()
+                except:
+                    logger.exception("Error while flushing the registry")
+        finally:
+            self._closeConnection()
+
+    def flush(self, conn=None):
+        """
+        Writes all the buffered access records and phase changes to the
+        database
+        """
+        with self._flushLock:
+            with self._lock:
+                accesses, self._pendingAccesses = self._pendingAccesses, []
+                phases, self._pendingPhases = self._pendingPhases, {}
+            if not accesses and not phases:
+                return
+            with self.transactional(self, conn) as conn:
+                cur = conn.cursor()
+                self.executemany(cur, 'UPDATE dfms_drop SET phase = {0} WHERE oid = {1}', [(p, oid) for oid, p in phases.items()])
+                self.executemany(cur, 'INSERT INTO dfms_dropaccesstime (oid, accessTime) VALUES ({0},{1})', accesses)
+                cur.close()
+            logger.debug("Flushed %d access records and %d phase changes", len(accesses), len(phases))
+
+    def close(self):
+        self._finished.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+        self._closeConnection()
+
+    def _pending(self):
+        return len(self._pendingAccesses) + len(self._pendingPhases)
+
     def addDrop(self, drop, conn=None):
         with self.transactional(self, conn) as conn:
             cur = conn.cursor()
@@ -231,18 +327,32 @@ class RDBMSRegistry(Registry):
             return [r[0] for r in rows]
 
     def setDropPhase(self, drop, phase, conn=None):
-        with self.transactional(self, conn) as conn:
-            cur = conn.cursor()
-            self.execute(cur, 'UPDATE dfms_drop SET phase = {0} WHERE oid = {1}', (drop.oid, drop.phase))
-            cur.close()
+        with self._lock:
+            self._pendingPhases[drop.oid] = phase
+            full = self._pending() >= self._maxPending
+        if full:
+            self.flush(conn)
 
     def recordNewAccess(self, oid, conn=None):
-        with self.transactional(self, conn) as conn:
-            cur = conn.cursor()
-            self.execute(cur, 'INSERT INTO dfms_dropaccesstime (oid, accessTime) VALUES ({0},{1})', (oid, self._dbmod.TimestampFromTicks(time.time())))
-            cur.close()
+        now = time.time()
+        ts = self._dbmod.TimestampFromTicks(now)
+        with self._lock:
+
+            # Timestamps might have less resolution than time.time(), and
+            # recording the same one twice would violate the primary key
+            last = self._lastAccess.get(oid)
+            self._lastAccess[oid] = (now, ts)
+            if last is not None and last[1] == ts:
+                return
+            self._pendingAccesses.append((oid, ts))
+            full = self._pending() >= self._maxPending
+        if full:
+            self.flush(conn)
 
     def getLastAccess(self, oid, conn=None):
+        with self._lock:
+            if oid in self._lastAccess:
+                return self._lastAccess[oid][0]
         with self.transactional(self, conn) as conn:
             cur = conn.cursor()
             self.execute(cur, 'SELECT accessTime FROM dfms_dropaccesstime WHERE oid = {0} ORDER BY accessTime DESC LIMIT 1', (oid,))
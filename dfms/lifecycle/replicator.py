@@ -0,0 +1,145 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2015
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+"""
+Module containing the DropReplicator, which copies the data of DROPs into
+new replicas on behalf of the Data Lifecycle Manager.
+"""
+
+import logging
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+from dfms.ddap_protocol import DROPStates
+
+
+logger = logging.getLogger(__name__)
+
+class Throttle(object):
+    """
+    Limits the rate at which the threads sharing it transfer data to
+    `bandwidth` bytes per second. A bandwidth of 0 means no limit.
+    """
+
+    def __init__(self, bandwidth=0):
+        self.bandwidth = bandwidth
+        self._lock = threading.Lock()
+        self._next = 0
+
+    def consume(self, nbytes):
+        """
+        Accounts for the transfer of `nbytes` bytes, sleeping as long as
+        needed to keep the overall transfer rate within the bandwidth
+        """
+        if not self.bandwidth:
+            return
+        with self._lock:
+            now = time.time()
+            self._next = max(now, self._next) + float(nbytes) / self.bandwidth
+            delay = self._next - now
+        if delay > 0:
+            time.sleep(delay)
+
+class DropReplicator(object):
+    """
+    Copies the data of DROPs into one or more replicas, using a bounded pool
+    of worker threads.
+
+    The data of each source DROP is read only once and streamed into all of
+    its replicas, while different DROPs are copied in parallel. The overall
+    copy rate can be limited to `bandwidth` bytes per second so that
+    replication doesn't starve the applications of I/O.
+
+    The replicator keeps statistics about the number of replicas created and
+    the bytes copied (see `stats`).
+    """
+
+    def __init__(self, workers=4, bandwidth=0, bufsize=65536):
+        self._pool = ThreadPool(workers)
+        self._throttle = Throttle(bandwidth)
+        self._bufsize = bufsize
+        self._lock = threading.Lock()
+        self._replicas = 0
+        self._bytes = 0
+        self._seconds = 0.
+
+    def close(self):
+        self._pool.terminate()
+        self._pool.join()
+
+    def stats(self):
+        """
+        Returns a dictionary with the total number of replicas created by this
+        replicator, the bytes written into them, the seconds spent copying and
+        the resulting rate of bytes copied per second.
+        """
+        with self._lock:
+            rate = self._bytes / self._seconds if self._seconds else 0.
+            return {'replicas': self._replicas, 'bytes': self._bytes,
+                    'seconds': self._seconds, 'bytes_per_second': rate}
+
+    def copy(self, source, targets):
+        """
+        Streams the data of `source` into all the DROPs in `targets`, and
+        moves them to the COMPLETED state
+        """
+        start = time.time()
+        written = 0
+        desc = source.open()
+        try:
+            buf = source.read(desc, self._bufsize)
+            while buf:
+                for t in targets:
+                    t.write(buf)
+                written += len(buf) * len(targets)
+                self._throttle.consume(len(buf) * len(targets))
+                buf = source.read(desc, self._bufsize)
+        finally:
+            source.close(desc)
+
+        for t in targets:
+            if t.status != DROPStates.COMPLETED:
+                t.setCompleted()
+
+        with self._lock:
+            self._replicas += len(targets)
+            self._bytes += written
+            self._seconds += time.time() - start
+        logger.debug('%r successfully replicated to %r', source, targets)
+
+    def _copy(self, job):
+        source, targets = job
+        try:
+            self.copy(source, targets)
+        except Exception as e:
+            logger.exception("Error while replicating %r", source)
+            return e
+
+    def replicate(self, jobs):
+        """
+        Runs the given replication jobs in parallel. Each job is a
+        ``(source, targets)`` tuple. Returns, for each job, None if it was
+        successful or the exception that made it fail otherwise.
+        """
+        if not jobs:
+            return []
+        return self._pool.map(self._copy, jobs)
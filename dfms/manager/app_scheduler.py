@@ -0,0 +1,175 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2015
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+"""
+Module containing the scheduler used by Node Managers to execute the
+applications of their sessions under the resource budget of the node.
+"""
+
+import collections
+import heapq
+import itertools
+import logging
+import multiprocessing
+import threading
+import weakref
+
+import psutil
+
+
+logger = logging.getLogger(__name__)
+
+# Drop types representing applications in drop specifications
+_APP_TYPES = ('app', 'socket')
+
+def critical_path_priorities(graph):
+    """
+    Returns a dictionary with the priority of each of the drops in `graph`, a
+    dictionary of drop specifications indexed by OID. The priority of a drop
+    is the weight of the heaviest path going from the drop to the end of the
+    graph, where applications weight their ``tw`` (task weight, 1 by default)
+    and data drops weight nothing. Drops on the critical path of the graph
+    thus get the highest priorities. Relationships with drops that are not in
+    `graph` are ignored.
+    """
+
+    successors = collections.defaultdict(set)
+    for oid, spec in graph.items():
+        for rel in ('outputs', 'consumers', 'streamingConsumers'):
+            successors[oid].update(spec.get(rel, []))
+        for rel in ('inputs', 'streamingInputs', 'producers'):
+            for pred in spec.get(rel, []):
+                successors[pred].add(oid)
+
+    predecessors = collections.defaultdict(list)
+    pending = {}
+    for oid in graph:
+        succs = [s for s in successors[oid] if s in graph]
+        successors[oid] = succs
+        pending[oid] = len(succs)
+        for s in succs:
+            predecessors[s].append(oid)
+
+    # Walk the graph backwards, starting from its leaves
+    priorities = {}
+    ready = [oid for oid, n in pending.items() if n == 0]
+    while ready:
+        oid = ready.pop()
+        spec = graph[oid]
+        weight = float(spec.get('tw', 1)) if spec.get('type') in _APP_TYPES else 0
+        priorities[oid] = weight + max([priorities[s] for s in successors[oid]] or [0])
+        for pred in predecessors[oid]:
+            pending[pred] -= 1
+            if not pending[pred]:
+                ready.append(pred)
+
+    return priorities
+
+class AppScheduler(object):
+    """
+    Executes applications using a fixed number of worker threads. Applications
+    that are ready to run are queued by priority, and the one at the head of
+    the queue is started only when the CPUs and memory it requires (see
+    `AppDROP.num_cpus` and `AppDROP.memory`) are available within the budget
+    of the node. Requirements exceeding the budget are capped to it, so such
+    applications run once the node is otherwise idle.
+    """
+
+    def __init__(self, max_workers, cpus=None, memory=None):
+        self._cpus = cpus or multiprocessing.cpu_count()
+        self._memory = memory or psutil.virtual_memory().total // (1024 ** 2)
+        self._free_cpus = self._cpus
+        self._free_memory = self._memory
+        self._cond = threading.Condition()
+        self._ready = []
+        self._seq = itertools.count()
+        self._priorities = weakref.WeakKeyDictionary()
+        self._running = True
+
+        logger.info("Starting app scheduler with %d workers, %d CPUs and %d MB of memory",
+                    max_workers, self._cpus, self._memory)
+        for i in range(max_workers):
+            t = threading.Thread(target=self._work, name="AppScheduler-%d" % (i,))
+            t.daemon = True
+            t.start()
+
+    def set_priority(self, app, priority):
+        """
+        Sets the priority with which `app` will be queued once it's ready
+        """
+        with self._cond:
+            self._priorities[app] = priority
+
+    def submit(self, app):
+        """
+        Queues `app` for execution
+        """
+        cpus = min(max(app.num_cpus, 0), self._cpus)
+        memory = min(max(app.memory, 0), self._memory)
+        with self._cond:
+            priority = self._priorities.pop(app, 0)
+            heapq.heappush(self._ready, (-priority, next(self._seq), cpus, memory, app))
+            self._cond.notify_all()
+
+    def _next(self):
+        with self._cond:
+            while self._running:
+                if self._ready:
+                    _, _, cpus, memory, app = self._ready[0]
+                    if cpus <= self._free_cpus and memory <= self._free_memory:
+                        heapq.heappop(self._ready)
+                        self._free_cpus -= cpus
+                        self._free_memory -= memory
+                        return cpus, memory, app
+                self._cond.wait()
+        return None
+
+    def _work(self):
+        while True:
+            admitted = self._next()
+            if admitted is None:
+                return
+            cpus, memory, app = admitted
+            try:
+                app.execute()
+            except Exception:
+                logger.exception("Error while executing %r", app)
+            finally:
+                with self._cond:
+                    self._free_cpus += cpus
+                    self._free_memory += memory
+                    self._cond.notify_all()
+
+    @property
+    def queued(self):
+        """
+        The number of applications waiting to be executed
+        """
+        with self._cond:
+            return len(self._ready)
+
+    def shutdown(self):
+        """
+        Stops executing applications. Queued applications are not executed.
+        """
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
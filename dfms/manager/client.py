@@ -19,6 +19,7 @@
 #    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
 #    MA 02111-1307  USA
 #
+import json
 import logging
 import os
 
@@ -85,6 +86,42 @@ class BaseDROPManagerClient(RestClient):
         logger.debug('Successfully read graph status from session %s on %s:%s', sessionId, self.host, self.port)
         return ret
 
+    def graph_status_changes(self, sessionId, since):
+        """
+        Returns a dictionary with the status of the DROPs that changed after
+        sequence number `since` under ``status``, and the latest sequence number
+        under ``seq``.
+        """
+        ret = self._get_json('/sessions/%s/graph/status?since=%d' % (urllib.quote(sessionId), since))
+        logger.debug('Successfully read graph status changes from session %s on %s:%s', sessionId, self.host, self.port)
+        return ret
+
+    def graph_status_stream(self, sessionId, since=0, timeout=10, interval=0.5):
+        """
+        Returns a generator that yields the changes in the status of the DROPs
+        of session `sessionId` as they occur, starting after sequence number
+        `since`, in the same format used by `graph_status_changes`. The
+        generator finishes when the session has finished.
+        """
+        url = '/sessions/%s/graph/status/stream?since=%d&timeout=%f&interval=%f'
+        events = self._get_events(url % (urllib.quote(sessionId), since, timeout, interval))
+        logger.debug('Successfully started streaming graph status from session %s on %s:%s', sessionId, self.host, self.port)
+        def changes():
+            for event, data in events:
+                if event == 'end':
+                    return
+                yield json.loads(data)
+        return changes()
+
+    def graph_progress(self, sessionId):
+        """
+        Returns the progress of the execution of the graph of session
+        `sessionId`
+        """
+        ret = self._get_json('/sessions/%s/graph/progress' % (urllib.quote(sessionId),))
+        logger.debug('Successfully read graph progress from session %s on %s:%s', sessionId, self.host, self.port)
+        return ret
+
     def graph(self, sessionId):
         """
         Returns a dictionary where the key are the DROP UIDs, and the values are
@@ -133,6 +170,9 @@ class BaseDROPManagerClient(RestClient):
     addGraphSpec = append_graph
     deploySession = deploy_session
     getGraphStatus = graph_status
+    getGraphStatusChanges = graph_status_changes
+    streamGraphStatusChanges = graph_status_stream
+    getGraphProgress = graph_progress
     getGraphSize = graph_size
     getGraph = graph
 
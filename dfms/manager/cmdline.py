@@ -41,6 +41,7 @@ from dfms.manager.node_manager import NodeManager
 from dfms.manager.replay import ReplayManager, ReplayManagerServer
 from dfms.manager.rest import NMRestServer, CompositeManagerRestServer, \
     MasterManagerRestServer
+from dfms.restutils import server_backends
 from dfms.utils import getDfmsPidDir, getDfmsLogsDir, createDirIfMissing
 
 
@@ -54,7 +55,7 @@ def launchServer(opts):
     logger.info('Creating %s' % (dmName))
     dm = opts.dmType(*opts.dmArgs, **opts.dmKwargs)
 
-    server = opts.restType(dm, opts.maxreqsize)
+    server = opts.restType(dm, opts.maxreqsize, opts.restBackend, opts.restWorkers)
 
     # Signal handling
     def handle_signal(signNo, stack_frame):
@@ -85,6 +86,10 @@ def addCommonOptions(parser, defaultPort):
                       dest="port", help = "The port to bind this instance on", default=defaultPort)
     parser.add_option("-m", "--max-request-size", action="store", type="int",
                       dest="maxreqsize", help="The maximum allowed HTTP request size, in MB", default=10)
+    parser.add_option("--rest-server", action="store", type="choice", choices=sorted(server_backends),
+                      dest="restBackend", help="The HTTP server backend used by the REST interface, one of %s (default: pooled)" % (', '.join(sorted(server_backends)),), default='pooled')
+    parser.add_option("--rest-workers", action="store", type="int",
+                      dest="restWorkers", help="Number of worker threads used by the pooled HTTP server backend", default=32)
     parser.add_option("-d", "--daemon", action="store_true",
                       dest="daemon", help="Run as daemon", default=False)
     parser.add_option("-s", "--stop", action="store_true",
@@ -204,7 +209,19 @@ def dlgNM(parser, args):
     parser.add_option("--luigi", action="store_true",
                       dest="enable_luigi", help="Enable integration with Luigi. Disabled by default.", default=False)
     parser.add_option("-t", "--max-threads", action="store", type="int",
-                      dest="max_threads", help="Max thread pool size used for executing drops. 0 (default) means no pool.", default=0)
+                      dest="max_threads", help="Max number of apps executed concurrently by the app scheduler. 0 (default) means no scheduler, one thread per app.", default=0)
+    parser.add_option("--cpus", action="store", type="int",
+                      dest="cpus", help="Number of CPUs the app scheduler can use. 0 (default) means all", default=0)
+    parser.add_option("--memory", action="store", type="int",
+                      dest="memory", help="Memory in MB the app scheduler can use. 0 (default) means all", default=0)
+    parser.add_option("--max-processes", action="store", type="int",
+                      dest="max_processes", help="Number of worker processes used by CPU-bound apps. 0 (default) means no process pool, -1 means one per CPU", default=0)
+    parser.add_option("--memory-drops-limit", action="store", type="int",
+                      dest="memory_drops_limit", help="Memory in MB that in-memory DROPs can hold before being spilled to disk. 0 (default) means no limit", default=0)
+    parser.add_option("--bash-workers", action="store", type="int",
+                      dest="bash_workers", help="Number of long-lived bash processes used to run the commands of bash apps. 0 (default) means a new process per command", default=0)
+    parser.add_option("--docker-warm-containers", action="store", type="int",
+                      dest="docker_warm_containers", help="Number of idle containers per image kept to exec the commands of docker apps. 0 (default) means a new container per command", default=0)
     (options, args) = parser.parse_args(args)
 
     # Add DM-specific options
@@ -217,7 +234,13 @@ def dlgNM(parser, args):
                         'host': options.host,
                         'error_listener': options.errorListener,
                         'enable_luigi': options.enable_luigi,
-                        'max_threads': options.max_threads}
+                        'max_threads': options.max_threads,
+                        'cpus': options.cpus,
+                        'memory': options.memory,
+                        'max_processes': options.max_processes,
+                        'memory_drops_limit': options.memory_drops_limit,
+                        'bash_workers': options.bash_workers,
+                        'docker_warm_containers': options.docker_warm_containers}
     options.dmAcronym = 'NM'
     options.restType = NMRestServer
 
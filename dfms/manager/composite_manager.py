@@ -33,6 +33,8 @@ from dfms.exceptions import InvalidGraphException, DaliugeException, \
 from dfms.manager.client import NodeManagerClient
 from dfms.manager.constants import ISLAND_DEFAULT_REST_PORT, NODE_DEFAULT_REST_PORT
 from dfms.manager.drop_manager import DROPManager
+from dfms.manager.graph_status import GraphStatusTable, stream_changes
+from dfms.restutils import connection_pool
 from dfms.utils import portIsOpen
 from dfms.manager import constants
 
@@ -78,6 +80,35 @@ def group_by_node(uids, graph):
         uids_by_node[graph[uid]['node']].append(uid)
     return uids_by_node
 
+class _SessionGraphStatus(object):
+    """
+    The merged graph status of a session across all the underlying drop
+    managers, together with the latest sequence number seen from each of them
+    """
+
+    def __init__(self):
+        self.table = GraphStatusTable()
+        self.since_by_host = {}
+        self.lock = threading.Lock()
+        self.following = set()
+        self.finished = set()
+
+    def merge(self, host, changes):
+        # Changes can come both from delta queries and from followers, make
+        # sure we never go back in time for a given host
+        with self.lock:
+            if changes['seq'] < self.since_by_host.get(host, 0):
+                return
+            self.table.merge(changes['status'])
+            self.since_by_host[host] = changes['seq']
+
+    def host_finished(self, host, hosts):
+        with self.lock:
+            self.following.discard(host)
+            self.finished.add(host)
+            if self.finished.issuperset(hosts):
+                self.table.set_finished()
+
 class CompositeManager(DROPManager):
     """
     A DROPManager that in turn manages DROPManagers (sigh...).
@@ -128,6 +159,12 @@ class CompositeManager(DROPManager):
         self._sessionIds = [] # TODO: it's still unclear how sessions are managed at the composite-manager level
         self._pkeyPath = pkeyPath
         self._dmCheckTimeout = dmCheckTimeout
+
+        # Per-session merged view of the graph status changes reported by the
+        # sub-DMs, together with the last sequence number seen for each of them
+        self._graph_status = {}
+        self._graph_status_lock = threading.Lock()
+
         n_threads = max(1,min(len(dmHosts),20))
         self._tp = multiprocessing.pool.ThreadPool(n_threads)
 
@@ -236,7 +273,9 @@ class CompositeManager(DROPManager):
             host = iterable[0]
 
         try:
-            self.ensureDM(host, port)
+            # Idle connections to the DM show it's there already
+            if not connection_pool.has_idle(host, port):
+                self.ensureDM(host, port)
             with self.dmAt(host, port) as dm:
                 res = f(dm, iterable, sessionId)
 
@@ -288,6 +327,8 @@ class CompositeManager(DROPManager):
         logger.info('Destroying Session %s in all hosts', sessionId)
         self.replicate(sessionId, self._destroySession, "creating sessions")
         self._sessionIds.remove(sessionId)
+        with self._graph_status_lock:
+            self._graph_status.pop(sessionId, None)
 
     def _add_node_subscriptions(self, dm, host_and_subscriptions, sessionId):
         host, subscriptions = host_and_subscriptions
@@ -394,6 +435,64 @@ class CompositeManager(DROPManager):
         self.replicate(sessionId, self._getGraphStatus, "getting graph status", collect=allStatus)
         return allStatus
 
+    def _getGraphStatusChanges(self, status, dm, host, sessionId):
+        return host, dm.getGraphStatusChanges(sessionId, status.since_by_host.get(host, 0))
+
+    def _sessionGraphStatus(self, sessionId):
+        with self._graph_status_lock:
+            if sessionId not in self._graph_status:
+                self._graph_status[sessionId] = _SessionGraphStatus()
+            return self._graph_status[sessionId]
+
+    def _refreshGraphStatus(self, sessionId):
+
+        # Bring our merged table up to date by asking each sub-DM only for the
+        # changes that occurred after the last ones we saw from them. Our own
+        # table then assigns sequence numbers that are meaningful to our clients
+        status = self._sessionGraphStatus(sessionId)
+        allChanges = []
+        self.replicate(sessionId, functools.partial(self._getGraphStatusChanges, status),
+                       "getting graph status changes", collect=allChanges)
+        for host, changes in allChanges:
+            status.merge(host, changes)
+        return status
+
+    def getGraphStatusChanges(self, sessionId, since):
+        return self._refreshGraphStatus(sessionId).table.changes_since(since)
+
+    def getGraphProgress(self, sessionId):
+        return self._refreshGraphStatus(sessionId).table.progress()
+
+    def _followGraphStatus(self, status, host, sessionId):
+        try:
+            self.ensureDM(host)
+            with self.dmAt(host) as dm:
+                for changes in dm.streamGraphStatusChanges(sessionId, status.since_by_host.get(host, 0), timeout=5, interval=0):
+                    status.merge(host, changes)
+            status.host_finished(host, self._dmHosts)
+            logger.debug('Finished following graph status of session %s on %s', sessionId, host)
+        except Exception:
+            logger.exception("Error while following graph status on host %s, session %s", host, sessionId)
+            with status.lock:
+                status.following.discard(host)
+
+    def streamGraphStatusChanges(self, sessionId, since, timeout, interval):
+
+        # A first synchronous refresh surfaces any errors to the caller.
+        # Changes are then pushed into our merged table by one follower thread
+        # per sub-DM, shared by all the clients streaming from this session
+        status = self._refreshGraphStatus(sessionId)
+        with status.lock:
+            hosts = [h for h in self._dmHosts if h not in status.following and h not in status.finished]
+            status.following.update(hosts)
+        for host in hosts:
+            t = threading.Thread(target=self._followGraphStatus, args=(status, host, sessionId),
+                                 name='GraphStatusFollower-%s' % (host,))
+            t.daemon = True
+            t.start()
+
+        return stream_changes(status.table, since, timeout, interval)
+
     def _getGraph(self, dm, host, sessionId):
         return dm.getGraph(sessionId)
 
@@ -82,6 +82,36 @@ class DROPManager(object):
         Returns the status of the graph being executed in session `sessionId`.
         """
 
+    @abc.abstractmethod
+    def getGraphStatusChanges(self, sessionId, since):
+        """
+        Returns the changes in the status of the graph being executed in session
+        `sessionId` that occurred after sequence number `since`. The result is a
+        dictionary with the latest sequence number under ``seq`` and the status
+        of the changed drops under ``status``.
+        """
+
+    @abc.abstractmethod
+    def getGraphProgress(self, sessionId):
+        """
+        Returns the progress of the execution of the graph of session
+        `sessionId`: the number of apps and data drops that are pending,
+        running, completed or erroneous, the fraction of drops that are done
+        and an estimation of the remaining time.
+        """
+
+    @abc.abstractmethod
+    def streamGraphStatusChanges(self, sessionId, since, timeout, interval):
+        """
+        Returns a generator yielding the changes in the status of the graph
+        being executed in session `sessionId` as they occur, starting after
+        sequence number `since`, in the same format used by
+        `getGraphStatusChanges`. Changes are yielded at most every `interval`
+        seconds, and a change-less result is yielded if nothing happens in
+        `timeout` seconds. The generator finishes when the execution of the
+        graph has finished.
+        """
+
     @abc.abstractmethod
     def getGraph(self, sessionId):
         """
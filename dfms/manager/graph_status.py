@@ -0,0 +1,254 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2016
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+"""
+Module containing the structures used to keep track of the status of the drops
+of a graph without having to traverse it.
+"""
+
+import collections
+import threading
+import time
+
+from dfms.ddap_protocol import DROPStates, AppDROPStates
+
+
+PENDING, RUNNING, COMPLETED, ERROR = 'pending', 'running', 'completed', 'error'
+
+# How the status of data drops and the execStatus of apps translate into
+# progress states
+_data_progress = {
+    DROPStates.INITIALIZED: PENDING,
+    DROPStates.WRITING: RUNNING,
+    DROPStates.COMPLETED: COMPLETED,
+    DROPStates.ERROR: ERROR,
+    DROPStates.EXPIRED: COMPLETED,
+    DROPStates.DELETED: COMPLETED
+}
+_app_progress = {
+    AppDROPStates.NOT_RUN: PENDING,
+    AppDROPStates.RUNNING: RUNNING,
+    AppDROPStates.FINISHED: COMPLETED,
+    AppDROPStates.ERROR: ERROR
+}
+
+def _progress_state(attrs):
+    # Only apps carry an execStatus
+    if 'execStatus' in attrs:
+        return 'app', _app_progress.get(attrs['execStatus'], PENDING)
+    return 'data', _data_progress.get(attrs.get('status'), PENDING)
+
+
+class GraphStatusTable(object):
+    """
+    A table holding the status of a number of drops, indexed by their OID.
+
+    Each modification to the table is given an increasing sequence number,
+    allowing clients to ask only for the changes that occurred after a given
+    sequence number (see `changes_since`) instead of asking for the full
+    status of the graph every time. Clients can also wait until new changes
+    arrive (see `wait_for_changes`).
+
+    The table also keeps live counters of how many apps and data drops are
+    pending, running, completed or erroneous, from which the overall progress
+    of the graph is reported (see `progress`).
+    """
+
+    def __init__(self):
+        self._lock = threading.Condition()
+        self._finished = False
+        self._status = {}
+        self._seq = 0
+        # key: oid, value: seq of the last change, ordered by seq
+        self._changes = collections.OrderedDict()
+        # key: oid, value: (kind, progress state)
+        self._progress = {}
+        self._counts = {'app': collections.Counter(), 'data': collections.Counter()}
+        self._started = None
+
+    @property
+    def seq(self):
+        """
+        The sequence number of the latest change recorded by this table
+        """
+        with self._lock:
+            return self._seq
+
+    def _update(self, oid, attrs):
+        entry = self._status.setdefault(oid, {})
+        if all(k in entry and entry[k] == v for k, v in attrs.items()):
+            return
+        entry.update(attrs)
+        self._count(oid, entry)
+        self._seq += 1
+        self._changes.pop(oid, None)
+        self._changes[oid] = self._seq
+        self._lock.notify_all()
+
+    def _count(self, oid, entry):
+        new = _progress_state(entry)
+        old = self._progress.get(oid)
+        if new == old:
+            return
+        if old is not None:
+            self._counts[old[0]][old[1]] -= 1
+        self._counts[new[0]][new[1]] += 1
+        self._progress[oid] = new
+        if self._started is None and new[1] != PENDING:
+            self._started = time.time()
+
+    def update(self, oid, **attrs):
+        """
+        Sets the given attributes (e.g., ``status``, ``execStatus``) for the
+        drop with OID `oid`. Updates that don't change anything are ignored.
+        """
+        with self._lock:
+            self._update(oid, attrs)
+
+    def merge(self, status):
+        """
+        Updates this table with the contents of `status`, a dictionary where
+        keys are OIDs and values are dictionaries with their attributes.
+        """
+        with self._lock:
+            for oid, attrs in status.items():
+                self._update(oid, attrs)
+
+    @property
+    def finished(self):
+        """
+        Whether the graph whose status is held by this table has finished its
+        execution.
+        """
+        with self._lock:
+            return self._finished
+
+    def set_finished(self):
+        """
+        Signals that the graph whose status is held by this table has finished
+        its execution, waking up any client waiting for changes.
+        """
+        with self._lock:
+            self._finished = True
+            self._lock.notify_all()
+
+    def snapshot(self):
+        """
+        Returns the full contents of this table
+        """
+        with self._lock:
+            return {oid: dict(attrs) for oid, attrs in self._status.items()}
+
+    def progress(self):
+        """
+        Returns a dictionary with the number of apps and data drops in each of
+        the ``pending``, ``running``, ``completed`` and ``error`` states (under
+        ``app`` and ``data`` respectively), the total number of drops under
+        ``total``, the fraction of them that are done under ``done``, and an
+        estimation of the remaining seconds under ``eta`` (None if unknown).
+        """
+        with self._lock:
+            counts = {kind: {state: counter[state] for state in (PENDING, RUNNING, COMPLETED, ERROR)}
+                      for kind, counter in self._counts.items()}
+            total = len(self._progress)
+            done = sum(c[COMPLETED] + c[ERROR] for c in counts.values())
+            fraction = float(done) / total if total else 0.
+            eta = None
+            if self._finished or fraction == 1:
+                eta = 0
+            elif self._started is not None and fraction > 0:
+                elapsed = time.time() - self._started
+                eta = elapsed * (1 - fraction) / fraction
+            counts.update(total=total, done=fraction, eta=eta, finished=self._finished)
+            return counts
+
+    def changes_since(self, since):
+        """
+        Returns a dictionary with the latest sequence number of this table
+        under ``seq``, and the status of the drops that changed after sequence
+        number `since` under ``status``. If `since` is bigger than the latest
+        sequence number (e.g., it was obtained from a previous incarnation of
+        this table) the full contents of the table are returned.
+        """
+        with self._lock:
+            return self._changes_since(since)
+
+    def _changes_since(self, since):
+        if since > self._seq:
+            since = 0
+        changed = {}
+        for oid in reversed(self._changes):
+            if self._changes[oid] <= since:
+                break
+            changed[oid] = dict(self._status[oid])
+        return {'seq': self._seq, 'status': changed}
+
+    def wait_for_changes(self, since, timeout):
+        """
+        Like `changes_since`, but waits up to `timeout` seconds for changes to
+        occur after sequence number `since` if there are none yet. Waiting stops
+        too when the graph is marked as finished.
+        """
+        with self._lock:
+            if since == self._seq and not self._finished:
+                self._lock.wait(timeout)
+            return self._changes_since(since)
+
+def stream_changes(table, since=0, timeout=10, interval=0.5):
+    """
+    Returns a generator that yields the changes recorded by `table` after
+    sequence number `since` as they occur, in the same format returned by
+    `GraphStatusTable.changes_since`.
+
+    Changes are yielded at most once every `interval` seconds; changes occurring
+    in between are coalesced together. If no changes occur in `timeout` seconds
+    a change-less result is yielded, which allows callers to check that their
+    clients are still there. The generator finishes when the graph is finished
+    and all its changes have been yielded.
+    """
+    last = 0
+    while True:
+        remaining = last + interval - time.time()
+        if remaining > 0:
+            time.sleep(remaining)
+        finished = table.finished
+        changes = table.wait_for_changes(since, timeout)
+        since = changes['seq']
+        if changes['status']:
+            last = time.time()
+        elif finished:
+            return
+        yield changes
+
+class GraphStatusListener(object):
+    """
+    An event listener that keeps a GraphStatusTable up to date with the
+    ``status`` and ``execStatus`` events fired by the drops it listens to.
+    """
+
+    def __init__(self, table):
+        self._table = table
+
+    def handleEvent(self, evt):
+        if evt.type == 'status':
+            self._table.update(evt.oid, status=evt.status)
+        elif evt.type == 'execStatus':
+            self._table.update(evt.oid, execStatus=evt.execStatus)
@@ -28,7 +28,7 @@ import abc
 import collections
 import importlib
 import logging
-import multiprocessing.pool
+import multiprocessing
 import os
 import socket
 import sys
@@ -39,11 +39,14 @@ import six
 from six.moves import queue as Queue  # @UnresolvedImport
 
 from dfms import utils
-from dfms.drop import AppDROP
+from dfms.apps.bash_shell_app import BashShellBase, BashWorkerPool
+from dfms.apps.dockerapp import DockerApp, DockerManager
+from dfms.drop import AppDROP, InputFiredAppDROP
 from dfms.exceptions import NoSessionException, SessionAlreadyExistsException,\
     DaliugeException
 from dfms.lifecycle.dlm import DataLifecycleManager
 from dfms.manager import constants
+from dfms.manager.app_scheduler import AppScheduler, critical_path_priorities
 from dfms.manager.drop_manager import DROPManager
 from dfms.manager.session import Session
 
@@ -91,13 +94,21 @@ class NodeManagerBase(DROPManager):
                  enable_luigi=False,
                  events_port = constants.NODE_DEFAULT_EVENTS_PORT,
                  rpc_port = constants.NODE_DEFAULT_RPC_PORT,
-                 max_threads = 0):
-
-        self._dlm = DataLifecycleManager() if useDLM else None
+                 max_threads = 0,
+                 cpus = 0,
+                 memory = 0,
+                 max_processes = 0,
+                 memory_drops_limit = 0,
+                 bash_workers = 0,
+                 docker_warm_containers = 0):
+
+        self._dlm = None
+        if useDLM:
+            self._dlm = DataLifecycleManager(memoryHighWatermark=memory_drops_limit * 1024 * 1024)
         self._host = host or 'localhost'
         self._events_port = events_port
         self._rpc_port = rpc_port
-        self._sessions = {}
+        self._sessions = utils.ShardedDict()
 
         # dfmsPath contains code added by the user with possible
         # DROP applications
@@ -124,13 +135,28 @@ class NodeManagerBase(DROPManager):
 
         self._enable_luigi = enable_luigi
 
-        # Start our thread pool
+        # Start our app scheduler, which executes apps under the given
+        # resource budget (0 meaning all the node's CPUs/memory)
         if max_threads == 0:
-            self._threadpool = None
+            self._app_scheduler = None
+        else:
+            self._app_scheduler = AppScheduler(max_threads, cpus=cpus, memory=memory)
+
+        # Pool of processes where CPU-bound apps run their code
+        # (-1 meaning as many as CPUs are available)
+        if max_processes == 0:
+            self._process_pool = None
         else:
-            max_threads = max(min(max_threads, 200), 1)
-            logger.info("Initializing thread pool with %d threads", max_threads)
-            self._threadpool = multiprocessing.pool.ThreadPool(processes=max_threads)
+            processes = None if max_processes < 0 else max_processes
+            self._process_pool = multiprocessing.Pool(processes)
+
+        # Long-lived bash processes where bash apps run their commands
+        self._bash_pool = BashWorkerPool(bash_workers) if bash_workers > 0 else None
+
+        # Long-lived containers where docker apps exec their commands
+        self._docker_manager = None
+        if docker_warm_containers > 0:
+            self._docker_manager = DockerManager(warm_containers=docker_warm_containers)
 
         # Event handler that only logs status changes
         debugging = logger.isEnabledFor(logging.DEBUG)
@@ -175,48 +201,66 @@ class NodeManagerBase(DROPManager):
         Method called by subclasses when a new event has arrived through the
         subscription mechanism.
         """
-        if not evt.session_id in self._sessions:
+        session = self._sessions.get(evt.session_id)
+        if session is None:
             logger.warning("No session %s found, event will be dropped" % (evt.session_id))
             return
-        self._sessions[evt.session_id].deliver_event(evt)
+        session.deliver_event(evt)
 
-    def _check_session_id(self, session_id):
-        if session_id not in self._sessions:
+    def _session(self, session_id):
+        session = self._sessions.get(session_id)
+        if session is None:
             raise NoSessionException(session_id)
+        return session
 
     def createSession(self, sessionId):
-        if sessionId in self._sessions:
+        session = Session(sessionId, self._host, self._error_listener, self._enable_luigi)
+        if self._sessions.setdefault(sessionId, session) is not session:
             raise SessionAlreadyExistsException(sessionId)
-        self._sessions[sessionId] = Session(sessionId, self._host, self._error_listener, self._enable_luigi)
         logger.info('Created session %s', sessionId)
 
     def getSessionStatus(self, sessionId):
-        self._check_session_id(sessionId)
-        return self._sessions[sessionId].status
+        return self._session(sessionId).status
 
     def linkGraphParts(self, sessionId, lhOID, rhOID, linkType):
-        self._check_session_id(sessionId)
-        self._sessions[sessionId].linkGraphParts(lhOID, rhOID, linkType)
+        self._session(sessionId).linkGraphParts(lhOID, rhOID, linkType)
 
     def addGraphSpec(self, sessionId, graphSpec):
-        self._check_session_id(sessionId)
-        self._sessions[sessionId].addGraphSpec(graphSpec)
+        self._session(sessionId).addGraphSpec(graphSpec)
 
     def getGraphStatus(self, sessionId):
-        self._check_session_id(sessionId)
-        return self._sessions[sessionId].getGraphStatus()
+        return self._session(sessionId).getGraphStatus()
+
+    def getGraphStatusChanges(self, sessionId, since):
+        return self._session(sessionId).getGraphStatusChanges(since)
+
+    def getGraphProgress(self, sessionId):
+        return self._session(sessionId).getGraphProgress()
+
+    def streamGraphStatusChanges(self, sessionId, since, timeout, interval):
+        return self._session(sessionId).streamGraphStatusChanges(since, timeout, interval)
 
     def getGraph(self, sessionId):
-        self._check_session_id(sessionId)
-        return self._sessions[sessionId].getGraph()
+        return self._session(sessionId).getGraph()
 
     def deploySession(self, sessionId, completedDrops=[]):
-        self._check_session_id(sessionId)
-        session = self._sessions[sessionId]
+        session = self._session(sessionId)
+
+        # Apps on the critical path of the graph get executed first
+        app_scheduler = self._app_scheduler
+        if app_scheduler:
+            priorities = critical_path_priorities(session.getGraph())
 
         def foreach(drop):
-            if self._threadpool is not None:
-                drop._tp = self._threadpool
+            if isinstance(drop, InputFiredAppDROP):
+                drop.process_pool = self._process_pool
+                if isinstance(drop, BashShellBase):
+                    drop.bash_pool = self._bash_pool
+                if isinstance(drop, DockerApp) and self._docker_manager:
+                    drop.docker_manager = self._docker_manager
+                if app_scheduler:
+                    drop.executor = app_scheduler
+                    app_scheduler.set_priority(drop, priorities.get(drop.oid, 0))
             if self._dlm:
                 self._dlm.addDrop(drop)
 
@@ -237,21 +281,20 @@ class NodeManagerBase(DROPManager):
         session.deploy(completedDrops=completedDrops, foreach=foreach)
 
     def destroySession(self, sessionId):
-        self._check_session_id(sessionId)
-        session = self._sessions.pop(sessionId)
+        session = self._sessions.pop(sessionId, None)
+        if session is None:
+            raise NoSessionException(sessionId)
         session.destroy()
 
     def getSessionIds(self):
         return list(self._sessions.keys())
 
     def getGraphSize(self, sessionId):
-        self._check_session_id(sessionId)
-        session = self._sessions[sessionId]
+        session = self._session(sessionId)
         return len(session._graph)
 
     def trigger_drops(self, sessionId, uids):
-        self._check_session_id(sessionId)
-        t = threading.Thread(target=self._sessions[sessionId].trigger_drops,
+        t = threading.Thread(target=self._session(sessionId).trigger_drops,
                              name="Drop trigger",
                              args=(uids,))
         t.start()
@@ -259,8 +302,7 @@ class NodeManagerBase(DROPManager):
     def add_node_subscriptions(self, sessionId, relationships):
 
         logger.debug("Received subscription information: %r", relationships)
-        self._check_session_id(sessionId)
-        self._sessions[sessionId].add_node_subscriptions(sessionId, relationships, self)
+        self._session(sessionId).add_node_subscriptions(sessionId, relationships, self)
 
         # Set up event channels subscriptions
         for nodesub in relationships:
@@ -301,16 +343,21 @@ class NodeManagerBase(DROPManager):
                 closer()
 
     def has_method(self, sessionId, uid, mname):
-        self._check_session_id(sessionId)
-        return self._sessions[sessionId].has_method(uid, mname)
+        return self._session(sessionId).has_method(uid, mname)
 
     def get_drop_property(self, sessionId, uuid, prop_name):
-        self._check_session_id(sessionId)
-        return self._sessions[sessionId].get_drop_property(uuid, prop_name)
+        return self._session(sessionId).get_drop_property(uuid, prop_name)
 
     def call_drop(self, sessionId, uid, method, *args):
-        self._check_session_id(sessionId)
-        return self._sessions[sessionId].call_drop(uid, method, *args)
+        return self._session(sessionId).call_drop(uid, method, *args)
+
+    def call_drops(self, sessionId, calls):
+        """
+        Calls a number of methods on drops of session `sessionId` in one go.
+        `calls` is a sequence of (uid, method, args) tuples, and the results of
+        each call are returned in a list, in the same order.
+        """
+        return self._session(sessionId).call_drops(calls)
 
 def zmq_safe(host_or_addr):
 
@@ -326,6 +373,15 @@ class BaseMixIn(object):
         self._running = True
     def shutdown(self):
         self._running = False
+        if self._app_scheduler:
+            self._app_scheduler.shutdown()
+        if self._process_pool:
+            self._process_pool.terminate()
+            self._process_pool.join()
+        if self._bash_pool:
+            self._bash_pool.close()
+        if self._docker_manager:
+            self._docker_manager.close()
 
 class ZMQPubSubMixIn(BaseMixIn):
 
@@ -531,6 +587,8 @@ class ZeroRPCMixIn(BaseMixIn):
                     return res_queue.get()
                 def call_drop(self, session_id, uid, name, *args):
                     return self.__make_call('call_drop', session_id, uid, name, *args)
+                def call_drops(self, session_id, calls):
+                    return self.__make_call('call_drops', session_id, calls)
                 def get_drop_property(self, session_id, uid, name):
                     return self.__make_call('get_drop_property', session_id, uid, name)
                 def has_method(self, session_id, uid, name):
@@ -588,6 +646,8 @@ class RPyCMixIn(BaseMixIn): # pragma: no cover
         class NMService(rpyc.Service):
             def exposed_call_drop(self, session_id, uid, name, *args):
                 return nm.call_drop(session_id, uid, name, *args)
+            def exposed_call_drops(self, session_id, calls):
+                return nm.call_drops(session_id, calls)
             def exposed_get_drop_property(self, session_id, uid, name):
                 return nm.get_drop_attribute(session_id, uid, name)
             def exposed_has_method(self, session_id, uid, name):
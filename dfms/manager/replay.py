@@ -27,6 +27,7 @@ import pkg_resources
 
 from dfms.exceptions import NoSessionException, InvalidSessionState
 from dfms.manager.drop_manager import DROPManager
+from dfms.manager.graph_status import GraphStatusTable
 from dfms.manager.rest import ManagerRestServer
 from dfms.manager.session import SessionStates
 
@@ -121,6 +122,19 @@ class ReplayManager(DROPManager):
             logger.info("Serving graph status")
             return graph_status
 
+    def getGraphStatusChanges(self, session_id, since):
+        # Individual changes are not recorded in the status file, so we simply
+        # serve the full status of the graph each time
+        return {'seq': since + 1, 'status': self.getGraphStatus(session_id)}
+
+    def getGraphProgress(self, session_id):
+        table = GraphStatusTable()
+        table.merge(self.getGraphStatus(session_id) or {})
+        return table.progress()
+
+    def streamGraphStatusChanges(self, session_id, since, timeout, interval):
+        raise NotImplementedError()
+
     def getGraph(self, session_id):
         self.check_session_id(session_id)
         logger.info("Serving graph")
@@ -25,6 +25,7 @@ Data Managers (DROPManager and DataIslandManager) to the outside world.
 """
 
 import functools
+import inspect
 import json
 import logging
 
@@ -52,6 +53,8 @@ def daliuge_aware(func):
     def fwrapper(*args, **kwargs):
         try:
             res = func(*args, **kwargs)
+            if inspect.isgenerator(res):
+                return res
             if res is not None:
                 bottle.response.content_type = 'application/json'
                 return json.dumps(res)
@@ -92,6 +95,29 @@ def daliuge_aware(func):
 
     return fwrapper
 
+def stream_params():
+    """
+    Returns the sequence number, timeout and interval used to stream graph
+    status changes, as requested by the client. Clients re-connecting to an
+    event stream will tell us the last sequence number they saw.
+    """
+    query = bottle.request.query
+    since = bottle.request.get_header('Last-Event-ID', None) or query.get('since', 0)
+    return int(since), float(query.get('timeout', 10)), float(query.get('interval', 0.5))
+
+def event_stream(changes):
+    """
+    Sends the graph status changes yielded by `changes` to the client as a
+    text/event-stream. An ``end`` event is sent after the last change.
+    """
+    bottle.response.content_type = 'text/event-stream'
+    bottle.response.set_header('Cache-Control', 'no-cache')
+    def events():
+        for c in changes:
+            yield 'id: %d\ndata: %s\n\n' % (c['seq'], json.dumps(c))
+        yield 'event: end\ndata:\n\n'
+    return events()
+
 class ManagerRestServer(RestServer):
     """
     An object that wraps a DataManager and exposes its methods via a REST
@@ -102,9 +128,9 @@ class ManagerRestServer(RestServer):
     (i.e. those not under /api).
     """
 
-    def __init__(self, dm, maxreqsize=10):
+    def __init__(self, dm, maxreqsize=10, backend='pooled', workers=32):
 
-        super(ManagerRestServer, self).__init__()
+        super(ManagerRestServer, self).__init__(backend, workers)
 
         # Increase maximum file sizes
         bottle.BaseRequest.MEMFILE_MAX = maxreqsize * 1024 * 1024
@@ -122,6 +148,8 @@ class ManagerRestServer(RestServer):
         app.get(   '/api/sessions/<sessionId>/graph',        callback=self.getGraph)
         app.get(   '/api/sessions/<sessionId>/graph/size',   callback=self.getGraphSize)
         app.get(   '/api/sessions/<sessionId>/graph/status', callback=self.getGraphStatus)
+        app.get(   '/api/sessions/<sessionId>/graph/status/stream', callback=self.streamGraphStatus)
+        app.get(   '/api/sessions/<sessionId>/graph/progress', callback=self.getGraphProgress)
         app.post(  '/api/sessions/<sessionId>/graph/append', callback=self.addGraphParts)
 
         # The non-REST mappings that serve HTML-related content
@@ -185,8 +213,20 @@ class ManagerRestServer(RestServer):
 
     @daliuge_aware
     def getGraphStatus(self, sessionId):
+        since = bottle.request.query.get('since', None)
+        if since is not None:
+            return self.dm.getGraphStatusChanges(sessionId, int(since))
         return self.dm.getGraphStatus(sessionId)
 
+    @daliuge_aware
+    def getGraphProgress(self, sessionId):
+        return self.dm.getGraphProgress(sessionId)
+
+    @daliuge_aware
+    def streamGraphStatus(self, sessionId):
+        since, timeout, interval = stream_params()
+        return event_stream(self.dm.streamGraphStatusChanges(sessionId, since, timeout, interval))
+
     # TODO: addGraphParts v/s addGraphSpec
     @daliuge_aware
     def addGraphParts(self, sessionId):
@@ -303,6 +343,7 @@ class CompositeManagerRestServer(ManagerRestServer):
         app.get(   '/api/nodes/<node>/sessions/<sessionId>/status',       callback=self.getNodeSessionStatus)
         app.get(   '/api/nodes/<node>/sessions/<sessionId>/graph',        callback=self.getNodeGraph)
         app.get(   '/api/nodes/<node>/sessions/<sessionId>/graph/status', callback=self.getNodeGraphStatus)
+        app.get(   '/api/nodes/<node>/sessions/<sessionId>/graph/status/stream', callback=self.streamNodeGraphStatus)
 
         # The non-REST mappings that serve HTML-related content
         app.get(  '/', callback=self.visualizeDIM)
@@ -355,9 +396,20 @@ class CompositeManagerRestServer(ManagerRestServer):
     def getNodeGraphStatus(self, node, sessionId):
         if node not in self.dm.nodes:
             raise Exception("%s not in current list of nodes" % (node,))
+        since = bottle.request.query.get('since', None)
         with NodeManagerClient(host=node) as dm:
+            if since is not None:
+                return dm.graph_status_changes(sessionId, int(since))
             return dm.graph_status(sessionId)
 
+    @daliuge_aware
+    def streamNodeGraphStatus(self, node, sessionId):
+        if node not in self.dm.nodes:
+            raise Exception("%s not in current list of nodes" % (node,))
+        since, timeout, interval = stream_params()
+        dm = NodeManagerClient(host=node)
+        return event_stream(dm.graph_status_stream(sessionId, since, timeout, interval))
+
     #===========================================================================
     # non-REST methods
     #===========================================================================
@@ -33,11 +33,14 @@ from luigi import scheduler, worker
 from dfms import droputils
 from dfms import luigi_int, graph_loader
 from dfms.ddap_protocol import DROPStates, DROPLinkType, DROPRel
-from dfms.drop import AbstractDROP, AppDROP, InputFiredAppDROP, \
+from dfms.drop import AppDROP, InputFiredAppDROP, CompletionCounter, \
     LINKTYPE_1TON_APPEND_METHOD, LINKTYPE_1TON_BACK_APPEND_METHOD
 from dfms.exceptions import InvalidSessionState, InvalidGraphException, \
     NoDropException, DaliugeException
 from dfms.manager import constants
+from dfms.manager.graph_status import GraphStatusTable, GraphStatusListener, \
+    stream_changes
+from dfms.utils import ShardedDict
 
 
 logger = logging.getLogger(__name__)
@@ -92,13 +95,13 @@ class LeavesCompletionListener(object):
     def __init__(self, leaves, session):
         self._session = session
         self._nexpected = len(leaves)
-        self._completed = 0
+        self._completed = CompletionCounter()
 
     def handleEvent(self, evt):
-        # TODO: be thread-safe
-        self._completed += 1
-        logger.debug("%d/%d leaf drops completed on session %s", self._completed, self._nexpected, self._session.sessionId)
-        if self._completed == self._nexpected:
+        error = evt.status == DROPStates.ERROR
+        completed, _, finished = self._completed.finish(error, self._nexpected)
+        logger.debug("%d/%d leaf drops completed on session %s", completed, self._nexpected, self._session.sessionId)
+        if finished:
             self._session.finish()
 
 class Session(object):
@@ -122,7 +125,7 @@ class Session(object):
     def __init__(self, sessionId, host=None, error_listener=None, enable_luigi=False):
         self._sessionId = sessionId
         self._graph = {} # key: oid, value: dropSpec dictionary
-        self._drops = {} # key: oid, value: actual drop object
+        self._drops = ShardedDict() # key: oid, value: actual drop object
         self._statusLock = threading.Lock()
         self._roots = []
         self._proxyinfo = []
@@ -132,6 +135,7 @@ class Session(object):
         self._error_status_listener = None
         self._enable_luigi = enable_luigi
         self._dropsubs = {}
+        self._graph_status = GraphStatusTable()
         if error_listener:
             self._error_status_listener = ErrorStatusListener(self, error_listener)
 
@@ -239,10 +243,23 @@ class Session(object):
         self._roots = graph_loader.createGraphFromDropSpecList(self._graph.values())
         logger.info("%d drops successfully created", len(self._graph))
 
-        for drop,_ in droputils.breadFirstTraverse(self._roots):
+        status_listener = GraphStatusListener(self._graph_status)
+        leaves = []
+        for drop,downStreamDrops in droputils.breadFirstTraverse(self._roots):
 
-            # Register them
+            # Register them, and remember which are the leaves of the graph
             self._drops[drop.uid] = drop
+            if not downStreamDrops:
+                leaves.append(drop)
+
+            # Keep track of their status without having to traverse the graph
+            # each time we are asked about it
+            if isinstance(drop, AppDROP):
+                self._graph_status.update(drop.oid, status=drop.status, execStatus=drop.execStatus)
+                drop.subscribe(status_listener, 'execStatus')
+            else:
+                self._graph_status.update(drop.oid, status=drop.status)
+            drop.subscribe(status_listener, 'status')
 
             # Register them with the error handler
             if self._error_status_listener:
@@ -261,7 +278,6 @@ class Session(object):
             workerT.daemon = True
             workerT.start()
         else:
-            leaves = droputils.getLeafNodes(self._roots)
             logger.info("Adding completion listener to leaf drops")
             listener = LeavesCompletionListener(leaves, self)
             for leaf in leaves:
@@ -271,6 +287,13 @@ class Session(object):
                     leaf.subscribe(listener, 'dropCompleted')
             logger.info("Listener added to leaf drops")
 
+        # Foreach
+        if foreach:
+            logger.info("Invoking 'foreach' on each drop")
+            for drop in self._drops.values():
+                foreach(drop)
+            logger.info("'foreach' invoked for each drop")
+
         # We move to COMPLETED the DROPs that we were requested to
         # InputFiredAppDROP are here considered as having to be executed and
         # not directly moved to COMPLETED.
@@ -279,13 +302,6 @@ class Session(object):
         # to make sure all event listeners are ready
         self.trigger_drops(completedDrops)
 
-        # Foreach
-        if foreach:
-            logger.info("Invoking 'foreach' on each drop")
-            for drop,_ in droputils.breadFirstTraverse(self._roots):
-                foreach(drop)
-            logger.info("'foreach' invoked for each drop")
-
         # Append proxies
         logger.info("Creating %d drop proxies", len(self._proxyinfo))
         for nm, host, port, local_uid, relname, remote_uid in self._proxyinfo:
@@ -302,13 +318,15 @@ class Session(object):
         self.finish()
 
     def trigger_drops(self, uids):
-        for drop,downStreamDrops in droputils.breadFirstTraverse(self._roots):
-            downStreamDrops[:] = [dsDrop for dsDrop in downStreamDrops if isinstance(dsDrop, AbstractDROP)]
-            if drop.uid in uids:
-                if isinstance(drop, InputFiredAppDROP):
-                    drop.async_execute()
-                else:
-                    drop.setCompleted()
+        # Drops are looked up directly, unknown UIDs are ignored
+        for uid in set(uids):
+            drop = self._drops.get(uid)
+            if drop is None:
+                continue
+            if isinstance(drop, InputFiredAppDROP):
+                drop.async_execute()
+            else:
+                drop.setCompleted()
 
     def deliver_event(self, evt):
         """
@@ -373,28 +391,48 @@ class Session(object):
 
     def finish(self):
         self.status = SessionStates.FINISHED
+        self._graph_status.set_finished()
         logger.info("Session %s finished", self._sessionId)
 
     def getGraphStatus(self):
         if self.status not in (SessionStates.RUNNING, SessionStates.FINISHED):
             raise InvalidSessionState("The session is currently not running, cannot get graph status")
 
-        # We shouldn't traverse the full graph because there might be nodes
-        # attached to our DROPs that are actually part of other DM (and have been
-        # wired together by the DIM after deploying each individual graph on
-        # each of the DMs).
-        # We recognize such nodes because they are actually not an instance of
-        # AbstractDROP (they are DropProxy instances).
-        #
-        # The same trick is used in luigi_int.RunDROPTask.requires
-        statusDict = collections.defaultdict(dict)
-        for drop, downStreamDrops in droputils.breadFirstTraverse(self._roots):
-            downStreamDrops[:] = [dsDrop for dsDrop in downStreamDrops if isinstance(dsDrop, AbstractDROP)]
-            if isinstance(drop, AppDROP):
-                statusDict[drop.oid]['execStatus'] = drop.execStatus
-            statusDict[drop.oid]['status'] = drop.status
+        # The status of our drops is kept up to date by listening to their
+        # events, so there's no need to traverse the graph here. This also
+        # means that nodes attached to our DROPs that are actually part of
+        # other DMs (DropProxy instances) are naturally left out
+        return self._graph_status.snapshot()
+
+    def getGraphProgress(self):
+        """
+        Returns the progress of the execution of the graph of this session.
 
-        return statusDict
+        :see: `dfms.manager.graph_status.GraphStatusTable.progress`
+        """
+        if self.status not in (SessionStates.RUNNING, SessionStates.FINISHED):
+            raise InvalidSessionState("The session is currently not running, cannot get graph progress")
+        return self._graph_status.progress()
+
+    def getGraphStatusChanges(self, since):
+        """
+        Returns the status of the drops of this session that changed after
+        sequence number `since`, together with the latest sequence number.
+        """
+        if self.status not in (SessionStates.RUNNING, SessionStates.FINISHED):
+            raise InvalidSessionState("The session is currently not running, cannot get graph status")
+        return self._graph_status.changes_since(since)
+
+    def streamGraphStatusChanges(self, since, timeout, interval):
+        """
+        Returns a generator yielding the changes in the status of the drops of
+        this session as they occur, starting after sequence number `since`.
+
+        :see: `dfms.manager.graph_status.stream_changes`
+        """
+        if self.status not in (SessionStates.RUNNING, SessionStates.FINISHED):
+            raise InvalidSessionState("The session is currently not running, cannot get graph status")
+        return stream_changes(self._graph_status, since, timeout, interval)
 
     def getGraph(self):
         return dict(self._graph)
@@ -404,34 +442,42 @@ class Session(object):
 
     __del__ = destroy
 
-    def has_method(self, uid, mname):
-        if uid not in self._drops:
+    def _drop(self, uid):
+        drop = self._drops.get(uid)
+        if drop is None:
             raise NoDropException(uid)
+        return drop
+
+    def has_method(self, uid, mname):
+        drop = self._drop(uid)
         try:
-            drop = self._drops[uid]
             return inspect.ismethod(getattr(drop, mname))
         except AttributeError:
             return False
 
     def get_drop_property(self, uid, prop_name):
-        if uid not in self._drops:
-            raise NoDropException(uid)
+        drop = self._drop(uid)
         try:
-            drop = self._drops[uid]
             return getattr(drop, prop_name)
         except AttributeError:
             raise DaliugeException("%r has no property called %s" % (drop, prop_name))
 
     def call_drop(self, uid, method, *args):
-        if uid not in self._drops:
-            raise NoDropException(uid)
+        drop = self._drop(uid)
         try:
-            drop = self._drops[uid]
             m = getattr(drop, method)
         except AttributeError:
             raise DaliugeException("%r has no method called %s" % (drop, method))
         return m(*args)
 
+    def call_drops(self, calls):
+        """
+        Performs a number of `call_drop` calls in one go. `calls` is a sequence
+        of (uid, method, args) tuples; the results of each call are returned
+        in a list, in the same order.
+        """
+        return [self.call_drop(uid, method, *args) for uid, method, args in calls]
+
     # Support for the 'with' keyword
     def __enter__(self):
         return self
@@ -368,9 +368,12 @@ function _addEdge(g, fromOid, toOid) {
 
 
 /**
- * Starts a regular background task that retrieves the current status of the
- * graph from the REST server, updating the current display to show the correct
- * colors
+ * Starts a background task that retrieves the current status of the graph from
+ * the REST server, updating the current display to show the correct colors.
+ *
+ * If the browser supports it, status changes are pushed by the server as they
+ * happen; otherwise (or if the server doesn't support it) they are regularly
+ * polled.
  */
 function startGraphStatusUpdates(serverUrl, sessionId, selectedNode, delay) {
 
@@ -381,51 +384,88 @@ function startGraphStatusUpdates(serverUrl, sessionId, selectedNode, delay) {
 	}
 	url += '/sessions/' + sessionId + '/graph/status';
 
-	function updateStates() {
-		d3.json(url, function(error, response) {
+	// We ask only for the changes that occurred since our last query,
+	// and keep the accumulated status of the graph here
+	var graphStatus = {};
+	var seq = 0;
+
+	// Returns whether all drops are completed
+	function updateDisplay(response) {
+
+		seq = response.seq;
+		Object.keys(response.status).forEach(function(k) {
+			graphStatus[k] = response.status[k];
+		});
+
+		// Change from {B:{status:2,execStatus:0}, A:{status:1}, ...}
+		//          to [{status:1},{status:2,execStatus:0}...]
+		// (i.e., sort by key and get values only)
+		var keys = Object.keys(graphStatus);
+		keys.sort();
+		var statuses = keys.map(function(k) {return graphStatus[k]});
+
+		// This works assuming that the status list comes in the same order
+		// that the graph was created, which is true
+		// Anyway, we could double-check in the future
+		d3.selectAll('g.nodes').selectAll('g.node')
+		.data(statuses).attr("class", function(s) {
+			if ( typeof s.execStatus != 'undefined' ) {
+				return "node " + EXECSTATUS_CLASSES[s.execStatus];
+			}
+			else {
+				return "node " + STATUS_CLASSES[s.status];
+			}
+		})
+
+		return statuses.reduce(function(prevVal, curVal, idx, arr) {
+			return prevVal && (curVal == 2);
+		}, true);
+	}
+
+	// A final update on the session's status
+	function updateSessionStatus() {
+		d3.json(serverUrl + '/api/sessions/' + sessionId + '/status', function(error, status) {
 			if (error) {
 				console.error(error);
 				return;
 			}
+			d3.select('#session-status').text(sessionStatusToString(uniqueSessionStatus(status)));
+		})
+	}
 
-			// Change from {B:{status:2,execStatus:0}, A:{status:1}, ...}
-			//          to [{status:1},{status:2,execStatus:0}...]
-			// (i.e., sort by key and get values only)
-			var keys = Object.keys(response);
-			keys.sort();
-			var statuses = keys.map(function(k) {return response[k]});
-
-			// This works assuming that the status list comes in the same order
-			// that the graph was created, which is true
-			// Anyway, we could double-check in the future
-			d3.selectAll('g.nodes').selectAll('g.node')
-			.data(statuses).attr("class", function(s) {
-				if ( typeof s.execStatus != 'undefined' ) {
-					return "node " + EXECSTATUS_CLASSES[s.execStatus];
-				}
-				else {
-					return "node " + STATUS_CLASSES[s.status];
-				}
-			})
-
-			var allCompleted = statuses.reduce(function(prevVal, curVal, idx, arr) {
-				return prevVal && (curVal == 2);
-			}, true);
-			if (!allCompleted) {
+	function updateStates() {
+		d3.json(url + '?since=' + seq, function(error, response) {
+			if (error) {
+				console.error(error);
+				return;
+			}
+			if (!updateDisplay(response)) {
 				d3.timer(updateStates, delay);
 			}
 			else {
-				// A final update on the session's status
-				d3.json(serverUrl + '/api/sessions/' + sessionId + '/status', function(error, status) {
-					if (error) {
-						console.error(error);
-						return;
-					}
-					d3.select('#session-status').text(sessionStatusToString(uniqueSessionStatus(status)));
-				})
+				updateSessionStatus();
 			}
 		})
 		return true;
 	}
-	d3.timer(updateStates);
-}
\ No newline at end of file
+
+	if( !window.EventSource ) {
+		d3.timer(updateStates);
+		return;
+	}
+
+	var source = new EventSource(url + '/stream?since=' + seq);
+	source.onmessage = function(e) {
+		updateDisplay(JSON.parse(e.data));
+	};
+	source.addEventListener('end', function(e) {
+		source.close();
+		updateSessionStatus();
+	});
+	source.onerror = function(e) {
+		// The server refused to stream, fall back to polling
+		if( source.readyState == EventSource.CLOSED ) {
+			d3.timer(updateStates);
+		}
+	};
+}
@@ -25,11 +25,15 @@ A module containing utility code for running remote commands over SSH.
 
 import logging
 import os
+import posixpath
+import stat
+import threading
 import time
 
 from paramiko.client import SSHClient, AutoAddPolicy
 from paramiko.rsakey import RSAKey
 import scp
+from six.moves import queue as Queue  # @UnresolvedImport
 
 
 logger = logging.getLogger(__name__)
@@ -72,7 +76,7 @@ def execRemote(host, command, username=None, timeout=None, bufsize=-1):
     with createClient(host, username) as client:
         return execRemoteWithClient(client, command, timeout, bufsize)
 
-def createClient(host, username=None, pkeyPath=None):
+def createClient(host, username=None, pkeyPath=None, port=22, timeout=None):
     """
     Creates an SSH client object that can be used to perform SSH-related
     operations
@@ -81,7 +85,7 @@ def createClient(host, username=None, pkeyPath=None):
     client.set_missing_host_key_policy(AutoAddPolicy())
 
     pkey = RSAKey.from_private_key_file(os.path.expanduser(pkeyPath)) if pkeyPath else None
-    client.connect(host, username=username, pkey=pkey)
+    client.connect(host, port=port, username=username, pkey=pkey, timeout=timeout)
     return client
 
 def __scpProgress(filename, size, sent):
@@ -112,4 +116,227 @@ def copyTo(host, localFiles, remotePath='.', recursive=False, username=None, pke
     client = createClient(host, username=username, pkeyPath=pkeyPath)
     with scp.SCPClient(client.get_transport(), progress=__scpProgress, socket_timeout=timeout) as scpClient:
         scpClient.put(localFiles, remote_path=remotePath, recursive=recursive)
-    client.close()
\ No newline at end of file
+    client.close()
+
+class ConnectionPool(object):
+    """
+    A cache of connected SSH clients, so that subsequent operations on the
+    same host don't pay for a new connection and handshake. Clients are keyed
+    by host, port, user and key, plus an `index` used to get several
+    independent connections (and therefore TCP streams) to the same host.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+
+    def get(self, host, username=None, pkeyPath=None, port=22, timeout=None, index=0):
+        key = (host, port, username, pkeyPath, index)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                transport = client.get_transport()
+                if transport is not None and transport.is_active():
+                    return client
+                client.close()
+            client = createClient(host, username=username, pkeyPath=pkeyPath, port=port, timeout=timeout)
+            self._clients[key] = client
+            return client
+
+    def close(self):
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+
+#: The pool used by `transferTo` and `transferFrom`
+connection_pool = ConnectionPool()
+
+class TransferProgress(object):
+    """
+    Keeps track of the bytes transferred by the different streams of a
+    transfer, reporting them to `callback` as ``callback(transferred, total)``
+    """
+
+    def __init__(self, total, callback=None):
+        self.total = total
+        self.transferred = 0
+        self._callback = callback
+        self._lock = threading.Lock()
+
+    def add(self, n):
+        with self._lock:
+            self.transferred += n
+            if self._callback:
+                self._callback(self.transferred, self.total)
+
+def _ranges(size, chunkSize):
+    if size <= chunkSize:
+        return [(0, size)]
+    return [(offset, min(chunkSize, size - offset)) for offset in range(0, size, chunkSize)]
+
+def _transfer(host, conn, files, streams, chunkSize, bufsize, work, progress):
+    """
+    Splits `files`, a list of ``(source, target, size, mode)`` tuples, into
+    whole-file or, for big files, range jobs, and runs ``work(sftp, job,
+    bufsize, progress)`` for all of them from `streams` threads, each with its
+    own pooled connection to `host` and SFTP session
+    """
+    jobs = Queue.Queue()
+    for f in files:
+        ranges = _ranges(f[2], chunkSize)
+        for offset, length in ranges:
+            jobs.put((f, offset, length, len(ranges) == 1))
+
+    errors = []
+    def worker(index):
+        try:
+            sftp = connection_pool.get(host, index=index, **conn).open_sftp()
+            try:
+                while not errors:
+                    try:
+                        job = jobs.get_nowait()
+                    except Queue.Empty:
+                        break
+                    work(sftp, job, bufsize, progress)
+            finally:
+                sftp.close()
+        except Exception as e:
+            logger.exception("Error while transferring data with %s", host)
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(min(streams, jobs.qsize()) or 1)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0]
+
+def _upload(sftp, job, bufsize, progress):
+    (source, target, _, mode), offset, length, whole = job
+    with open(source, 'rb') as f, sftp.open(target, 'wb' if whole else 'r+b') as rf:
+        if whole:
+            rf.chmod(mode)
+        rf.set_pipelined(True)
+        f.seek(offset)
+        rf.seek(offset)
+        while length:
+            data = f.read(min(length, bufsize))
+            if not data:
+                raise IOError("%s is shorter than expected" % (source,))
+            rf.write(data)
+            length -= len(data)
+            progress.add(len(data))
+
+def _download(sftp, job, bufsize, progress):
+    (source, target, _, mode), offset, length, whole = job
+    with sftp.open(source, 'rb') as rf, open(target, 'wb' if whole else 'r+b') as f:
+        f.seek(offset)
+        chunks = [(o, min(bufsize, offset + length - o)) for o in range(offset, offset + length, bufsize)]
+        if chunks:
+            for data in rf.readv(chunks):
+                f.write(data)
+                progress.add(len(data))
+    if whole:
+        os.chmod(target, mode)
+
+def _sftp_makedirs(sftp, path):
+    try:
+        sftp.stat(path)
+    except IOError:
+        _sftp_makedirs(sftp, posixpath.dirname(path))
+        sftp.mkdir(path)
+
+def transferTo(host, localPath, remotePath, username=None, pkeyPath=None, port=22,
+               timeout=None, streams=4, chunkSize=64 * 1024 ** 2, bufsize=1024 ** 2,
+               progress=None):
+    """
+    Copies the file at `localPath` to `host`:`remotePath`, or the contents of
+    the directory at `localPath` into the `host`:`remotePath` directory,
+    using SFTP over `streams` pooled connections in parallel. Directories are
+    transferred one file per stream at a time; files bigger than `chunkSize`
+    are transferred in ranges of that size by different streams. `progress`,
+    if given, is called as ``progress(transferred, total)``.
+    """
+    conn = dict(username=username, pkeyPath=pkeyPath, port=port, timeout=timeout)
+    sftp = connection_pool.get(host, **conn).open_sftp()
+    try:
+        files = []
+        def addFile(source, target):
+            st = os.stat(source)
+            files.append((source, target, st.st_size, stat.S_IMODE(st.st_mode)))
+
+        if os.path.isdir(localPath):
+            _sftp_makedirs(sftp, remotePath)
+            for root, dirs, names in os.walk(localPath):
+                rel = os.path.relpath(root, localPath)
+                rroot = remotePath if rel == '.' else posixpath.join(remotePath, *rel.split(os.sep))
+                for d in dirs:
+                    try:
+                        sftp.mkdir(posixpath.join(rroot, d))
+                    except IOError:
+                        pass # already exists
+                for name in names:
+                    addFile(os.path.join(root, name), posixpath.join(rroot, name))
+        else:
+            addFile(localPath, remotePath)
+
+        # Files transferred in ranges must exist beforehand
+        for source, target, size, mode in files:
+            if size > chunkSize:
+                with sftp.open(target, 'wb') as rf:
+                    rf.truncate(size)
+                    rf.chmod(mode)
+    finally:
+        sftp.close()
+
+    total = TransferProgress(sum(f[2] for f in files), progress)
+    start = time.time()
+    _transfer(host, conn, files, streams, chunkSize, bufsize, _upload, total)
+    logger.debug("Transferred %d files (%d bytes) to %s:%s in %.2f [s]",
+                 len(files), total.total, host, remotePath, time.time() - start)
+
+def transferFrom(host, remotePath, localPath, username=None, pkeyPath=None, port=22,
+                 timeout=None, streams=4, chunkSize=64 * 1024 ** 2, bufsize=1024 ** 2,
+                 progress=None):
+    """
+    Copies the file at `host`:`remotePath` to `localPath`, or the contents of
+    the directory at `host`:`remotePath` into the `localPath` directory.
+    See `transferTo` for details.
+    """
+    conn = dict(username=username, pkeyPath=pkeyPath, port=port, timeout=timeout)
+    sftp = connection_pool.get(host, **conn).open_sftp()
+    try:
+        files = []
+        def walk(rdir, ldir):
+            if not os.path.isdir(ldir):
+                os.makedirs(ldir)
+            for attr in sftp.listdir_attr(rdir):
+                source = posixpath.join(rdir, attr.filename)
+                target = os.path.join(ldir, attr.filename)
+                if stat.S_ISDIR(attr.st_mode):
+                    walk(source, target)
+                else:
+                    files.append((source, target, attr.st_size, stat.S_IMODE(attr.st_mode)))
+
+        attr = sftp.stat(remotePath)
+        if stat.S_ISDIR(attr.st_mode):
+            walk(remotePath, localPath)
+        else:
+            files.append((remotePath, localPath, attr.st_size, stat.S_IMODE(attr.st_mode)))
+    finally:
+        sftp.close()
+
+    # Files transferred in ranges must exist beforehand
+    for source, target, size, mode in files:
+        if size > chunkSize:
+            with open(target, 'wb') as f:
+                f.truncate(size)
+            os.chmod(target, mode)
+
+    total = TransferProgress(sum(f[2] for f in files), progress)
+    start = time.time()
+    _transfer(host, conn, files, streams, chunkSize, bufsize, _download, total)
+    logger.debug("Transferred %d files (%d bytes) from %s:%s in %.2f [s]",
+                 len(files), total.total, host, remotePath, time.time() - start)
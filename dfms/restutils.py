@@ -20,13 +20,22 @@
 #    MA 02111-1307  USA
 #
 import codecs
+import collections
+import functools
 import json
 import logging
-from wsgiref.simple_server import make_server, WSGIServer, WSGIRequestHandler
+import select
+import socket
+import tempfile
+import threading
+from wsgiref.simple_server import make_server, WSGIServer, WSGIRequestHandler, \
+    ServerHandler
 
 import bottle
 import six
+from six.moves import BaseHTTPServer  # @UnresolvedImport
 import six.moves.http_client as httplib  # @UnresolvedImport
+import six.moves.queue as Queue  # @UnresolvedImport
 import six.moves.socketserver as SocketServer  # @UnresolvedImport
 import six.moves.urllib_parse as urllib  # @UnresolvedImport
 
@@ -40,19 +49,219 @@ logger = logging.getLogger(__name__)
 class ThreadingWSGIServer(SocketServer.ThreadingMixIn, WSGIServer):
     daemon_threads = True
     allow_reuse_address = True
+    request_queue_size = socket.SOMAXCONN
+
+class PooledWSGIServer(WSGIServer):
+    """
+    A WSGIServer that serves its connections using a fixed number of worker
+    threads. Connections accepted while all workers are busy are queued until
+    a worker becomes available, instead of spawning new threads or having
+    the kernel refuse them.
+    """
+    allow_reuse_address = True
+    request_queue_size = socket.SOMAXCONN
+
+    def __init__(self, server_address, handler_class, workers=32):
+        WSGIServer.__init__(self, server_address, handler_class)
+        self._requests = Queue.Queue()
+        self._active = set()
+        self._active_lock = threading.Lock()
+        self._closed = False
+        self._workers = []
+        for i in range(workers):
+            t = threading.Thread(target=self._work, name="RestServerWorker-%d" % (i,))
+            t.daemon = True
+            t.start()
+            self._workers.append(t)
+
+    def process_request(self, request, client_address):
+        self._requests.put((request, client_address))
+
+    def saturated(self):
+        """
+        Whether there are connections waiting for a worker to serve them
+        """
+        return not self._requests.empty()
+
+    def _work(self):
+        while True:
+            item = self._requests.get()
+            if item is None:
+                return
+            request, client_address = item
+            with self._active_lock:
+                if self._closed:
+                    self.shutdown_request(request)
+                    continue
+                self._active.add(request)
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                with self._active_lock:
+                    self._active.discard(request)
+                self.shutdown_request(request)
+
+    def server_close(self):
+        WSGIServer.server_close(self)
+
+        # Persistent connections would otherwise keep being served after the
+        # server is closed
+        with self._active_lock:
+            self._closed = True
+            for request in self._active:
+                try:
+                    request.shutdown(socket.SHUT_RDWR)
+                except socket.error:
+                    pass
+        for _ in self._workers:
+            self._requests.put(None)
 
 class LoggingWSGIRequestHandler(WSGIRequestHandler):
     def log_message(self, fmt, *args):
         logger.debug(fmt, *args)
 
+class _BodyReader(object):
+    """
+    Gives access to the body of a request, keeping track of how much of it
+    hasn't been read yet so the next request on the same connection can be
+    found
+    """
+
+    def __init__(self, rfile, length):
+        self.rfile = rfile
+        self.remaining = length
+
+    def _size(self, size):
+        if size is None or size < 0 or size > self.remaining:
+            return self.remaining
+        return size
+
+    def read(self, size=-1):
+        data = self.rfile.read(self._size(size))
+        self.remaining -= len(data)
+        return data
+
+    def readline(self, size=-1):
+        data = self.rfile.readline(self._size(size))
+        self.remaining -= len(data)
+        return data
+
+    def drain(self):
+        while self.remaining and self.read(65536):
+            pass
+
+def _read_chunked(rfile, max_size=1024*1024):
+    """
+    Reads a chunked request body from `rfile`, returning it in a file object
+    together with its size
+    """
+    body = tempfile.SpooledTemporaryFile(max_size=max_size)
+    while True:
+        size = int(rfile.readline(65537).split(b';', 1)[0].strip(), 16)
+        if not size:
+            break
+        data = rfile.read(size)
+        if len(data) != size:
+            raise ValueError("Truncated chunk")
+        body.write(data)
+        rfile.readline(65537)
+    # Skip trailers
+    while rfile.readline(65537).strip():
+        pass
+    size = body.tell()
+    body.seek(0)
+    return body, size
+
+class KeepAliveServerHandler(ServerHandler):
+    """
+    A ServerHandler that keeps the connection open after responses with a
+    known length, unless the client asked otherwise or other connections are
+    waiting to be served
+    """
+
+    http_version = '1.1'
+
+    def cleanup_headers(self):
+        ServerHandler.cleanup_headers(self)
+        request_handler = self.request_handler
+        if 'Content-Length' not in self.headers or request_handler.server.saturated():
+            request_handler.close_connection = True
+        if request_handler.close_connection:
+            self.headers['Connection'] = 'close'
+        elif request_handler.request_version == 'HTTP/1.0':
+            self.headers['Connection'] = 'keep-alive'
+
+class KeepAliveWSGIRequestHandler(LoggingWSGIRequestHandler):
+    """
+    A WSGIRequestHandler that supports HTTP/1.1 persistent connections.
+    Requests pipelined by clients are served in order. Connections are closed
+    after `timeout` seconds of inactivity.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    timeout = 5
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.handle(self)
+
+    def handle_one_request(self):
+
+        self.close_connection = True
+        try:
+            self.raw_requestline = self.rfile.readline(65537)
+        except socket.error:
+            return
+        if not self.raw_requestline:
+            return
+        if len(self.raw_requestline) > 65536:
+            self.send_error(414)
+            return
+        if not self.parse_request():
+            return
+
+        # Chunked bodies are decoded beforehand, so we know where the next
+        # request starts regardless of how much the application reads
+        environ = self.get_environ()
+        body = None
+        if 'chunked' in environ.get('HTTP_TRANSFER_ENCODING', '').lower():
+            try:
+                stdin, size = _read_chunked(self.rfile)
+            except ValueError:
+                self.send_error(400, "Invalid chunked body")
+                self.close_connection = True
+                return
+            del environ['HTTP_TRANSFER_ENCODING']
+            environ['CONTENT_LENGTH'] = str(size)
+        else:
+            body = stdin = _BodyReader(self.rfile, int(environ.get('CONTENT_LENGTH') or 0))
+
+        handler = KeepAliveServerHandler(stdin, self.wfile, self.get_stderr(), environ)
+        handler.request_handler = self
+        handler.run(self.server.get_app())
+
+        if body and not self.close_connection:
+            body.drain()
+
+# The server implementations RestServers can run on, by name
+server_backends = {
+    'threading': (ThreadingWSGIServer, LoggingWSGIRequestHandler),
+    'pooled': (PooledWSGIServer, KeepAliveWSGIRequestHandler)
+}
+
 class RestServerWSGIServer:
-    def __init__(self, wsgi_app, listen = '127.0.0.1', port = 8080):
+    def __init__(self, wsgi_app, listen = '127.0.0.1', port = 8080, backend='pooled', workers=32):
         self.wsgi_app = wsgi_app
         self.listen = listen
         self.port = port
+        server_class, handler_class = server_backends[backend]
+        if server_class is PooledWSGIServer:
+            server_class = functools.partial(server_class, workers=workers)
         self.server = make_server(self.listen, self.port, self.wsgi_app,
-                                  server_class=ThreadingWSGIServer,
-                                  handler_class=LoggingWSGIRequestHandler)
+                                  server_class=server_class,
+                                  handler_class=handler_class)
 
     def serve_forever(self):
         self.server.serve_forever()
@@ -66,9 +275,11 @@ class RestServer(object):
     The base class for our REST servers
     """
 
-    def __init__(self):
+    def __init__(self, backend='pooled', workers=32):
         self._server = None
         self._server_thr = None
+        self._backend = backend
+        self._workers = workers
         self.app = bottle.Bottle()
 
     def start(self, host, port):
@@ -77,9 +288,9 @@ class RestServer(object):
 
         # It seems it's not trivial to stop a running bottle server, so we use
         # tornado's IOLoop directly instead
-        logger.info("Starting REST server on %s:%d" % (host, port))
+        logger.info("Starting REST server on %s:%d using the %s backend" % (host, port, self._backend))
 
-        self._server = RestServerWSGIServer(self.app, host, port)
+        self._server = RestServerWSGIServer(self.app, host, port, self._backend, self._workers)
         self._server.serve_forever()
 
     def stop(self, timeout=None):
@@ -121,9 +332,103 @@ class chunked(object):
             return b"0\r\n\r\n"
         return chunk(data)
 
+def read_events(stream):
+    """
+    A generator yielding the (event, data) pairs found in a text/event-stream
+    read from `stream`. Comments and fields other than ``event`` and ``data``
+    are ignored.
+    """
+    event, data = 'message', []
+    for line in iter(stream.readline, b''):
+        line = line.decode('utf-8').rstrip('\r\n')
+        if not line:
+            if data:
+                yield event, '\n'.join(data)
+            event, data = 'message', []
+            continue
+        field, _, value = line.partition(':')
+        if value.startswith(' '):
+            value = value[1:]
+        if field == 'event':
+            event = value
+        elif field == 'data':
+            data.append(value)
+
+def _dropped(conn):
+    # Idle connections have nothing to read, unless the server closed them
+    if conn.sock is None:
+        return True
+    try:
+        return bool(select.select([conn.sock], [], [], 0)[0])
+    except (socket.error, ValueError):
+        return True
+
+class ConnectionPool(object):
+    """
+    A pool of idle HTTP connections, indexed by the host and port they are
+    connected to. At most `maxsize` idle connections are kept for each
+    host/port pair.
+    """
+
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._idle = collections.defaultdict(list)
+
+    def get(self, host, port):
+        """
+        Returns an idle connection to `host`:`port`, or None if there is none.
+        Connections already closed by the server are discarded.
+        """
+        while True:
+            with self._lock:
+                idle = self._idle.get((host, port))
+                if not idle:
+                    return None
+                conn = idle.pop()
+            if not _dropped(conn):
+                return conn
+            conn.close()
+
+    def put(self, host, port, conn):
+        """
+        Returns `conn`, a connection to `host`:`port` that can be used to
+        send new requests, to this pool
+        """
+        with self._lock:
+            idle = self._idle[(host, port)]
+            if len(idle) < self.maxsize:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def has_idle(self, host, port):
+        """
+        Whether there are idle connections to `host`:`port` in this pool
+        """
+        with self._lock:
+            return bool(self._idle.get((host, port)))
+
+    def clear(self):
+        """
+        Closes all the connections held by this pool
+        """
+        with self._lock:
+            idle = [conn for conns in self._idle.values() for conn in conns]
+            self._idle.clear()
+        for conn in idle:
+            conn.close()
+
+# The connections shared by all RestClients
+connection_pool = ConnectionPool()
+
 class RestClient(object):
     """
-    The base class for our REST clients
+    The base class for our REST clients.
+
+    Connections are taken from, and given back to, a pool shared by all
+    clients (see `connection_pool`), so consecutive requests to the same server
+    reuse the same connection whenever possible.
     """
 
     def __init__(self, host, port, timeout):
@@ -134,10 +439,18 @@ class RestClient(object):
         self._resp = None
 
     def _close(self):
-        if self._resp:
-            self._resp.close()
-        if self._conn:
-            self._conn.close()
+        conn, resp = self._conn, self._resp
+        self._conn = self._resp = None
+        if not conn:
+            return
+        # Connections can be reused only after their last response has been
+        # fully read
+        if resp and resp.isclosed() and not resp.will_close:
+            connection_pool.put(self.host, self.port, conn)
+        else:
+            if resp:
+                resp.close()
+            conn.close()
 
     __del__ = _close
     def __enter__(self):
@@ -164,6 +477,23 @@ class RestClient(object):
         ret = self._POST(url, content, content_type='application/json', compress=compress)
         return json.load(ret) if ret else None
 
+    def _get_events(self, url):
+        """
+        Requests a resource served as a text/event-stream, and returns a
+        generator that yields the (event, data) pairs sent by the server as
+        they arrive. The generator finishes when the server closes the
+        connection.
+        """
+        self._GET(url)
+        return self._events()
+
+    def _events(self):
+        try:
+            for evt in read_events(self._resp.fp):
+                yield evt
+        finally:
+            self._close()
+
     def _GET(self, url):
         return self._request(url, 'GET')
 
@@ -183,21 +513,43 @@ class RestClient(object):
     def _DELETE(self, url):
         return self._request(url, 'DELETE')
 
+    def _new_connection(self):
+        if not utils.portIsOpen(self.host, self.port, self.timeout):
+            raise RestClientException("Cannot connect to %s:%d after %.2f [s]" % (self.host, self.port, self.timeout))
+        return httplib.HTTPConnection(self.host, self.port)
+
     def _request(self, url, method, content=None, headers={}):
 
         # Do the HTTP stuff...
         logger.debug("Sending %s request to %s:%d%s", method, self.host, self.port, url)
 
-        if not utils.portIsOpen(self.host, self.port, self.timeout):
-            raise RestClientException("Cannot connect to %s:%d after %.2f [s]" % (self.host, self.port, self.timeout))
+        self._close()
 
-        if content and hasattr(content, 'read'):
+        streamed = content and hasattr(content, 'read')
+        if streamed:
+            headers = dict(headers)
             headers['Transfer-Encoding'] = 'chunked'
             content = chunked(content)
 
-        self._conn = httplib.HTTPConnection(self.host, self.port)
-        self._conn.request(method, url, content, headers)
-        self._resp = self._conn.getresponse()
+        # Idle connections might still be closed by the server just before we
+        # use them, in which case we retry with a new one. Streamed contents
+        # cannot be sent twice though
+        self._conn = connection_pool.get(self.host, self.port)
+        if self._conn:
+            try:
+                self._conn.request(method, url, content, headers)
+                self._resp = self._conn.getresponse()
+            except (socket.error, httplib.HTTPException):
+                self._conn.close()
+                self._conn = None
+                if streamed:
+                    raise
+                logger.debug("Idle connection to %s:%d is stale, opening a new one", self.host, self.port)
+
+        if not self._conn:
+            self._conn = self._new_connection()
+            self._conn.request(method, url, content, headers)
+            self._resp = self._conn.getresponse()
 
         # Server errors are encoded in the body as json content
         if self._resp.status != httplib.OK:
@@ -226,5 +578,7 @@ class RestClient(object):
             raise ex
 
         if not self._resp.length:
+            if self._resp.length == 0:
+                self._resp.read()
             return None
         return codecs.getreader('utf-8')(self._resp)
\ No newline at end of file
@@ -103,6 +103,10 @@ class S3DROP(AbstractDROP):
 
         return True
 
+    def delete(self):
+        s3 = self._get_s3_connection()
+        s3.meta.client.delete_object(Bucket=self._bucket, Key=self._key)
+
     def size(self):
         if self.exists():
             s3 = self._get_s3_connection()
@@ -31,6 +31,7 @@ import math
 import os
 import socket
 import sys
+import threading
 import time
 import types
 import zlib
@@ -602,4 +603,75 @@ class JSONStream(object):
             if not self.isiter:
                 break
 
-        return b''.join(response)
\ No newline at end of file
+        return b''.join(response)
+class ShardedDict(object):
+    """
+    A dictionary that can be safely shared by many threads, with its keys
+    spread over a number of shards according to their hash.
+
+    Lookups don't take any locks (single dictionary operations are already
+    atomic), while modifications lock only the shard their key belongs to, so
+    writers of different keys rarely contend with each other.
+    """
+
+    def __init__(self, shards=16):
+        self._shards = [{} for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+
+    def _index(self, key):
+        return hash(key) % len(self._shards)
+
+    def __getitem__(self, key):
+        return self._shards[self._index(key)][key]
+
+    def get(self, key, default=None):
+        return self._shards[self._index(key)].get(key, default)
+
+    def __contains__(self, key):
+        return key in self._shards[self._index(key)]
+
+    def __setitem__(self, key, value):
+        i = self._index(key)
+        with self._locks[i]:
+            self._shards[i][key] = value
+
+    def setdefault(self, key, value):
+        """
+        Sets `key` to `value` if not present already, and returns the value
+        `key` ends up mapped to, atomically.
+        """
+        i = self._index(key)
+        with self._locks[i]:
+            return self._shards[i].setdefault(key, value)
+
+    def pop(self, key, *default):
+        i = self._index(key)
+        with self._locks[i]:
+            return self._shards[i].pop(key, *default)
+
+    def __delitem__(self, key):
+        self.pop(key)
+
+    def update(self, other):
+        for k, v in other.items():
+            self[k] = v
+
+    def clear(self):
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                shard.clear()
+
+    def __len__(self):
+        return sum(len(shard) for shard in self._shards)
+
+    def keys(self):
+        return [k for shard in self._shards for k in list(shard)]
+
+    def values(self):
+        return [v for shard in self._shards for v in list(shard.values())]
+
+    def items(self):
+        return [i for shard in self._shards for i in list(shard.items())]
+
+    def __iter__(self):
+        return iter(self.keys())
@@ -0,0 +1,4 @@
+version = '0.2.0'
+git_version = 'Unknown'
+full_version = '0.2.0'
+is_release = False
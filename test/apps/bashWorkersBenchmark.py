@@ -0,0 +1,77 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2015
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+"""
+A benchmark for the execution of short bash commands. It runs a number of
+commands from several threads, first starting a new bash process for each
+command, and then using a pool of long-lived bash workers, and reports the
+number of commands run per second in each case.
+"""
+
+from optparse import OptionParser
+import sys
+import threading
+import time
+
+from dfms.apps.bash_shell_app import run_bash, BashWorkerPool
+
+
+def run(commands, threads, command, pool=None):
+    """
+    Runs `commands` instances of `command` from `threads` threads and returns
+    the number of commands run per second
+    """
+    def work(n):
+        for _ in range(n):
+            run_bash(command, {}, {}, pool=pool)
+
+    ts = [threading.Thread(target=work, args=(commands // threads,)) for _ in range(threads)]
+    start = time.time()
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    return (commands // threads) * threads / (time.time() - start)
+
+if __name__ == '__main__':
+
+    parser = OptionParser()
+    parser.add_option("-n", "--commands", action="store", type="int",
+                      dest="commands", help="Number of commands to run", default=1000)
+    parser.add_option("-t", "--threads", action="store", type="int",
+                      dest="threads", help="Number of threads running commands, and of bash workers", default=4)
+    parser.add_option("-c", "--command", action="store", type="string",
+                      dest="command", help="The command to run", default="true")
+    parser.add_option("--csv", action="store_true", dest="csv", help="Output results in CSV format", default=False)
+    (options, args) = parser.parse_args(sys.argv)
+
+    baseline = run(options.commands, options.threads, options.command)
+    pool = BashWorkerPool(options.threads)
+    try:
+        pooled = run(options.commands, options.threads, options.command, pool)
+    finally:
+        pool.close()
+
+    if options.csv:
+        print("%.1f,%.1f,%.2f" % (baseline, pooled, pooled / baseline))
+    else:
+        print("new process per command: %10.1f [commands/s]" % (baseline,))
+        print("bash worker pool:        %10.1f [commands/s] (speedup %.2fx)" % (pooled, pooled / baseline))
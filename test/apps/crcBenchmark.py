@@ -0,0 +1,83 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2015
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+"""
+A benchmark for the checksum calculation done by the CRCApp. A file of a
+given size is checksummed using an increasing number of threads, and the
+throughput of each run is reported.
+"""
+
+from multiprocessing.pool import ThreadPool
+from optparse import OptionParser
+import os
+import sys
+import tempfile
+import time
+
+from dfms.apps.crc import DEFAULT_ALGORITHM, _file_checksum
+
+
+def run(path, bufsize, algorithm, threads):
+    """
+    Checksums the file at `path` with `threads` threads and returns the
+    throughput in bytes per second
+    """
+    pool = ThreadPool(threads) if threads > 1 else None
+    try:
+        start = time.time()
+        _file_checksum(path, bufsize, algorithm, pool)
+        return os.path.getsize(path) / (time.time() - start)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+if __name__ == '__main__':
+
+    parser = OptionParser()
+    parser.add_option("-s", "--size", action="store", type="int",
+                      dest="size", help="Size of the file in MB", default=1024)
+    parser.add_option("-b", "--bufsize", action="store", type="int",
+                      dest="bufsize", help="Size of the chunks in MB", default=4)
+    parser.add_option("-a", "--algorithm", action="store", type="string",
+                      dest="algorithm", help="The checksum algorithm", default=DEFAULT_ALGORITHM)
+    parser.add_option("-t", "--threads", action="store", type="int",
+                      dest="threads", help="Maximum number of threads", default=os.cpu_count() if hasattr(os, 'cpu_count') else 4)
+    parser.add_option("--csv", action="store_true", dest="csv", help="Output results in CSV format", default=False)
+    (options, args) = parser.parse_args(sys.argv)
+
+    fd, path = tempfile.mkstemp()
+    try:
+        block = os.urandom(1024 ** 2)
+        with os.fdopen(fd, 'wb') as f:
+            for _ in range(options.size):
+                f.write(block)
+
+        threads = 1
+        while threads <= options.threads:
+            rate = run(path, options.bufsize * 1024 ** 2, options.algorithm, threads)
+            if options.csv:
+                print("%d,%.3f" % (threads, rate / 1024. ** 3))
+            else:
+                print("%2d threads: %.3f [GB/s]" % (threads, rate / 1024. ** 3))
+            threads *= 2
+    finally:
+        os.remove(path)
@@ -0,0 +1,121 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2015
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+"""
+A benchmark for the SocketListenerApp. A number of clients send data over
+localhost to a listener writing into NullDROPs, and the rate at which data
+is received is reported.
+"""
+
+from optparse import OptionParser
+import socket
+import sys
+import threading
+import time
+
+from dfms.apps.socket_listener import SocketListenerApp
+from dfms.drop import NullDROP
+from dfms.ddap_protocol import DROPStates
+
+
+def send(host, port, size, chunk):
+    s = socket.create_connection((host, port))
+    try:
+        for _ in range(size // len(chunk)):
+            s.sendall(chunk)
+    finally:
+        s.close()
+
+def connect(host, port, timeout=5):
+    # Wait until the listener is accepting connections
+    start = time.time()
+    while time.time() - start < timeout:
+        try:
+            return socket.create_connection((host, port))
+        except socket.error:
+            time.sleep(0.01)
+    raise Exception("Listener didn't start in %d seconds" % (timeout,))
+
+def run(host, port, clients, size, outputs, **kwargs):
+    """
+    Sends `size` bytes from each of `clients` clients to a SocketListenerApp
+    writing into `outputs` NullDROPs, and returns the receiving rate in
+    bytes per second
+    """
+    app = SocketListenerApp('a', 'a', host=host, port=port, connections=clients, **kwargs)
+    drops = [NullDROP(str(i), str(i)) for i in range(outputs)]
+    for d in drops:
+        app.addOutput(d)
+
+    chunk = b' ' * (1024 ** 2)
+    t = threading.Thread(target=app.execute)
+    t.start()
+
+    # The first client is used to wait for the listener to come up
+    start = time.time()
+    first = connect(host, port)
+    def sendFirst():
+        try:
+            for _ in range(size // len(chunk)):
+                first.sendall(chunk)
+        finally:
+            first.close()
+    ts = [threading.Thread(target=sendFirst)]
+    ts += [threading.Thread(target=send, args=(host, port, size, chunk)) for _ in range(clients - 1)]
+    for c in ts:
+        c.start()
+    for c in ts:
+        c.join()
+    t.join()
+    duration = time.time() - start
+
+    if any(d.status != DROPStates.COMPLETED for d in drops):
+        raise Exception("Not all outputs were completed")
+    return (size // len(chunk)) * len(chunk) * clients / duration
+
+if __name__ == '__main__':
+
+    parser = OptionParser()
+    parser.add_option("-H", "--host", action="store", type="string",
+                      dest="host", help="The host to listen on", default="localhost")
+    parser.add_option("-p", "--port", action="store", type="int",
+                      dest="port", help="The port to listen on", default=1111)
+    parser.add_option("-c", "--clients", action="store", type="int",
+                      dest="clients", help="Number of concurrent clients", default=4)
+    parser.add_option("-s", "--size", action="store", type="int",
+                      dest="size", help="MBs sent by each client", default=1024)
+    parser.add_option("-o", "--outputs", action="store", type="int",
+                      dest="outputs", help="Number of outputs", default=1)
+    parser.add_option("-b", "--bufsize", action="store", type="int",
+                      dest="bufsize", help="Size of the receive buffers", default=1024 ** 2)
+    parser.add_option("-r", "--rcvbuf", action="store", type="int",
+                      dest="rcvbuf", help="SO_RCVBUF of the listening socket (0 = system default)", default=0)
+    parser.add_option("--csv", action="store_true", dest="csv", help="Output results in CSV format", default=False)
+    (options, args) = parser.parse_args(sys.argv)
+
+    size = options.size * 1024 ** 2
+    rate = run(options.host, options.port, options.clients, size, options.outputs,
+               bufsize=options.bufsize, rcvbuf=options.rcvbuf, merge='unordered')
+
+    if options.csv:
+        print("%d,%d,%.3f" % (options.clients, options.outputs, rate / 1024. ** 3))
+    else:
+        print("%d clients, %d outputs: %.3f [GB/s]" % (options.clients, options.outputs, rate / 1024. ** 3))
@@ -0,0 +1,172 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2017
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+import os
+import threading
+import unittest
+
+from six.moves import BaseHTTPServer, socketserver  # @UnresolvedImport
+from six.moves.urllib import parse as urlparse  # @UnresolvedImport
+
+from dfms.apps.archiving import NgasArchivingApp
+from dfms.ddap_protocol import DROPStates
+from dfms.drop import InMemoryDROP
+from dfms.droputils import DROPWaiterCtx
+
+
+class FakeNgasHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        url = urlparse.urlparse(self.path)
+        if url.path != '/QARCHIVE':
+            self.send_error(404)
+            return
+        fileId = urlparse.parse_qs(url.query)['filename'][0]
+
+        with server.lock:
+            server.current += 1
+            server.maxConcurrent = max(server.maxConcurrent, server.current)
+
+        size = int(self.headers['Content-Length'])
+        data = b''
+        while len(data) < size:
+            data += self.rfile.read(min(65536, size - len(data)))
+
+        # The request is finished before replying, as the client might start
+        # a new one as soon as it gets the reply
+        with server.lock:
+            server.current -= 1
+            fail = server.failures > 0
+            server.failures -= 1
+            if not fail:
+                server.files[fileId] = data
+                server.archived.append(fileId)
+
+        if fail:
+            self.send_error(500)
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+class FakeNgasServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    A stand-in for an NGAS server that understands QARCHIVE requests,
+    keeping the archived files in memory
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port, failures=0):
+        BaseHTTPServer.HTTPServer.__init__(self, ('localhost', port), FakeNgasHandler)
+        self.lock = threading.Lock()
+        self.files = {}
+        self.archived = []
+        self.failures = failures
+        self.current = 0
+        self.maxConcurrent = 0
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+
+class TestNgasArchivingApp(unittest.TestCase):
+
+    def _archive(self, ndrops, size, **kwargs):
+        a = NgasArchivingApp('a', 'a', **kwargs)
+        drops = []
+        for i in range(ndrops):
+            d = InMemoryDROP('d%d' % i, 'd%d' % i)
+            d.write(os.urandom(size))
+            a.addInput(d)
+            drops.append(d)
+        with DROPWaiterCtx(self, a, 10):
+            for d in drops:
+                d.setCompleted()
+        return a, drops
+
+    def _assertArchived(self, drops, *servers):
+        for d in drops:
+            data = [s.files[d.uid] for s in servers if d.uid in s.files]
+            times = sum(s.archived.count(d.uid) for s in servers)
+            self.assertEqual(1, times, "%s archived %d times" % (d.uid, times))
+            desc = d.open()
+            self.assertEqual(d.read(desc, d.size), data[0])
+            d.close(desc)
+
+    def test_archive(self):
+        server = FakeNgasServer(7781)
+        try:
+            a, drops = self._archive(10, 1024 ** 2 + 17, ngasSrv='localhost', ngasPort=7781,
+                                     concurrency=3, bufsize=100000)
+            self.assertEqual(DROPStates.COMPLETED, a.status)
+            self._assertArchived(drops, server)
+            self.assertLessEqual(server.maxConcurrent, 3)
+        finally:
+            server.stop()
+
+    def test_multiple_servers(self):
+        servers = [FakeNgasServer(7782), FakeNgasServer(7783)]
+        try:
+            a, drops = self._archive(6, 1000, ngasSrv='localhost:7782,localhost:7783')
+            self.assertEqual(DROPStates.COMPLETED, a.status)
+            self._assertArchived(drops, *servers)
+            for s in servers:
+                self.assertTrue(s.files)
+        finally:
+            for s in servers:
+                s.stop()
+
+    def test_retries(self):
+        server = FakeNgasServer(7784, failures=2)
+        try:
+            a, drops = self._archive(3, 1000, ngasSrv='localhost:7784', retries=2, retryDelay=0)
+            self.assertEqual(DROPStates.COMPLETED, a.status)
+            self._assertArchived(drops, server)
+        finally:
+            server.stop()
+
+    def test_resume(self):
+        # The first execution fails to archive one drop, which is then
+        # the only one archived by the second execution
+        server = FakeNgasServer(7785, failures=1)
+        try:
+            a, drops = self._archive(3, 1000, ngasSrv='localhost:7785', retries=0, n_tries=2)
+            self.assertEqual(DROPStates.COMPLETED, a.status)
+            self._assertArchived(drops, server)
+        finally:
+            server.stop()
+
+    def test_failure(self):
+        server = FakeNgasServer(7786, failures=100)
+        try:
+            a, _ = self._archive(2, 1000, ngasSrv='localhost:7786', retries=1, retryDelay=0)
+            self.assertEqual(DROPStates.ERROR, a.status)
+            self.assertFalse(server.files)
+        finally:
+            server.stop()
@@ -32,7 +32,8 @@ import six
 
 from dfms import droputils
 from dfms.apps.bash_shell_app import BashShellApp, StreamingInputBashApp,\
-    StreamingOutputBashApp, StreamingInputOutputBashApp
+    StreamingOutputBashApp, StreamingInputOutputBashApp, BashWorkerPool,\
+    OutputCapture
 from dfms.ddap_protocol import DROPStates
 from dfms.drop import FileDROP, InMemoryDROP
 from dfms.droputils import DROPWaiterCtx
@@ -83,6 +84,97 @@ class BashAppTests(unittest.TestCase):
         msg = 'This is a message with a double quotes: "'
         assert_message_is_correct(msg, "echo -n '{0}' > %o0".format(msg))
 
+class BashWorkerPoolTests(unittest.TestCase):
+
+    def setUp(self):
+        self._pool = BashWorkerPool(2)
+
+    def tearDown(self):
+        self._pool.close()
+        shutil.rmtree("/tmp/sdp_dfms", True)
+
+    def test_results(self):
+        self.assertEqual((3, six.b('out\n'), six.b('err\n')), self._pool.run('echo out; echo err >&2; exit 3'))
+        self.assertEqual((0, six.b('abc'), six.b('')), self._pool.run('printf abc'))
+
+        # Commands don't see each other's state
+        self.assertEqual(0, self._pool.run('cd /; X=1; export Y=2')[0])
+        self.assertEqual((0, six.b(os.getcwd() + '\n\n\n'), six.b('')), self._pool.run('pwd; echo $X; echo $Y'))
+
+    def test_lostWorker(self):
+        self.assertRaises(Exception, self._pool.run, 'kill -9 $$')
+        self.assertEqual((0, six.b('a\n'), six.b('')), self._pool.run('echo a'))
+
+    def test_app(self):
+        a = FileDROP('a', 'a')
+        b = BashShellApp('b', 'b', command='cp %i0 %o0')
+        c = FileDROP('c', 'c')
+        b.bash_pool = self._pool
+        b.addInput(a)
+        b.addOutput(c)
+
+        data = os.urandom(10)
+        with DROPWaiterCtx(self, c, 100):
+            a.write(data)
+            a.setCompleted()
+        self.assertEqual(data, droputils.allDropContents(c))
+
+        # Failing commands make the app fail
+        d = BashShellApp('d', 'd', command='exit 1')
+        e = InMemoryDROP('e', 'e')
+        d.bash_pool = self._pool
+        d.addOutput(e)
+        with DROPWaiterCtx(self, e, 100):
+            d.async_execute()
+        self.assertEqual(DROPStates.ERROR, d.status)
+
+class OutputCaptureTests(unittest.TestCase):
+
+    def test_bounded(self):
+        capture = OutputCapture(maxsize=10)
+        for _ in range(100):
+            capture.feed('stdout', six.b('0123456789abc'))
+        capture.feed('stderr', six.b('err'))
+        self.assertEqual(six.b('3456789abc'), capture.stdout)
+        self.assertEqual(1290, capture.dropped('stdout'))
+        self.assertEqual(six.b('err'), capture.stderr)
+        self.assertEqual(0, capture.dropped('stderr'))
+
+    def test_lines(self):
+        lines = []
+        out = InMemoryDROP('a', 'a')
+        capture = OutputCapture(maxsize=5, stdout_drop=out, on_line=lambda s, l: lines.append((s, l)))
+        capture.feed('stdout', six.b('a\nb'))
+        capture.feed('stderr', six.b('c\n'))
+        capture.feed('stdout', six.b('b\n0123456789'))
+        capture.close()
+        out.setCompleted()
+        self.assertEqual([('stdout', six.b('a')), ('stderr', six.b('c')),
+                          ('stdout', six.b('bb')), ('stdout', six.b('0123456789'))], lines)
+        self.assertEqual(six.b('a\nbb\n0123456789'), droputils.allDropContents(out))
+
+    def test_app(self):
+        """
+        The output of chatty commands is trimmed, streamed and turned into
+        progress events
+        """
+        class listener(object):
+            def __init__(self):
+                self.lines = []
+            def handleEvent(self, e):
+                self.lines.append(e.line)
+
+        a = BashShellApp('a', 'a', command='for i in $(seq 10); do echo step $i; done; head -c 1000000 /dev/zero',
+                         max_output=100, stream_stdout=True, progress_regex='^step [0-9]+$')
+        b = InMemoryDROP('b', 'b')
+        a.addOutput(b)
+        l = listener()
+        a.subscribe(l, 'progress')
+        with DROPWaiterCtx(self, b, 100):
+            a.async_execute()
+        self.assertEqual(['step %d' % i for i in range(1, 11)], l.lines)
+        self.assertEqual(1000000 + sum(len('step %d\n' % i) for i in range(1, 11)), len(droputils.allDropContents(b)))
+
 class StreamingBashAppTests(unittest.TestCase):
 
     def test_single_pipe(self):
@@ -170,4 +262,39 @@ class StreamingBashAppTests(unittest.TestCase):
         self.assertEqual([1,2,3,4,5], [int(x) for x in droputils.allDropContents(f).strip().split(six.b('\n'))])
 
         # Clean up and go
-        os.remove(output_fname)
\ No newline at end of file
+        os.remove(output_fname)
+
+    def _test_tcp_channel(self, streams):
+        """
+        Apps on different nodes stream through TCP using `streams` connections
+        """
+        output_fname = tempfile.mktemp()
+        expected = six.b('').join(six.b('%d\n' % i) for i in range(1, 200001))
+
+        a = StreamingOutputBashApp('a', 'a', command="seq 1 200000", node='127.0.0.1',
+                                   channel_streams=streams, channel_bufsize=1024 ** 2)
+        b = InMemoryDROP('b', 'b', node='localhost')
+        c = StreamingInputBashApp('c', 'c', command="cat > %o0", channel_bufsize=1024 ** 2)
+        d = FileDROP('d', 'd', filepath=output_fname)
+        a.addOutput(b)
+        c.addStreamingInput(b)
+        c.addOutput(d)
+
+        with DROPWaiterCtx(self, d, 10):
+            a.async_execute()
+
+        for drop in (a,b,c,d):
+            self.assertEqual(DROPStates.COMPLETED, drop.status)
+        self.assertEqual(expected, droputils.allDropContents(d))
+        for app in (a, c):
+            self.assertEqual(streams, app.channel_stats.streams)
+        if streams > 1:
+            self.assertEqual(len(expected), a.channel_stats.bytes)
+            self.assertEqual(len(expected), c.channel_stats.bytes)
+        os.remove(output_fname)
+
+    def test_tcp_channel(self):
+        self._test_tcp_channel(1)
+
+    def test_parallel_tcp_channel(self):
+        self._test_tcp_channel(4)
@@ -0,0 +1,108 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+import os
+import random
+import shutil
+import tempfile
+import unittest
+import zlib
+
+from dfms import droputils
+from dfms.apps import crc
+from dfms.apps.crc import CRCApp, checksum, _crc_combiner, _adler32_combine
+from dfms.drop import InMemoryDROP, FileDROP
+from dfms.droputils import DROPWaiterCtx
+
+
+def _crc32c(data, crc=0):
+    # A slow but simple reference implementation
+    crc ^= 0xffffffff
+    for b in bytearray(data):
+        crc ^= b
+        for _ in range(8):
+            crc = (crc >> 1) ^ (0x82F63B78 & -(crc & 1))
+    return crc ^ 0xffffffff
+
+class TestChecksumCombine(unittest.TestCase):
+
+    def _test_combine(self, f, combine, size):
+        data = os.urandom(size)
+        for _ in range(10):
+            i = random.randint(0, size)
+            a, b = data[:i], data[i:]
+            self.assertEqual(f(data) & 0xffffffff, combine(f(a) & 0xffffffff, f(b) & 0xffffffff, len(b)))
+
+    def test_crc32(self):
+        self._test_combine(zlib.crc32, _crc_combiner(0xEDB88320), 100000)
+
+    def test_crc32c(self):
+        self._test_combine(_crc32c, _crc_combiner(0x82F63B78), 1000)
+
+    def test_adler32(self):
+        self._test_combine(zlib.adler32, _adler32_combine, 100000)
+
+class TestCRCApp(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def _run(self, inputDrop, **kwargs):
+        a = CRCApp('a', 'a', **kwargs)
+        b = InMemoryDROP('b', 'b')
+        a.addInput(inputDrop)
+        a.addOutput(b)
+        with DROPWaiterCtx(self, b, 5):
+            inputDrop.setCompleted()
+        return droputils.allDropContents(b).decode('ascii')
+
+    def _test_app(self, createInput):
+        data = os.urandom(1024 ** 2 + 1)
+        for algorithm in ('crc32', 'adler32', 'md5'):
+            expected = str(checksum([data], algorithm))
+            for threads in (1, 4):
+                d = createInput()
+                d.write(data)
+                self.assertEqual(expected, self._run(d, algorithm=algorithm, threads=threads, bufsize=100000))
+
+    def test_memory(self):
+        self._test_app(lambda: InMemoryDROP('i', 'i'))
+
+    def test_file(self):
+        self._test_app(lambda: FileDROP('i', 'i', dirname=self._dir))
+
+    def test_defaults(self):
+        data = os.urandom(1000)
+        d = InMemoryDROP('i', 'i')
+        d.write(data)
+        self.assertEqual(str(crc.crc32(data, 0) & 0xffffffff), self._run(d))
+
+    def test_empty(self):
+        for threads in (1, 4):
+            d = FileDROP('i', 'i', dirname=self._dir)
+            open(d.path, 'wb').close()
+            self.assertEqual('1', self._run(d, algorithm='adler32', threads=threads))
+
+    def test_invalid_algorithm(self):
+        self.assertRaises(ValueError, checksum, [b'a'], 'not_an_algorithm')
@@ -0,0 +1,184 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2017
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+import threading
+import time
+import unittest
+
+from dfms.apps import dockerapp
+from dfms.apps.dockerapp import DockerApp, DockerManager
+from dfms.ddap_protocol import DROPStates
+from dfms.drop import FileDROP
+from dfms.droputils import DROPWaiterCtx
+
+
+class FakeDockerClient(object):
+    """
+    Mimics the parts of the docker API used by DockerApps, recording the
+    calls made to it
+    """
+
+    def __init__(self, images=(), exitCode=0):
+        self.images_ = set(images)
+        self.exitCode = exitCode
+        self.calls = []
+        self.containers = {}
+        self._lock = threading.Lock()
+
+    def _call(self, name, *args):
+        with self._lock:
+            self.calls.append((name,) + args)
+
+    def count(self, name):
+        return len([c for c in self.calls if c[0] == name])
+
+    def images(self):
+        self._call('images')
+        return [{'RepoTags': [i]} for i in self.images_] + [{'RepoTags': None}]
+
+    def pull(self, image):
+        self._call('pull', image)
+        time.sleep(0.1)
+        self.images_.add(image)
+
+    def create_host_config(self, binds):
+        return {'Binds': binds}
+
+    def create_container(self, image, cmd, volumes, host_config, user, environment):
+        self._call('create_container', image, cmd)
+        cId = 'c%d' % len(self.containers)
+        self.containers[cId] = host_config['Binds']
+        return {'Id': cId}
+
+    def start(self, container):
+        self._call('start', container['Id'])
+
+    def inspect_container(self, container):
+        return {'NetworkSettings': {'IPAddress': '10.0.0.1'}}
+
+    def wait(self, container):
+        self._call('wait', container['Id'])
+        return self.exitCode
+
+    def logs(self, container, **kwargs):
+        return []
+
+    def remove_container(self, container, force=False):
+        self._call('remove_container', container)
+
+    def exec_create(self, cId, cmd):
+        self._call('exec_create', cId, cmd)
+        return cId
+
+    def exec_start(self, execId):
+        return b''
+
+    def exec_inspect(self, execId):
+        return {'ExitCode': self.exitCode}
+
+    def close(self):
+        self._call('close')
+
+class DockerManagerTests(unittest.TestCase):
+
+    def setUp(self):
+        self._default = dockerapp._default_manager
+
+    def tearDown(self):
+        dockerapp._default_manager = self._default
+
+    def _manager(self, warm_containers=0, **kwargs):
+        client = FakeDockerClient(**kwargs)
+        manager = DockerManager(warm_containers=warm_containers, client=client)
+        dockerapp._default_manager = DockerManager(client=client)
+        return manager, client
+
+    def test_image_cache(self):
+        """
+        Images are listed once, and each missing image is pulled only once,
+        even when many DockerApps are created at the same time
+        """
+        _, client = self._manager(images=['a:1'])
+
+        def create(i, image):
+            DockerApp('d%d' % i, 'd%d' % i, image=image, command='true')
+        threads = [threading.Thread(target=create, args=(i, img)) for i, img in enumerate(['a:1', 'b:1', 'b:1', 'b:1', 'c:1'] * 4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(1, client.count('images'))
+        self.assertEqual([('pull', 'b:1'), ('pull', 'c:1')], sorted(c for c in client.calls if c[0] == 'pull'))
+
+    def _run(self, manager, inputs, **kwargs):
+        a = DockerApp('a', 'a', image='a:1', command='cp %i0 %o0', **kwargs)
+        a.docker_manager = manager
+        out = FileDROP('out', 'out', dirname='/tmp/out')
+        for i in inputs:
+            a.addInput(i)
+        a.addOutput(out)
+        with DROPWaiterCtx(self, out, 5):
+            for i in inputs:
+                i.setCompleted()
+        return a
+
+    def test_new_containers(self):
+        m, client = self._manager(images=['a:1'])
+        for i in range(2):
+            a = self._run(m, [FileDROP('i', 'i', dirname='/tmp/in')])
+            self.assertEqual(DROPStates.COMPLETED, a.status)
+        self.assertEqual(2, client.count('create_container'))
+        self.assertEqual(2, client.count('remove_container'))
+        self.assertEqual(0, client.count('exec_create'))
+
+        # Inputs are bound with their full paths
+        self.assertIn('/tmp/in/i___i:/dfms_root/tmp/in/i___i', client.containers['c0'])
+
+    def test_warm_containers(self):
+        m, client = self._manager(warm_containers=1, images=['a:1'])
+        for i in range(3):
+            a = self._run(m, [FileDROP('i%d' % i, 'i%d' % i, dirname='/tmp/in')])
+            self.assertEqual(DROPStates.COMPLETED, a.status)
+            self.assertEqual('c0', a.containerId)
+            self.assertEqual('10.0.0.1', a.containerIp)
+
+        # One container, three commands
+        self.assertEqual(1, client.count('create_container'))
+        self.assertEqual(3, client.count('exec_create'))
+        self.assertEqual(0, client.count('wait'))
+        self.assertEqual(set(['/tmp/in:/dfms_root/tmp/in', '/tmp/out:/dfms_root/tmp/out']), set(client.containers['c0']))
+
+        # Different bindings need a different container
+        a = self._run(m, [FileDROP('i', 'i', dirname='/tmp/other')])
+        self.assertEqual('c1', a.containerId)
+
+        m.close()
+        self.assertEqual(2, client.count('remove_container'))
+        self.assertEqual(1, client.count('close'))
+
+    def test_failed_warm_container_not_reused(self):
+        m, client = self._manager(warm_containers=1, images=['a:1'], exitCode=1)
+        for i in range(2):
+            a = self._run(m, [FileDROP('i%d' % i, 'i%d' % i, dirname='/tmp/in')])
+            self.assertEqual(DROPStates.ERROR, a.status)
+        self.assertEqual(2, client.count('create_container'))
+        self.assertEqual(2, client.count('remove_container'))
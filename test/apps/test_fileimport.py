@@ -69,3 +69,48 @@ class FileImportAppTests(unittest.TestCase):
 
         a = FileImportApp('a', 'b', dirname = self.root, ext = ['.hdf5'])
         self.assertEqual(len(a.children), 0)
+
+    def test_nested_parallel(self):
+        expected = set()
+        for i in range(5):
+            for j in range(5):
+                d = '%s/nested/%d/%d' % (self.root, i, j)
+                os.makedirs(d)
+                f = '%s/f.fits' % (d,)
+                open(f, 'a').close()
+                expected.add(f)
+        expected.update(self.files[:2])
+
+        for threads in (1, 4):
+            a = FileImportApp('a', 'b', dirname = self.root, ext = ['.fits'], threads = threads)
+            self.assertEqual(expected, set(c.path for c in a.children))
+            self.assertEqual(len(expected), len(set(c.uid for c in a.children)))
+
+    def test_lazy(self):
+        a = FileImportApp('a', 'b', dirname = self.root, ext = ['.fits'], lazy = True)
+        open('%stest3.fits' % (self.dirs[0],), 'a').close()
+        self.assertEqual(3, len(a.children))
+
+    def test_rescan(self):
+        a = FileImportApp('a', 'b', dirname = self.root, ext = ['.fits'])
+        self.assertEqual([], a.scan())
+        f = '%stest3.fits' % (self.dirs[0],)
+        open(f, 'a').close()
+        self.assertEqual([f], [c.path for c in a.scan()])
+        self.assertEqual(3, len(a.children))
+
+    def test_index(self):
+        index = '%s/index.json' % (self.root,)
+        a = FileImportApp('a', 'b', dirname = self.root, ext = ['.fits'], index = index)
+        self.assertEqual(2, len(a.children))
+
+        # Nothing changed, nothing to import
+        a = FileImportApp('a', 'b', dirname = self.root, ext = ['.fits'], index = index)
+        self.assertEqual(0, len(a.children))
+
+        # A modified file and a new one
+        with open(self.files[0], 'w') as f:
+            f.write('data')
+        open('%stest3.fits' % (self.dirs[0],), 'a').close()
+        a = FileImportApp('a', 'b', dirname = self.root, ext = ['.fits'], index = index)
+        self.assertEqual(set([self.files[0], '%stest3.fits' % (self.dirs[0],)]), set(c.path for c in a.children))
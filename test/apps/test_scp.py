@@ -0,0 +1,100 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2017
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+import os
+import shutil
+import tempfile
+import unittest
+
+import paramiko
+
+from dfms import remote
+from dfms.apps.scp import ScpApp
+from dfms.ddap_protocol import DROPStates
+from dfms.drop import FileDROP, DirectoryContainer
+from dfms.droputils import DROPWaiterCtx
+from test.test_remote import LoopbackSSHServer
+
+
+class ProgressListener(object):
+    def __init__(self):
+        self.events = []
+    def handleEvent(self, e):
+        self.events.append((e.transferred, e.total))
+
+class ScpAppTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = LoopbackSSHServer()
+        cls.keydir = tempfile.mkdtemp()
+        cls.pkeyPath = os.path.join(cls.keydir, 'id_rsa')
+        paramiko.RSAKey.generate(1024).write_private_key_file(cls.pkeyPath)
+
+    @classmethod
+    def tearDownClass(cls):
+        remote.connection_pool.close()
+        cls.server.stop()
+        shutil.rmtree(cls.keydir)
+
+    def setUp(self):
+        self.src = tempfile.mkdtemp()
+        self.dst = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.src)
+        shutil.rmtree(self.dst)
+
+    def _copy(self, inp, out, appNode):
+        a = ScpApp('a', 'a', node=appNode, port=self.server.port, pkeyPath=self.pkeyPath,
+                   streams=2, chunkSize=100000, progressInterval=0)
+        listener = ProgressListener()
+        a.subscribe(listener, 'transferProgress')
+        a.addInput(inp)
+        a.addOutput(out)
+        with DROPWaiterCtx(self, out, 10):
+            inp.setCompleted()
+        self.assertEqual(DROPStates.COMPLETED, a.status)
+        return listener.events
+
+    def test_file(self):
+        # The app lives with its input, data is sent to the "remote" output
+        data = os.urandom(300000)
+        inp = FileDROP('i', 'i', dirname=self.src, node='localhost')
+        inp.write(data)
+        out = FileDROP('o', 'o', dirname=self.dst, node='127.0.0.1')
+        events = self._copy(inp, out, 'localhost')
+        with open(out.path, 'rb') as f:
+            self.assertEqual(data, f.read())
+        self.assertEqual((len(data), len(data)), events[-1])
+
+    def test_directory(self):
+        # The app lives with its output, data is fetched from the "remote" input
+        os.mkdir(os.path.join(self.src, 'sub'))
+        for name in ('f1', 'sub/f2'):
+            with open(os.path.join(self.src, name), 'wb') as f:
+                f.write(name.encode('ascii') * 1000)
+        inp = DirectoryContainer('i', 'i', dirname=self.src, node='127.0.0.1')
+        out = DirectoryContainer('o', 'o', dirname=self.dst, node='localhost')
+        self._copy(inp, out, 'localhost')
+        for name in ('f1', 'sub/f2'):
+            with open(os.path.join(self.dst, name), 'rb') as f:
+                self.assertEqual(name.encode('ascii') * 1000, f.read())
@@ -19,8 +19,11 @@
 #    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
 #    MA 02111-1307  USA
 #
+import threading
 import unittest
 
+import six
+
 from dfms import utils
 from dfms import droputils
 from dfms.apps.socket_listener import SocketListenerApp
@@ -76,6 +79,51 @@ class TestSocketListener(unittest.TestCase):
         self.assertEqual(data, bContents)
         self.assertEqual(crc32(data, 0), dContents)
 
+    def test_multiple_connections(self):
+
+        host = 'localhost'
+        data = [os.urandom(100000), os.urandom(100000)]
+
+        # Ordered: data of each connection comes one after the other
+        a = SocketListenerApp('a', 'a', host=host, port=9934, connections=2, bufsize=1000, buffers=2)
+        b = InMemoryDROP('b', 'b')
+        a.addOutput(b)
+        with DROPWaiterCtx(self, b, 5):
+            a.async_execute()
+            for d in data:
+                utils.write_to(host, 9934, d, 1)
+        self.assertEqual(data[0] + data[1], droputils.allDropContents(b))
+
+        # Unordered: everything is received, but interleaved
+        a = SocketListenerApp('a', 'a', host=host, port=9935, connections=2, merge='unordered')
+        b = InMemoryDROP('b', 'b')
+        a.addOutput(b)
+        with DROPWaiterCtx(self, b, 5):
+            a.async_execute()
+            threads = [threading.Thread(target=utils.write_to, args=(host, 9935, six.b(c) * 100000, 1)) for c in 'xy']
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        contents = droputils.allDropContents(b)
+        self.assertEqual(200000, len(contents))
+        self.assertEqual(100000, contents.count(six.b('x')))
+
+    def test_multiple_outputs(self):
+
+        host = 'localhost'
+        port = 9936
+        data = os.urandom(1000000)
+        a = SocketListenerApp('a', 'a', host=host, port=port, bufsize=4096, buffers=4, rcvbuf=1024 ** 2)
+        outputs = [InMemoryDROP(str(i), str(i)) for i in range(3)]
+        for o in outputs:
+            a.addOutput(o)
+        with DROPWaiterCtx(self, outputs, 5):
+            a.async_execute()
+            utils.write_to(host, port, data, 1)
+        for o in outputs:
+            self.assertEqual(data, droputils.allDropContents(o))
+
     def test_invalid(self):
 
         # Shouldn't allow inputs
@@ -31,7 +31,7 @@ except:
     USE_SPEAD = False
 
 from dfms import droputils
-from dfms.apps.spead_receiver import SpeadReceiverApp
+from dfms.apps.spead_receiver import SpeadReceiverApp, HeapBatcher
 from dfms.drop import InMemoryDROP
 from dfms.ddap_protocol import DROPStates
 from dfms.droputils import DROPWaiterCtx
@@ -68,3 +68,62 @@ class TestSpeadReceiverApp(unittest.TestCase):
 
         self.assertEqual(size, b.size)
         self.assertEqual(msg, droputils.allDropContents(b))
+
+    @unittest.skipIf(USE_SPEAD is False, "skipping test")
+    def test_speadApp_batching(self):
+
+        port = 1112
+        itemId = 0x2000
+
+        thread_pool = spead2.ThreadPool()
+        self._stream = spead2.send.UdpStream(thread_pool, "localhost", port, spead2.send.StreamConfig(rate=1e7))
+
+        # Heaps don't fill a batch, so data is written in bits by the flusher
+        a = SpeadReceiverApp('a','a',port=port, itemId=itemId, batchSize=4096, flushInterval=0.01)
+        b = InMemoryDROP('b','b')
+        a.addOutput(b)
+
+        size = 1000
+        threading.Thread(target=lambda: a.execute()).start()
+        time.sleep(1)
+        msgs = [os.urandom(size) for _ in range(10)]
+        with DROPWaiterCtx(self, b, timeout=2):
+            ig = spead2.send.ItemGroup(flavour=spead2.Flavour(4, 64, 48))
+            item = ig.add_item(itemId, 'main_data', 'a char array', shape=(size,), format=[('c',8)])
+            for msg in msgs:
+                item.value = msg
+                self._stream.send_heap(ig.get_heap())
+                time.sleep(0.01)
+            self._stream.send_heap(ig.get_end())
+
+        self.assertEqual(b''.join(msgs), droputils.allDropContents(b))
+        self.assertEqual(0, a.stats['heapsLost'])
+
+class TestHeapBatcher(unittest.TestCase):
+
+    def test_batching(self):
+
+        outputs = [InMemoryDROP(str(i), str(i)) for i in range(2)]
+        batcher = HeapBatcher(outputs, 100, buffers=2, flushInterval=10)
+
+        # Smaller, equal and bigger than a batch, and not only bytes
+        payloads = [os.urandom(n) for n in (10, 90, 100, 35, 250, 1)]
+        payloads.append(bytearray(os.urandom(42)))
+        for p in payloads:
+            batcher.add(p)
+        batcher.close()
+
+        for o in outputs:
+            o.setCompleted()
+            self.assertEqual(b''.join(bytes(p) for p in payloads), droputils.allDropContents(o))
+
+    def test_flushInterval(self):
+
+        output = InMemoryDROP('a', 'a')
+        batcher = HeapBatcher([output], 1024 ** 2, flushInterval=0.01)
+        batcher.add(b'abc')
+        time.sleep(0.5)
+        try:
+            self.assertEqual(3, output.size)
+        finally:
+            batcher.close()
@@ -0,0 +1,84 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2015
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+"""
+A benchmark for the RDBMSRegistry. It records a number of accesses and phase
+changes for a set of DROPs on a SQLite database, both writing each record
+immediately and batching them, and reports the number of operations per second
+of each run.
+"""
+
+from optparse import OptionParser
+import os
+import sys
+import tempfile
+import time
+
+from dfms.ddap_protocol import DROPPhases
+from dfms.drop import InMemoryDROP
+from dfms.lifecycle.registry import RDBMSRegistry
+
+
+def run(maxPending, drops, ops):
+    """
+    Runs `ops` registry operations over `drops` DROPs flushing every
+    `maxPending` operations, and returns the number of operations per second
+    """
+    fd, dbfile = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    registry = RDBMSRegistry('sqlite3', dbfile, flushPeriod=0, maxPending=maxPending)
+    try:
+        registry.createSchema()
+        ds = [InMemoryDROP('oid:%d' % i, 'uid:%d' % i) for i in range(drops)]
+        for d in ds:
+            registry.addDrop(d)
+
+        start = time.time()
+        for i in range(ops):
+            d = ds[i % drops]
+            if i % 10:
+                registry.recordNewAccess(d.oid)
+            else:
+                registry.setDropPhase(d, DROPPhases.SOLID)
+        registry.flush()
+        return ops / (time.time() - start)
+    finally:
+        registry.close()
+        os.unlink(dbfile)
+
+if __name__ == '__main__':
+
+    parser = OptionParser()
+    parser.add_option("-d", "--drops", action="store", type="int",
+                      dest="drops", help="Number of DROPs in the registry", default=100)
+    parser.add_option("-o", "--ops", action="store", type="int",
+                      dest="ops", help="Number of operations to perform", default=10000)
+    parser.add_option("-b", "--batch-sizes", action="store", type="string",
+                      dest="batch_sizes", help="Comma-separated batch sizes to try", default="1,10,100,1000")
+    parser.add_option("--csv", action="store_true", dest="csv", help="Output results in CSV format", default=False)
+    (options, args) = parser.parse_args(sys.argv)
+
+    for batch in [int(b) for b in options.batch_sizes.split(',')]:
+        rate = run(batch, options.drops, options.ops)
+        if options.csv:
+            print("%d,%.1f" % (batch, rate))
+        else:
+            print("batch size %5d: %10.1f [ops/s]" % (batch, rate))
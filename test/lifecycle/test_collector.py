@@ -0,0 +1,94 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2015
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+import os
+import shutil
+import tempfile
+import unittest
+
+from dfms.drop import FileDROP, InMemoryDROP, ContainerDROP
+from dfms.lifecycle.collector import DropCollector
+
+
+class TestDropCollector(unittest.TestCase):
+
+    def setUp(self):
+        self._collector = DropCollector(workers=2, batch_size=2)
+        self._dirs = []
+
+    def tearDown(self):
+        self._collector.close()
+        for d in self._dirs:
+            shutil.rmtree(d, True)
+
+    def _files(self, n, dirname, **kwargs):
+        drops = [FileDROP('oid:%d' % i, 'uid:%d' % i, dirname=dirname, precious=False, **kwargs) for i in range(n)]
+        for drop in drops:
+            drop.write(b'abcd')
+            drop.setCompleted()
+        return drops
+
+    def _mkdtemp(self):
+        d = tempfile.mkdtemp()
+        self._dirs.append(d)
+        return d
+
+    def test_files(self):
+
+        # Files are deleted, but not other contents of their directory
+        dirname = self._mkdtemp()
+        other = os.path.join(dirname, 'other')
+        open(other, 'w').close()
+        drops = self._files(5, dirname, delete_parent_directory=True)
+        self.assertEqual(drops, self._collector.collect(drops))
+        for drop in drops:
+            self.assertFalse(drop.exists())
+        self.assertTrue(os.path.isfile(other))
+
+        stats = self._collector.stats()
+        self.assertEqual(5, stats['drops'])
+        self.assertEqual(20, stats['bytes'])
+        self.assertGreater(stats['bytes_per_second'], 0)
+
+    def test_whole_directory(self):
+        dirname = self._mkdtemp()
+        drops = self._files(5, dirname, delete_parent_directory=True)
+        self.assertEqual(drops, self._collector.collect(drops))
+        self.assertFalse(os.path.exists(dirname))
+        self.assertEqual(20, self._collector.stats()['bytes'])
+
+    def test_containers_and_others(self):
+        dirname = self._mkdtemp()
+        files = self._files(3, dirname)
+        container = ContainerDROP('c', 'c')
+        for drop in files:
+            container.addChild(drop)
+        memory = InMemoryDROP('m', 'm')
+        memory.write(b'a')
+        memory.setCompleted()
+
+        # Missing files are not considered an error
+        os.unlink(files[0].path)
+        self.assertEqual([container, memory], self._collector.collect([container, memory]))
+        for drop in files:
+            self.assertFalse(drop.exists())
+        self.assertFalse(memory.exists())
+        self.assertEqual(2, self._collector.stats()['drops'])
@@ -31,10 +31,14 @@ import tempfile
 import time
 import unittest
 
+import six
+
+from dfms import droputils
 from dfms.ddap_protocol import DROPStates, DROPPhases
-from dfms.drop import FileDROP, DirectoryContainer, BarrierAppDROP
+from dfms.drop import FileDROP, DirectoryContainer, BarrierAppDROP, InMemoryDROP
 from dfms.droputils import DROPWaiterCtx
 from dfms.lifecycle import dlm
+from dfms.lifecycle.hsm.store import MemoryStore, DirectoryStore
 
 
 class TestDataLifecycleManager(unittest.TestCase):
@@ -166,5 +170,154 @@ class TestDataLifecycleManager(unittest.TestCase):
             self.assertTrue(b.exists())
             b.delete()
 
+    def test_expirationOrder(self):
+        """
+        Only DROPs whose expiration date has passed are expired, without
+        looking at the rest
+        """
+        manager = dlm.DataLifecycleManager()
+        drops = [FileDROP('oid:%d' % i, 'uid:%d' % i, expectedSize=1, lifespan=lifespan, precious=False)
+                 for i, lifespan in enumerate((0, 0, 100))]
+        for drop in drops:
+            manager.addDrop(drop)
+            self._writeAndClose(drop)
+        manager.expireCompletedDrops()
+        self.assertEqual([DROPStates.EXPIRED] * 2 + [DROPStates.COMPLETED], [d.status for d in drops])
+        self.assertEqual(1, len(manager._expirations))
+
+        manager.deleteExpiredDrops()
+        self.assertEqual([DROPStates.DELETED] * 2 + [DROPStates.COMPLETED], [d.status for d in drops])
+        drops[2].delete()
+
+    def test_existenceChecksAreLimited(self):
+        manager = dlm.DataLifecycleManager(maxExistenceChecks=2)
+        drops = [FileDROP('oid:%d' % i, 'uid:%d' % i, expectedSize=1, precious=False) for i in range(3)]
+        for drop in drops:
+            manager.addDrop(drop)
+            self._writeAndClose(drop)
+            os.unlink(drop._fnm)
+
+        manager.deleteLostDrops()
+        self.assertEqual([DROPPhases.LOST] * 2 + [DROPPhases.GAS], [d.phase for d in drops])
+        manager.deleteLostDrops()
+        self.assertEqual([DROPPhases.LOST] * 3, [d.phase for d in drops])
+
+    def test_movingDrops(self):
+        """
+        Cold in-memory DROPs are moved down to the next layer of the HSM, while
+        still being accessible through the original DROP
+        """
+        dirname = tempfile.mkdtemp()
+        stores = [MemoryStore(), DirectoryStore(dirname, initialize=True)]
+        manager = dlm.DataLifecycleManager(stores=stores, coldAfter=0)
+        try:
+            drop = InMemoryDROP('oid:A', 'uid:A1', precious=False)
+            manager.addDrop(drop)
+            drop.write(b'abcde')
+            drop.setCompleted()
+
+            manager.moveDropsAround()
+            self.assertIsInstance(drop.storage, FileDROP)
+            self.assertTrue(drop.storage.path.startswith(dirname))
+            self.assertTrue(drop.exists())
+            self.assertEqual(b'abcde', droputils.allDropContents(drop))
+
+            # Nowhere else to go, and deleting it deletes the file
+            manager.moveDropsAround()
+            self.assertEqual(0, len(manager._lru))
+            path = drop.storage.path
+            drop.status = DROPStates.EXPIRED
+            manager.deleteExpiredDrops()
+            self.assertEqual(DROPStates.DELETED, drop.status)
+            self.assertFalse(os.path.exists(path))
+        finally:
+            shutil.rmtree(dirname)
+
+    def test_recentlyUsedDropsStay(self):
+        manager = dlm.DataLifecycleManager(coldAfter=100)
+        drop = InMemoryDROP('oid:A', 'uid:A1', precious=False)
+        manager.addDrop(drop)
+        drop.write(b'abcde')
+        drop.setCompleted()
+        manager.moveDropsAround()
+        self.assertIs(drop, drop.storage)
+
+    def test_memorySpilling(self):
+        """
+        A workload larger than the memory limit is spilled to disk, least
+        recently used DROPs first, and its data is still readable
+        """
+        dirname = tempfile.mkdtemp()
+        stores = [MemoryStore(), DirectoryStore(dirname, initialize=True)]
+        manager = dlm.DataLifecycleManager(stores=stores, memoryHighWatermark=10240, memoryLowWatermark=8192)
+        try:
+            drops = []
+            for i in range(20):
+                drop = InMemoryDROP('oid:%d' % i, 'uid:%d' % i, precious=False)
+                manager.addDrop(drop)
+                drop.write(six.b(str(i % 10)) * 1024)
+                drop.setCompleted()
+                drops.append(drop)
+                self.assertLessEqual(manager.memoryHeld, 10240)
+
+            spilled = [d for d in drops if isinstance(d.storage, FileDROP)]
+            self.assertGreaterEqual(len(spilled), 10)
+            self.assertIn(drops[0], spilled)
+            self.assertNotIn(drops[-1], spilled)
+            self.assertEqual(1024 * (20 - len(spilled)), manager.memoryHeld)
+            for i, drop in enumerate(drops):
+                self.assertEqual(six.b(str(i % 10)) * 1024, droputils.allDropContents(drop))
+        finally:
+            shutil.rmtree(dirname)
+
+    def test_replicaPlacement(self):
+        """
+        Replicas of precious DROPs that must become SOLID are placed on
+        different, non-volatile stores
+        """
+        dirs = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+        stores = [MemoryStore()] + [DirectoryStore(d, initialize=True) for d in dirs]
+        manager = dlm.DataLifecycleManager(stores=stores, replicas=2)
+        try:
+            drop = InMemoryDROP('oid:A', 'uid:A1', targetPhase=DROPPhases.SOLID)
+            manager.addDrop(drop)
+            drop.write(b'abcde')
+            drop.setCompleted()
+
+            self.assertEqual(DROPPhases.SOLID, drop.phase)
+            uids = manager.getDropUids(drop)
+            self.assertEqual(3, len(uids))
+            replicas = [manager._drops[uid] for uid in uids if uid != drop.uid]
+            self.assertEqual(set(dirs), set(os.path.dirname(r.path) for r in replicas))
+            for r in replicas:
+                self.assertEqual(b'abcde', droputils.allDropContents(r))
+            self.assertEqual(2, manager.getReplicationStats()['replicas'])
+        finally:
+            for d in dirs:
+                shutil.rmtree(d)
+
+    def test_lostDropIsReplicatedAgain(self):
+        dirs = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+        stores = [MemoryStore()] + [DirectoryStore(d, initialize=True) for d in dirs]
+        manager = dlm.DataLifecycleManager(stores=stores)
+        try:
+            drop = FileDROP('oid:A', 'uid:A1', dirname=dirs[0], expectedSize=1)
+            manager.addDrop(drop)
+            self._writeAndClose(drop)
+            replica = [manager._drops[uid] for uid in manager.getDropUids(drop) if uid != drop.uid][0]
+            self.assertEqual(dirs[1], os.path.dirname(replica.path))
+
+            # The replica is copied again, now to the place of the lost original
+            os.unlink(drop._fnm)
+            manager.deleteLostDrops()
+            self.assertNotEqual(DROPPhases.LOST, drop.phase)
+            newReplicas = [manager._drops[uid] for uid in manager.getDropUids(drop) if uid not in (drop.uid, replica.uid)]
+            self.assertEqual(1, len(newReplicas))
+            self.assertEqual(dirs[0], os.path.dirname(newReplicas[0].path))
+            self.assertEqual(b' ', droputils.allDropContents(newReplicas[0]))
+        finally:
+            for d in dirs:
+                shutil.rmtree(d)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -21,8 +21,10 @@
 #
 import os
 import sqlite3
+import time
 import unittest
 
+from dfms.ddap_protocol import DROPPhases
 from dfms.drop import InMemoryDROP
 from dfms.lifecycle.registry import RDBMSRegistry
 
@@ -98,4 +100,71 @@ class TestRDBMSRegistry(unittest.TestCase):
         self.assertEqual(-1, registry.getLastAccess('a'))
         registry.recordNewAccess('a')
 
-        self.assertNotEqual(-1, registry.getLastAccess('a'))
\ No newline at end of file
+        self.assertNotEqual(-1, registry.getLastAccess('a'))
+
+    def _count(self, table):
+        conn = sqlite3.connect(DBFILE)  # @UndefinedVariable
+        cur = conn.cursor()
+        cur.execute('SELECT count(*) FROM %s' % (table,))
+        n = cur.fetchone()[0]
+        cur.close()
+        conn.close()
+        return n
+
+    def test_batchedWrites(self):
+
+        drops = [InMemoryDROP(str(i), str(i)) for i in range(10)]
+        registry = RDBMSRegistry('sqlite3', DBFILE, flushPeriod=0, maxPending=10)
+        for d in drops:
+            registry.addDrop(d)
+
+        # Nothing hits the database until there are enough pending records
+        for d in drops[:-1]:
+            registry.recordNewAccess(d.oid)
+        self.assertEqual(0, self._count('dfms_dropaccesstime'))
+        self.assertNotEqual(-1, registry.getLastAccess('0'))
+        registry.recordNewAccess('9')
+        self.assertEqual(10, self._count('dfms_dropaccesstime'))
+
+        # Only the last phase change is written
+        a = drops[0]
+        registry.setDropPhase(a, DROPPhases.PLASMA)
+        registry.setDropPhase(a, DROPPhases.SOLID)
+        registry.close()
+        conn = sqlite3.connect(DBFILE)  # @UndefinedVariable
+        cur = conn.cursor()
+        cur.execute("SELECT phase FROM dfms_drop WHERE oid = '0'")
+        self.assertEqual(DROPPhases.SOLID, cur.fetchone()[0])
+        cur.close()
+        conn.close()
+
+    def test_periodicFlush(self):
+
+        a = InMemoryDROP('a', 'a1')
+        registry = RDBMSRegistry('sqlite3', DBFILE, flushPeriod=0.1)
+        try:
+            registry.addDrop(a)
+            registry.recordNewAccess('a')
+            for _ in range(50):
+                if self._count('dfms_dropaccesstime'):
+                    break
+                time.sleep(0.1)
+            self.assertEqual(1, self._count('dfms_dropaccesstime'))
+        finally:
+            registry.close()
+
+    def test_createSchema(self):
+
+        os.unlink(DBFILE)
+        registry = RDBMSRegistry('sqlite3', DBFILE, flushPeriod=0)
+        registry.createSchema()
+        registry.createSchema()
+        registry.addDrop(InMemoryDROP('a', 'a1'))
+        registry.close()
+
+        conn = sqlite3.connect(DBFILE)  # @UndefinedVariable
+        cur = conn.cursor()
+        cur.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'dfms_dropinstance'")
+        self.assertIn('dfms_dropinstance_oid', [r[0] for r in cur.fetchall()])
+        cur.close()
+        conn.close()
@@ -0,0 +1,90 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2015
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+import time
+import unittest
+
+from dfms import droputils
+from dfms.ddap_protocol import DROPStates
+from dfms.drop import InMemoryDROP
+from dfms.lifecycle.replicator import DropReplicator, Throttle
+
+
+class TestDropReplicator(unittest.TestCase):
+
+    def _drop(self, uid, data):
+        drop = InMemoryDROP('oid:' + uid, uid, precious=False)
+        drop.write(data)
+        drop.setCompleted()
+        return drop
+
+    def test_copyToMany(self):
+        replicator = DropReplicator(workers=2, bufsize=3)
+        try:
+            source = self._drop('A', b'abcdefgh')
+            targets = [InMemoryDROP('oid:A', 'A%d' % i) for i in range(3)]
+            replicator.copy(source, targets)
+            for t in targets:
+                self.assertEqual(DROPStates.COMPLETED, t.status)
+                self.assertEqual(b'abcdefgh', droputils.allDropContents(t))
+            self.assertEqual(3, replicator.stats()['replicas'])
+            self.assertEqual(24, replicator.stats()['bytes'])
+        finally:
+            replicator.close()
+
+    def test_parallelReplication(self):
+        replicator = DropReplicator(workers=4)
+        try:
+            sources = [self._drop('uid:%d' % i, b'data') for i in range(10)]
+            jobs = [(s, [InMemoryDROP(s.oid, s.uid + '-r')]) for s in sources]
+
+            # A job whose source is not readable fails alone
+            broken = InMemoryDROP('oid:X', 'uid:X')
+            jobs.append((broken, [InMemoryDROP('oid:X', 'uid:X-r')]))
+            broken.delete()
+
+            results = replicator.replicate(jobs)
+            self.assertEqual([None] * 10, results[:-1])
+            self.assertIsInstance(results[-1], Exception)
+            for _, targets in jobs[:-1]:
+                self.assertEqual(b'data', droputils.allDropContents(targets[0]))
+        finally:
+            replicator.close()
+
+    def test_bandwidthIsLimited(self):
+        replicator = DropReplicator(bandwidth=10240, bufsize=1024)
+        try:
+            source = self._drop('A', b'x' * 5120)
+            start = time.time()
+            replicator.copy(source, [InMemoryDROP('oid:A', 'A1')])
+            self.assertGreaterEqual(time.time() - start, 0.4)
+        finally:
+            replicator.close()
+
+    def test_unlimitedThrottle(self):
+        throttle = Throttle()
+        start = time.time()
+        for _ in range(1000):
+            throttle.consume(1024 ** 3)
+        self.assertLess(time.time() - start, 1)
+
+if __name__ == '__main__':
+    unittest.main()
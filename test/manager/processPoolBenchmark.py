@@ -0,0 +1,112 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2015
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+"""
+A benchmark for the process-pool execution mode of the NodeManager. It runs a
+graph of independent, CPU-bound CRC applications reading from file DROPs with
+an increasing number of worker processes, and reports the speedup of each run
+with respect to running the applications in threads of the NodeManager process.
+"""
+
+from optparse import OptionParser
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from dfms import droputils
+from dfms.drop import dropdict
+from dfms.manager.node_manager import NodeManager
+
+
+def graph(apps, dirname):
+    g = []
+    for i in range(apps):
+        g.append(dropdict({'oid': 'A%d' % i, 'type': 'plain', 'storage': 'file', 'dirname': dirname}))
+        g.append(dropdict({'oid': 'B%d' % i, 'type': 'app', 'app': 'dfms.apps.crc.CRCApp', 'inputs': ['A%d' % i], 'outputs': ['C%d' % i]}))
+        g.append(dropdict({'oid': 'C%d' % i, 'type': 'plain', 'storage': 'memory'}))
+    return g
+
+def run(processes, apps, size, dirname):
+    """
+    Runs the graph with a NodeManager using `processes` worker processes and
+    returns the time taken by the applications to finish
+    """
+    dm = NodeManager(useDLM=False, max_processes=processes)
+    try:
+        sessionId = 'benchmark-%d' % (processes,)
+        dm.createSession(sessionId)
+        dm.addGraphSpec(sessionId, graph(apps, dirname))
+        dm.deploySession(sessionId)
+        drops = dm._sessions[sessionId].drops
+
+        data = os.urandom(1024 ** 2)
+        inputs = [drops['A%d' % i] for i in range(apps)]
+        for a in inputs:
+            for _ in range(size):
+                a.write(data)
+
+        evts = []
+        for i in range(apps):
+            evt = threading.Event()
+            drops['C%d' % i].subscribe(droputils.EvtConsumer(evt), 'status')
+            evts.append(evt)
+
+        start = time.time()
+        for a in inputs:
+            a.setCompleted()
+        for evt in evts:
+            evt.wait()
+        elapsed = time.time() - start
+
+        for a in inputs:
+            a.delete()
+        dm.destroySession(sessionId)
+        return elapsed
+    finally:
+        dm.shutdown()
+
+if __name__ == '__main__':
+
+    parser = OptionParser()
+    parser.add_option("-p", "--processes", action="store", type="int",
+                      dest="processes", help="Maximum number of worker processes to try", default=multiprocessing.cpu_count())
+    parser.add_option("-a", "--apps", action="store", type="int",
+                      dest="apps", help="Number of CRC applications in the graph", default=16)
+    parser.add_option("-s", "--size", action="store", type="int",
+                      dest="size", help="Size in MB of each application's input", default=64)
+    parser.add_option("--csv", action="store_true", dest="csv", help="Output results in CSV format", default=False)
+    (options, args) = parser.parse_args(sys.argv)
+
+    dirname = tempfile.mkdtemp()
+    try:
+        baseline = run(0, options.apps, options.size, dirname)
+        counts = [0] + list(range(1, options.processes + 1))
+        for processes in counts:
+            elapsed = baseline if processes == 0 else run(processes, options.apps, options.size, dirname)
+            if options.csv:
+                print("%d,%.3f,%.2f" % (processes, elapsed, baseline / elapsed))
+            else:
+                print("%3d processes: %8.3f [s] (speedup %.2fx)" % (processes, elapsed, baseline / elapsed))
+    finally:
+        os.rmdir(dirname)
@@ -0,0 +1,153 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2015
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+"""
+A small load-test harness for the REST interface of the DROP managers. It
+measures the number of requests per second served on the most commonly used
+endpoints, either by a NodeManager started in-process on the requested server
+backend, or by an already running manager.
+"""
+
+from optparse import OptionParser
+import sys
+import threading
+import time
+
+import six.moves.http_client as httplib  # @UnresolvedImport
+
+from dfms import utils
+from dfms.manager.client import NodeManagerClient
+from dfms.manager.node_manager import NodeManager
+from dfms.manager.rest import NMRestServer
+from dfms.restutils import server_backends
+
+
+def client(host, port, url, duration, results):
+    """
+    Repeatedly GETs `url` during `duration` seconds, reusing the connection
+    whenever the server allows it, and appends the number of successful and
+    failed requests to `results`
+    """
+    ok = failed = 0
+    conn = None
+    end = time.time() + duration
+    while time.time() < end:
+        try:
+            if conn is None:
+                conn = httplib.HTTPConnection(host, port, timeout=10)
+            conn.request('GET', url)
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status == httplib.OK:
+                ok += 1
+            else:
+                failed += 1
+            if resp.will_close:
+                conn.close()
+                conn = None
+        except Exception:
+            failed += 1
+            if conn:
+                conn.close()
+            conn = None
+    if conn:
+        conn.close()
+    results.append((ok, failed))
+
+def measure(host, port, url, clients, duration):
+    """
+    Runs `clients` concurrent clients against `url` for `duration` seconds and
+    returns the number of requests per second served, and the number of
+    failed requests
+    """
+    results = []
+    threads = [threading.Thread(target=client, args=(host, port, url, duration, results)) for _ in range(clients)]
+    start = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.time() - start
+    ok = sum(r[0] for r in results)
+    failed = sum(r[1] for r in results)
+    return ok / elapsed, failed
+
+def create_session(host, port, sessionId, drops):
+    graph = [{'oid': str(i), 'type': 'plain', 'storage': 'memory'} for i in range(drops)]
+    with NodeManagerClient(host, port) as c:
+        c.create_session(sessionId)
+        c.append_graph(sessionId, graph)
+        c.deploy_session(sessionId)
+        return c.graph_status_changes(sessionId, 0)['seq']
+
+if __name__ == '__main__':
+
+    parser = OptionParser()
+    parser.add_option("-H", "--host", action="store", type="string",
+                      dest="host", help="Host of a running manager. If not given a NodeManager is started in-process", default=None)
+    parser.add_option("-P", "--port", action="store", type="int",
+                      dest="port", help="Port of the manager", default=8765)
+    parser.add_option("-b", "--backend", action="store", type="choice", choices=sorted(server_backends),
+                      dest="backend", help="Server backend of the in-process NodeManager", default='pooled')
+    parser.add_option("-w", "--workers", action="store", type="int",
+                      dest="workers", help="Worker threads of the in-process NodeManager's pooled backend", default=32)
+    parser.add_option("-c", "--clients", action="store", type="int",
+                      dest="clients", help="Number of concurrent clients", default=16)
+    parser.add_option("-d", "--duration", action="store", type="float",
+                      dest="duration", help="Seconds spent on each endpoint", default=5)
+    parser.add_option("-n", "--drops", action="store", type="int",
+                      dest="drops", help="Number of drops in the session graph", default=1000)
+    parser.add_option("--csv", action="store_true", dest="csv", help="Output results in CSV format", default=False)
+    (options, args) = parser.parse_args(sys.argv)
+
+    host, port = options.host, options.port
+    dm = server = None
+    if host is None:
+        host = 'localhost'
+        dm = NodeManager(False)
+        server = NMRestServer(dm, backend=options.backend, workers=options.workers)
+        t = threading.Thread(target=server.start, args=(host, port))
+        t.daemon = True
+        t.start()
+        if not utils.portIsOpen(host, port, 10):
+            parser.error("NodeManager didn't come up in time")
+
+    sessionId = 'loadtest-%f' % (time.time(),)
+    seq = create_session(host, port, sessionId, options.drops)
+
+    urls = ['/api',
+            '/api/sessions',
+            '/api/sessions/%s/status' % (sessionId,),
+            '/api/sessions/%s/graph/status' % (sessionId,),
+            '/api/sessions/%s/graph/status?since=%d' % (sessionId, seq)]
+    try:
+        for url in urls:
+            rps, failed = measure(host, port, url, options.clients, options.duration)
+            if options.csv:
+                print("%s,%d,%.2f,%d" % (url, options.clients, rps, failed))
+            else:
+                print("%-60s %10.2f req/s %6d failed" % (url, rps, failed))
+    finally:
+        with NodeManagerClient(host, port) as c:
+            c.destroy_session(sessionId)
+        if server:
+            server.stop()
+            dm.shutdown()
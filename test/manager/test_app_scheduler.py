@@ -0,0 +1,106 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2015
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+import threading
+import unittest
+
+from dfms.manager.app_scheduler import AppScheduler, critical_path_priorities
+
+
+class FakeApp(object):
+
+    def __init__(self, uid, num_cpus=1, memory=0, running=None, executed=None):
+        self.uid = uid
+        self.num_cpus = num_cpus
+        self.memory = memory
+        self.running = running
+        self.executed = executed
+        self.release = threading.Event()
+
+    def execute(self):
+        self.running.append(self)
+        self.executed.append(self.uid)
+        self.release.wait(5)
+        self.running.remove(self)
+
+class TestAppScheduler(unittest.TestCase):
+
+    def test_critical_path_priorities(self):
+
+        # A --> B --> C --> D --> E
+        #  \--> F --> G
+        graph = {'A': {'oid': 'A', 'type': 'plain', 'consumers': ['B', 'F']},
+                 'B': {'oid': 'B', 'type': 'app', 'tw': 5, 'outputs': ['C']},
+                 'C': {'oid': 'C', 'type': 'plain'},
+                 'D': {'oid': 'D', 'type': 'app', 'inputs': ['C'], 'outputs': ['E']},
+                 'E': {'oid': 'E', 'type': 'plain', 'consumers': ['X']},
+                 'F': {'oid': 'F', 'type': 'app', 'tw': 2},
+                 'G': {'oid': 'G', 'type': 'plain', 'producers': ['F']}}
+        priorities = critical_path_priorities(graph)
+        self.assertEqual({'A': 6, 'B': 6, 'C': 1, 'D': 1, 'E': 0, 'F': 2, 'G': 0}, priorities)
+
+    def _wait_for(self, condition):
+        for _ in range(500):
+            if condition():
+                return
+            threading.Event().wait(0.01)
+        self.fail("Condition not met in time")
+
+    def _wait_running(self, running, n):
+        self._wait_for(lambda: len(running) == n)
+
+    def test_budget_and_priorities(self):
+
+        running, executed = [], []
+        sched = AppScheduler(4, cpus=2, memory=100)
+        try:
+            blocker = FakeApp('blocker', num_cpus=2, running=running, executed=executed)
+            sched.submit(blocker)
+            self._wait_running(running, 1)
+
+            # Everything else has to wait for the blocker, and then runs in
+            # priority order, never exceeding the CPU/memory budget
+            apps = [FakeApp('low', running=running, executed=executed),
+                    FakeApp('high', running=running, executed=executed),
+                    FakeApp('big', memory=100, running=running, executed=executed),
+                    FakeApp('huge', num_cpus=10, running=running, executed=executed)]
+            for app, prio in zip(apps, (1, 10, 5, 0)):
+                sched.set_priority(app, prio)
+                sched.submit(app)
+            self.assertEqual(4, sched.queued)
+
+            blocker.release.set()
+            self._wait_running(running, 2)
+            self.assertEqual(['blocker', 'high', 'big'], executed)
+
+            apps[1].release.set()
+            apps[2].release.set()
+            self._wait_for(lambda: len(executed) == 4)
+            self.assertEqual(['blocker', 'high', 'big', 'low'], executed)
+
+            # 'huge' gets capped to the whole node
+            apps[0].release.set()
+            self._wait_for(lambda: executed[-1] == 'huge')
+            self.assertEqual(1, len(running))
+            apps[3].release.set()
+            self._wait_running(running, 0)
+        finally:
+            sched.shutdown()
@@ -218,6 +218,54 @@ class TestDIM(unittest.TestCase):
             a.setCompleted()
         assertGraphStatus(sessionId, DROPStates.COMPLETED)
 
+    def test_getGraphStatusChanges(self):
+
+        sessionId = 'lala'
+        self.createSessionAndAddTypicalGraph(sessionId)
+        self.dim.deploySession(sessionId)
+
+        # The first time we get all the drops
+        changes = self.dim.getGraphStatusChanges(sessionId, 0)
+        self.assertDictEqual(self.dm.getGraphStatus(sessionId), changes['status'])
+        seq = changes['seq']
+        self.assertEqual({}, self.dim.getGraphStatusChanges(sessionId, seq)['status'])
+
+        a, c = [self.dm._sessions[sessionId].drops[x] for x in ('A', 'C')]
+        data = os.urandom(10)
+        with droputils.DROPWaiterCtx(self, c, 3):
+            a.write(data)
+            a.setCompleted()
+
+        # Now all drops changed, and the changes accumulate correctly
+        changes = self.dim.getGraphStatusChanges(sessionId, seq)
+        self.assertEqual(3, len(changes['status']))
+        self.assertGreater(changes['seq'], seq)
+        for dropStatus in changes['status'].values():
+            self.assertEqual(DROPStates.COMPLETED, dropStatus['status'])
+        self.assertDictEqual(self.dm.getGraphStatus(sessionId), self.dim.getGraphStatusChanges(sessionId, 0)['status'])
+
+    def test_streamGraphStatusChanges(self):
+
+        sessionId = 'lala'
+        self.createSessionAndAddTypicalGraph(sessionId)
+        self.dim.deploySession(sessionId)
+
+        stream = self.dim.streamGraphStatusChanges(sessionId, 0, 2, 0)
+        changes = next(stream)
+        self.assertDictEqual(self.dm.getGraphStatus(sessionId), changes['status'])
+
+        # The stream follows the node manager until the graph finishes
+        a = self.dm._sessions[sessionId].drops['A']
+        a.write(os.urandom(10))
+        a.setCompleted()
+        status = {}
+        for changes in stream:
+            for oid, attrs in changes['status'].items():
+                status.setdefault(oid, {}).update(attrs)
+        self.assertEqual(3, len(status))
+        for dropStatus in status.values():
+            self.assertEqual(DROPStates.COMPLETED, dropStatus['status'])
+
 
 class TestREST(unittest.TestCase):
 
@@ -283,6 +331,9 @@ class TestREST(unittest.TestCase):
                 time.sleep(0.2)
 
             self.assertEqual({hostname: SessionStates.FINISHED}, testutils.get(self, '/sessions/%s/status' % (sessionId), restPort))
+            progress = testutils.get(self, '/sessions/%s/graph/progress' % (sessionId), restPort)
+            self.assertEqual(len(complexGraphSpec), progress['total'])
+            self.assertEqual(1, progress['done'])
             testutils.delete(self, '/sessions/%s' % (sessionId), restPort)
             sessions = testutils.get(self, '/sessions', restPort)
             self.assertEqual(0, len(sessions))
\ No newline at end of file
@@ -91,6 +91,63 @@ class TestDM(unittest.TestCase):
 
         self.assertTrue(evt.wait(10), "Didn't receive errors on time")
 
+    def test_call_drops(self):
+
+        sessionId = 'lala'
+        dm = self._start_dm()
+        quickDeploy(dm, sessionId, [memory('A'), memory('B')])
+
+        results = dm.call_drops(sessionId, [('A', 'write', (b'abc',)),
+                                            ('B', 'write', (b'de',)),
+                                            ('A', 'setCompleted', ())])
+        self.assertEqual([3, 2, None], results)
+        self.assertEqual(DROPStates.COMPLETED, dm.get_drop_property(sessionId, 'A', 'status'))
+        self.assertEqual(2, dm.get_drop_property(sessionId, 'B', 'size'))
+
+    def test_app_scheduler(self):
+
+        # Apps are run by the scheduler, one at a time given the CPU budget
+        sessionId = 'lala'
+        dm = self._start_dm(max_threads=4, cpus=1)
+        g = [memory('A')]
+        for i in range(4):
+            g.append(dropdict({'oid': 'B%d' % i, 'type': 'app', 'app': 'dfms.apps.crc.CRCApp', 'inputs': ['A'], 'outputs': ['C%d' % i]}))
+            g.append(memory('C%d' % i))
+        quickDeploy(dm, sessionId, g)
+
+        drops = dm._sessions[sessionId].drops
+        a = drops['A']
+        self.assertIs(dm._app_scheduler, drops['B0'].executor)
+        with droputils.DROPWaiterCtx(self, [drops['C%d' % i] for i in range(4)], 5):
+            a.write(b'a')
+            a.setCompleted()
+        for i in range(4):
+            self.assertEqual(a.checksum, int(droputils.allDropContents(drops['C%d' % i])))
+
+    def test_process_pool(self):
+
+        # Apps compute their CRCs in the pool, reading file DROPs by reference
+        sessionId = 'lala'
+        dm = self._start_dm(max_processes=2)
+        g = [dropdict({'oid': 'A', 'type': 'plain', 'storage': 'file'}), memory('B')]
+        for i, uid in enumerate(('A', 'B')):
+            g.append(dropdict({'oid': 'C%d' % i, 'type': 'app', 'app': 'dfms.apps.crc.CRCApp', 'inputs': [uid], 'outputs': ['D%d' % i]}))
+            g.append(memory('D%d' % i))
+        quickDeploy(dm, sessionId, g)
+
+        drops = dm._sessions[sessionId].drops
+        self.assertIs(dm._process_pool, drops['C0'].process_pool)
+        outputs = [drops['D0'], drops['D1']]
+        try:
+            with droputils.DROPWaiterCtx(self, outputs, 10):
+                for uid in ('A', 'B'):
+                    drops[uid].write(b'a' * 1000)
+                    drops[uid].setCompleted()
+            for uid, output in zip(('A', 'B'), outputs):
+                self.assertEqual(drops[uid].checksum, int(droputils.allDropContents(output)))
+        finally:
+            drops['A'].delete()
+
     def test_runGraphOneDOPerDOM(self):
         """
         A test that creates three DROPs in two different DMs and runs the graph.
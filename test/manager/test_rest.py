@@ -19,11 +19,12 @@
 #    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
 #    MA 02111-1307  USA
 #
+import socket
 import tempfile
 import threading
 import unittest
 
-from dfms import exceptions
+from dfms import exceptions, restutils, utils
 from dfms.manager import constants
 from dfms.manager.client import NodeManagerClient, DataIslandManagerClient
 from dfms.manager.node_manager import NodeManager
@@ -67,6 +68,58 @@ class TestRest(unittest.TestCase):
             c._GET('/')
             c._GET('/session')
 
+    def test_keepalive(self):
+
+        # Several pipelined requests on the same connection, the last one
+        # asking to close it
+        body = b'{"sessionId": "lala"}'
+        requests = [b'GET /api/sessions HTTP/1.1\r\nHost: localhost\r\n\r\n',
+                    b'POST /api/sessions HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\nContent-Length: ' + str(len(body)).encode('ascii') + b'\r\n\r\n' + body,
+                    b'GET /api/sessions/lala/status HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n']
+        s = socket.create_connection((hostname, constants.NODE_DEFAULT_REST_PORT), 10)
+        try:
+            s.sendall(b''.join(requests))
+            response = b''
+            data = s.recv(4096)
+            while data:
+                response += data
+                data = s.recv(4096)
+        finally:
+            s.close()
+
+        self.assertEqual(3, response.count(b'HTTP/1.1 200'))
+        self.assertEqual(1, response.count(b'Connection: close'))
+        self.assertEqual(['lala'], self.dm.getSessionIds())
+
+    def test_connection_pool(self):
+
+        port = constants.NODE_DEFAULT_REST_PORT
+        restutils.connection_pool.clear()
+        with NodeManagerClient(hostname) as c:
+            c.sessions()
+        self.assertTrue(restutils.connection_pool.has_idle(hostname, port))
+
+        # The same connection is used by the next client
+        conn = restutils.connection_pool.get(hostname, port)
+        restutils.connection_pool.put(hostname, port, conn)
+        with NodeManagerClient(hostname) as c:
+            c.createSession('lala')
+            self.assertIs(conn, c._conn)
+        self.assertIs(conn, restutils.connection_pool.get(hostname, port))
+        restutils.connection_pool.put(hostname, port, conn)
+
+        # A new server closes existing connections, which are then
+        # transparently replaced
+        self._dm_server.stop()
+        self._dm_t.join()
+        self._dm_server = NMRestServer(self.dm)
+        self._dm_t = threading.Thread(target=self._dm_server.start, args=(hostname, port))
+        self._dm_t.start()
+        self.assertTrue(utils.portIsOpen(hostname, port, 10))
+        with NodeManagerClient(hostname) as c:
+            self.assertEqual(1, len(c.sessions()))
+            self.assertIsNot(conn, c._conn)
+
     def test_errtype(self):
 
         sid = 'lala'
@@ -26,6 +26,7 @@ import random
 import shutil
 import sqlite3
 import tempfile
+import threading
 
 import six
 from six import BytesIO
@@ -702,6 +703,45 @@ class TestDROP(unittest.TestCase):
         for drop in a,b,c,d,e:
             self.assertEqual(AppDROPStates.FINISHED, drop.execStatus)
 
+    def test_concurrent_completions(self):
+        """
+        Checks that wide gathers and scatters are correctly driven by
+        notifications coming concurrently from many threads
+        """
+        class App(BarrierAppDROP):
+            def initialize(self, **kwargs):
+                BarrierAppDROP.initialize(self, **kwargs)
+                self.runs = 0
+            def run(self):
+                self.runs += 1
+
+        n, n_threads = 10000, 8
+        inputs = [InMemoryDROP(str(i), str(i)) for i in range(n)]
+        app = App('app', 'app')
+        for drop in inputs:
+            app.addInput(drop)
+        producers = [App('p%d' % i, 'p%d' % i) for i in range(n)]
+        output = InMemoryDROP('out', 'out')
+        for drop in producers:
+            drop.addOutput(output)
+
+        def complete(i):
+            for drop in inputs[i::n_threads]:
+                drop.setCompleted()
+            for drop in producers[i::n_threads]:
+                output.producerFinished(drop.uid, DROPStates.COMPLETED)
+
+        with DROPWaiterCtx(self, app, 10):
+            threads = [threading.Thread(target=complete, args=(i,)) for i in range(n_threads)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+        self.assertEqual(1, app.runs)
+        self.assertEqual(DROPStates.COMPLETED, output.status)
+        self.assertRaises(Exception, output.producerFinished, 'p0', DROPStates.COMPLETED)
+
     def test_eager_inputFired_app(self):
         """
         Tests that InputFiredApps works as expected
@@ -0,0 +1,251 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2017
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+import os
+import shutil
+import socket
+import stat
+import tempfile
+import threading
+import unittest
+
+import paramiko
+from paramiko.sftp import SFTP_OK, SFTP_OP_UNSUPPORTED
+
+from dfms import remote
+
+
+class LocalSFTPHandle(paramiko.SFTPHandle):
+
+    def stat(self):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def chattr(self, attr):
+        try:
+            paramiko.SFTPServer.set_file_attr(self.filename, attr)
+            return SFTP_OK
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+class LocalSFTPServer(paramiko.SFTPServerInterface):
+    """
+    An SFTP server working directly on the local filesystem
+    """
+
+    def _attrs(self, path, name=None):
+        attr = paramiko.SFTPAttributes.from_stat(os.stat(path))
+        attr.filename = name or os.path.basename(path)
+        return attr
+
+    def list_folder(self, path):
+        try:
+            return [self._attrs(os.path.join(path, n), n) for n in os.listdir(path)]
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path):
+        try:
+            return self._attrs(path)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    lstat = stat
+
+    def open(self, path, flags, attr):
+        try:
+            binary_flag = getattr(os, 'O_BINARY', 0)
+            fd = os.open(path, flags | binary_flag, 0o644)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        if flags & os.O_WRONLY:
+            fstr = 'wb'
+        elif flags & os.O_RDWR:
+            fstr = 'r+b'
+        else:
+            fstr = 'rb'
+        handle = LocalSFTPHandle(flags)
+        handle.filename = path
+        handle.readfile = handle.writefile = os.fdopen(fd, fstr)
+        return handle
+
+    def mkdir(self, path, attr):
+        try:
+            os.mkdir(path)
+            return SFTP_OK
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def chattr(self, path, attr):
+        try:
+            paramiko.SFTPServer.set_file_attr(path, attr)
+            return SFTP_OK
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def remove(self, path):
+        return SFTP_OP_UNSUPPORTED
+
+class AcceptAnyKey(paramiko.ServerInterface):
+
+    def get_allowed_auths(self, username):
+        return 'publickey'
+
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED
+
+class LoopbackSSHServer(object):
+    """
+    A paramiko-based SSH server listening on localhost that offers SFTP over
+    the local filesystem, and counts the connections it receives
+    """
+
+    def __init__(self):
+        self.host_key = paramiko.RSAKey.generate(1024)
+        self.connections = 0
+        self._transports = []
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(('127.0.0.1', 0))
+        self._sock.listen(20)
+        self.port = self._sock.getsockname()[1]
+        self._thread = threading.Thread(target=self._serve)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                sock, _ = self._sock.accept()
+            except socket.error:
+                return
+            self.connections += 1
+            t = paramiko.Transport(sock)
+            t.add_server_key(self.host_key)
+            t.set_subsystem_handler('sftp', paramiko.SFTPServer, LocalSFTPServer)
+            t.start_server(server=AcceptAnyKey())
+            self._transports.append(t)
+
+    def stop(self):
+        self._sock.close()
+        for t in self._transports:
+            t.close()
+
+class TransferTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = LoopbackSSHServer()
+        cls.keydir = tempfile.mkdtemp()
+        cls.pkeyPath = os.path.join(cls.keydir, 'id_rsa')
+        paramiko.RSAKey.generate(1024).write_private_key_file(cls.pkeyPath)
+
+    @classmethod
+    def tearDownClass(cls):
+        remote.connection_pool.close()
+        cls.server.stop()
+        shutil.rmtree(cls.keydir)
+
+    def setUp(self):
+        self.src = tempfile.mkdtemp()
+        self.dst = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.src)
+        shutil.rmtree(self.dst)
+
+    def _kwargs(self, **kwargs):
+        kwargs.update(pkeyPath=self.pkeyPath, port=self.server.port)
+        return kwargs
+
+    def _write(self, path, size):
+        data = os.urandom(size)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return data
+
+    def _read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def _tree(self):
+        os.makedirs(os.path.join(self.src, 'a', 'b'))
+        os.makedirs(os.path.join(self.src, 'empty'))
+        contents = {}
+        for rel, size in (('f1', 1000), ('f2', 0), ('a/f3', 300000), ('a/b/f4', 12345)):
+            contents[rel] = self._write(os.path.join(self.src, rel), size)
+        os.chmod(os.path.join(self.src, 'f1'), 0o600)
+        return contents
+
+    def _checkTree(self, contents, root):
+        for rel, data in contents.items():
+            self.assertEqual(data, self._read(os.path.join(root, rel)))
+        self.assertTrue(os.path.isdir(os.path.join(root, 'empty')))
+        self.assertEqual(0o600, stat.S_IMODE(os.stat(os.path.join(root, 'f1')).st_mode))
+
+    def test_file_ranges(self):
+        """
+        A file bigger than chunkSize is moved in ranges by several streams in
+        both directions, reporting progress all along
+        """
+        source = os.path.join(self.src, 'big')
+        data = self._write(source, 1024 ** 2 + 7)
+
+        updates = []
+        target = os.path.join(self.dst, 'big')
+        remote.transferTo('127.0.0.1', source, target, progress=lambda t, n: updates.append((t, n)),
+                          **self._kwargs(streams=3, chunkSize=100000, bufsize=32768))
+        self.assertEqual(data, self._read(target))
+        self.assertEqual((len(data), len(data)), updates[-1])
+        self.assertEqual(sorted(updates), updates)
+
+        back = os.path.join(self.src, 'back')
+        remote.transferFrom('127.0.0.1', target, back, **self._kwargs(streams=3, chunkSize=100000))
+        self.assertEqual(data, self._read(back))
+
+    def test_directories(self):
+        contents = self._tree()
+        remote.transferTo('127.0.0.1', self.src, os.path.join(self.dst, 'to'),
+                          **self._kwargs(chunkSize=100000))
+        self._checkTree(contents, os.path.join(self.dst, 'to'))
+
+        remote.transferFrom('127.0.0.1', self.src, os.path.join(self.dst, 'from'),
+                            **self._kwargs(chunkSize=100000))
+        self._checkTree(contents, os.path.join(self.dst, 'from'))
+
+    def test_connection_reuse(self):
+        remote.connection_pool.close()
+        connections = self.server.connections
+        source = os.path.join(self.src, 'f')
+        self._write(source, 100)
+        for i in range(5):
+            remote.transferTo('127.0.0.1', source, os.path.join(self.dst, str(i)), **self._kwargs(streams=2))
+        self.assertEqual(1, self.server.connections - connections)
+
+        # Ranges spread over more connections
+        self._write(source, 1000)
+        remote.transferTo('127.0.0.1', source, os.path.join(self.dst, 'f'), **self._kwargs(streams=2, chunkSize=100))
+        self.assertEqual(2, self.server.connections - connections)
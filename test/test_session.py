@@ -21,7 +21,7 @@
 #
 import unittest
 
-from dfms.ddap_protocol import DROPLinkType
+from dfms.ddap_protocol import DROPLinkType, DROPStates, AppDROPStates
 from dfms.manager.session import Session, SessionStates
 
 
@@ -80,4 +80,87 @@ class TestSession(unittest.TestCase):
             self.assertEqual('B', b.oid)
             self.assertEqual(1, len(b.outputs))
             c = b.outputs[0]
-            self.assertEqual('C', c.oid)
\ No newline at end of file
+            self.assertEqual('C', c.oid)
+    def test_graphStatusChanges(self):
+        with Session('1') as s:
+            s.addGraphSpec([{"oid":"A", "type":"plain", "storage":"memory"},
+                            {"oid":"B", "type":"app", "app":"dfms.apps.crc.CRCApp", "inputs":["A"]},
+                            {"oid":"C", "type":"plain", "storage":"memory", "producers":["B"]}])
+            s.deploy()
+
+            # All drops are reported at first
+            changes = s.getGraphStatusChanges(0)
+            self.assertEqual(3, len(changes['status']))
+            self.assertDictEqual(s.getGraphStatus(), changes['status'])
+            self.assertEqual(DROPStates.INITIALIZED, changes['status']['A']['status'])
+            self.assertEqual(AppDROPStates.NOT_RUN, changes['status']['B']['execStatus'])
+
+            # Nothing changed since then
+            seq = changes['seq']
+            self.assertEqual({'seq': seq, 'status': {}}, s.getGraphStatusChanges(seq))
+
+            # Only A should be reported
+            a = s.drops['A']
+            a.status = DROPStates.WRITING
+            changes = s.getGraphStatusChanges(seq)
+            self.assertEqual(seq + 1, changes['seq'])
+            self.assertDictEqual({'A': {'status': DROPStates.WRITING}}, changes['status'])
+
+            # A sequence number from the future gives us everything again
+            self.assertEqual(3, len(s.getGraphStatusChanges(seq + 100)['status']))
+
+    def test_streamGraphStatusChanges(self):
+        with Session('1') as s:
+            s.addGraphSpec([{"oid":"A", "type":"plain", "storage":"memory"},
+                            {"oid":"B", "type":"app", "app":"dfms.apps.crc.CRCApp", "inputs":["A"]},
+                            {"oid":"C", "type":"plain", "storage":"memory", "producers":["B"]}])
+            s.deploy()
+
+            # The first element contains all drops
+            stream = s.streamGraphStatusChanges(0, 1, 0)
+            changes = next(stream)
+            self.assertEqual(3, len(changes['status']))
+
+            # Changes show up in the stream, and the stream finishes with the
+            # session
+            a = s.drops['A']
+            a.write(b'x')
+            a.setCompleted()
+            status = {}
+            for changes in stream:
+                for oid, attrs in changes['status'].items():
+                    status.setdefault(oid, {}).update(attrs)
+            self.assertEqual(SessionStates.FINISHED, s.status)
+            self.assertEqual(DROPStates.COMPLETED, status['C']['status'])
+            self.assertEqual(AppDROPStates.FINISHED, status['B']['execStatus'])
+
+    def test_graphProgress(self):
+        with Session('1') as s:
+            s.addGraphSpec([{"oid":"A", "type":"plain", "storage":"memory"},
+                            {"oid":"B", "type":"app", "app":"dfms.apps.crc.CRCApp", "inputs":["A"]},
+                            {"oid":"C", "type":"plain", "storage":"memory", "producers":["B"]}])
+            self.assertRaises(Exception, s.getGraphProgress)
+            s.deploy()
+
+            progress = s.getGraphProgress()
+            self.assertEqual(3, progress['total'])
+            self.assertEqual(0, progress['done'])
+            self.assertIsNone(progress['eta'])
+            self.assertEqual(1, progress['app']['pending'])
+            self.assertEqual(2, progress['data']['pending'])
+
+            # Triggering A by UID completes the graph and finishes the session
+            s.drops['A'].write(b'x')
+            stream = s.streamGraphStatusChanges(0, 1, 0)
+            s.trigger_drops(['A', 'unknown'])
+            for _ in stream:
+                pass
+            self.assertEqual(SessionStates.FINISHED, s.status)
+
+            progress = s.getGraphProgress()
+            self.assertEqual(1, progress['done'])
+            self.assertEqual(0, progress['eta'])
+            self.assertTrue(progress['finished'])
+            self.assertEqual(1, progress['app']['completed'])
+            self.assertEqual(2, progress['data']['completed'])
+            self.assertEqual(0, progress['data']['pending'])
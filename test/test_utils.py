@@ -23,6 +23,7 @@ import functools
 import json
 import os
 import tempfile
+import threading
 import unittest
 import zlib
 
@@ -180,4 +181,34 @@ class TestUtils(unittest.TestCase):
         for obj in (1, {'a': 2}, 'b', {'sessionId': sessionId}):
             stream = utils.JSONStream(obj)
             self.assertEqual(obj, json.loads(stream.read(100).decode('latin1')))
-            self.assertEqual(0, len(stream.read(100).decode('latin1')))
\ No newline at end of file
+            self.assertEqual(0, len(stream.read(100).decode('latin1')))
+    def test_sharded_dict(self):
+
+        d = utils.ShardedDict(shards=4)
+        self.assertEqual(0, len(d))
+        self.assertIsNone(d.get('a'))
+        self.assertRaises(KeyError, d.__getitem__, 'a')
+
+        d['a'] = 1
+        self.assertEqual(1, d['a'])
+        self.assertIn('a', d)
+        self.assertEqual(1, d.setdefault('a', 2))
+        self.assertEqual(3, d.setdefault('b', 3))
+        self.assertEqual(set(['a', 'b']), set(d.keys()))
+        self.assertEqual(set([('a', 1), ('b', 3)]), set(d.items()))
+        self.assertEqual(1, d.pop('a'))
+        self.assertIsNone(d.pop('a', None))
+        del d['b']
+        self.assertEqual(0, len(d))
+
+        # Concurrent insertions of different keys, and of the same keys
+        def insert(i):
+            for j in range(1000):
+                d[(i, j)] = j
+                d.setdefault(j, i)
+        threads = [threading.Thread(target=insert, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(9000, len(d))